@@ -5,3 +5,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medtracker.settings')
 
 application = get_asgi_application()
+
+from medtrackerapp.writebehind import start_if_enabled  # noqa: E402
+
+start_if_enabled()
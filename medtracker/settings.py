@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "medtrackerapp.middleware.DecompressRequestMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -70,6 +71,67 @@ DATABASES = {
     }
 }
 
+# CACHE
+# Adherence results are cached per medication version (see medtrackerapp/cache.py).
+# Invalidation bumps a version stored in the cache, so every worker process must
+# see the same cache: set REDIS_URL to enable caching. Without a shared backend
+# the dummy cache is used and adherence is computed on every call, since a
+# per-process cache would keep serving stale results in the other workers.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        }
+    }
+ADHERENCE_CACHE_TIMEOUT = int(os.getenv("ADHERENCE_CACHE_TIMEOUT", 60 * 60))
+
+# DOSE LOG LIST PAGINATION (see medtrackerapp/pagination.py)
+# Default page size of GET /api/logs/; clients may ask for up to 1000.
+DOSELOG_PAGE_SIZE = int(os.getenv("DOSELOG_PAGE_SIZE", 100))
+
+# BULK DOSE LOG INGESTION (POST /api/logs/bulk/)
+DOSELOG_BULK_BATCH_SIZE = int(os.getenv("DOSELOG_BULK_BATCH_SIZE", 500))
+DOSELOG_BULK_MAX_ROWS = int(os.getenv("DOSELOG_BULK_MAX_ROWS", 10000))
+
+# COLD DOSE LOG ARCHIVE (see medtrackerapp/archive.py)
+# archive_doses moves logs older than DOSELOG_HOT_DAYS into compressed
+# per-medication-month files under DOSELOG_ARCHIVE_DIR.
+DOSELOG_ARCHIVE_DIR = Path(os.getenv("DOSELOG_ARCHIVE_DIR", BASE_DIR / "archive"))
+DOSELOG_HOT_DAYS = int(os.getenv("DOSELOG_HOT_DAYS", 90))
+
+# RETENTION COMPACTION (see medtrackerapp/compaction.py)
+# compact_doses replaces logs older than this many days with per-day summaries,
+# in the live table, partitions and archive segments alike.
+DOSELOG_RETENTION_DAYS = int(os.getenv("DOSELOG_RETENTION_DAYS", 730))
+
+# COMPRESSED REQUEST BODIES (see medtrackerapp/middleware.py)
+# gzip/deflate/zstd request bodies under these prefixes are decompressed
+# on the fly; larger decompressed bodies are rejected with HTTP 413.
+DECOMPRESS_REQUEST_PREFIXES = ["/api/"]
+REQUEST_MAX_DECOMPRESSED_SIZE = int(os.getenv("REQUEST_MAX_DECOMPRESSED_SIZE", 20 * 1024 * 1024))
+
+# WRITE-BEHIND DOSE LOG CREATES (see medtrackerapp/writebehind.py)
+# POST /api/logs/ answers 202 and rows are flushed in batches every
+# FLUSH_MS or MAX_ROWS. The journal makes accepted rows survive a crash;
+# each worker process writes its own "<journal>.<pid>" file next to it, so
+# the directory must be local to the host.
+DOSELOG_WRITE_BEHIND = os.getenv("DOSELOG_WRITE_BEHIND", "False") == "True"
+DOSELOG_WRITE_BEHIND_FLUSH_MS = int(os.getenv("DOSELOG_WRITE_BEHIND_FLUSH_MS", 200))
+DOSELOG_WRITE_BEHIND_MAX_ROWS = int(os.getenv("DOSELOG_WRITE_BEHIND_MAX_ROWS", 500))
+DOSELOG_WRITE_BEHIND_JOURNAL = os.getenv("DOSELOG_WRITE_BEHIND_JOURNAL") or None
+DOSELOG_WRITE_BEHIND_FSYNC = os.getenv("DOSELOG_WRITE_BEHIND_FSYNC", "False") == "True"
+# Rows failing on their own are retried this many flushes, then appended
+# to the dead-letter file (default: "<journal>-dead").
+DOSELOG_WRITE_BEHIND_MAX_RETRIES = int(os.getenv("DOSELOG_WRITE_BEHIND_MAX_RETRIES", 3))
+DOSELOG_WRITE_BEHIND_DEAD_LETTER = os.getenv("DOSELOG_WRITE_BEHIND_DEAD_LETTER") or None
+
 # INTERNATIONALIZATION
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
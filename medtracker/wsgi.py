@@ -3,3 +3,7 @@ from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "medtracker.settings")
 application = get_wsgi_application()
+
+from medtrackerapp.writebehind import start_if_enabled  # noqa: E402
+
+start_if_enabled()
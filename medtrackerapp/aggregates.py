@@ -0,0 +1,289 @@
+"""
+Incremental maintenance of aggregates derived from DoseLog rows.
+
+Every write path (model signals, bulk ingestion, maintenance commands)
+describes its effect as a set of added and removed dose rows. The
+:class:`DoseChangeSet` folds them into per-day deltas and applies them
+in one transaction, so aggregates never drift from the raw logs.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import cache as adherence_cache
+
+
+def dose_day(taken_at):
+    """
+    Return the local calendar day a dose timestamp belongs to.
+
+    Matches the semantics of the ``taken_at__date`` lookup and of
+    ``TruncDate`` in the current time zone.
+    """
+    if timezone.is_naive(taken_at):
+        taken_at = timezone.make_aware(taken_at)
+    return timezone.localdate(taken_at)
+
+
+def day_bounds(start_date, end_date):
+    """
+    Convert an inclusive local date range into half-open datetime bounds.
+
+    Filtering with ``taken_at__gte=start, taken_at__lt=end`` selects the
+    same rows as ``taken_at__date__gte/lte`` but compares the raw column,
+    so the ``taken_at`` indexes can be used for a range scan.
+
+    Returns:
+        tuple[datetime, datetime]: Aware start (inclusive) and end
+        (exclusive) instants in the current time zone. For an
+        ``end_date`` of ``date.max`` the end is ``datetime.max`` (UTC),
+        as the following day cannot be represented.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    if end_date == date.max:
+        end = datetime.max.replace(tzinfo=dt_timezone.utc)
+    else:
+        end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def month_start(day):
+    """Return the first day of the month containing ``day``."""
+    return day.replace(day=1)
+
+
+def next_month(month):
+    """Return the first day of the month after ``month``."""
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_bounds(month):
+    """Return aware half-open ``taken_at`` bounds of a local calendar month."""
+    return day_bounds(month, next_month(month) - timedelta(days=1))
+
+
+class DoseChangeSet:
+    """
+    Accumulates DoseLog additions and removals as aggregate deltas.
+
+    Example:
+        >>> changes = DoseChangeSet()
+        >>> changes.remove(old.medication_id, old.taken_at, old.was_taken)
+        >>> changes.add(new.medication_id, new.taken_at, new.was_taken)
+        >>> changes.apply()
+    """
+
+    def __init__(self):
+        self._daily = defaultdict(lambda: [0, 0])
+
+    def __bool__(self):
+        return any(taken or missed for taken, missed in self._daily.values())
+
+    def add(self, medication_id: int, taken_at, was_taken: bool, sign: int = 1):
+        """Record that a dose row now exists."""
+        counts = self._daily[(medication_id, dose_day(taken_at))]
+        counts[0 if was_taken else 1] += sign
+
+    def remove(self, medication_id: int, taken_at, was_taken: bool):
+        """Record that a dose row no longer exists."""
+        self.add(medication_id, taken_at, was_taken, sign=-1)
+
+    def medication_deltas(self) -> dict:
+        """
+        Return the net change per medication.
+
+        Returns:
+            dict: Medication id mapped to ``(taken_delta, total_delta)``.
+        """
+        deltas = defaultdict(lambda: [0, 0])
+        for (medication_id, _day), (taken, missed) in self._daily.items():
+            deltas[medication_id][0] += taken
+            deltas[medication_id][1] += taken + missed
+        return {
+            medication_id: (taken, total)
+            for medication_id, (taken, total) in deltas.items()
+            if taken or total
+        }
+
+    def apply(self) -> dict:
+        """
+        Write the accumulated deltas and reset the change set.
+
+        Updates the DoseDailyRollup rows and the denormalized
+        ``taken_count``/``total_count`` counters on Medication, using
+        ``F()`` expressions so concurrent writers never lose updates,
+        stamps those medications with new change sequence numbers and
+        ``updated_at`` (their serialized adherence changed), moves each
+        changed medication between buckets of the fleet adherence
+        sketch, and invalidates the cached adherence results of every
+        touched medication.
+
+        Returns:
+            dict: The applied per-medication deltas (see ``medication_deltas``).
+        """
+        from .models import AdherenceSketchBucket, ChangeSequence, DoseDailyRollup, Medication
+
+        deltas = self.medication_deltas()
+        touched = {medication_id for medication_id, _day in self._daily}
+        with transaction.atomic():
+            for (medication_id, day), (taken, missed) in self._daily.items():
+                if taken or missed:
+                    DoseDailyRollup.apply_delta(medication_id, day, taken, missed)
+            if deltas:
+                seq = ChangeSequence.allocate(len(deltas)) - len(deltas)
+                now = timezone.now()
+            for medication_id, (taken, total) in deltas.items():
+                seq += 1
+                Medication.objects.filter(pk=medication_id).update(
+                    taken_count=F("taken_count") + taken,
+                    total_count=F("total_count") + total,
+                    change_seq=seq,
+                    updated_at=now
+                )
+            if deltas:
+                self._move_sketch_buckets(deltas, AdherenceSketchBucket, Medication)
+            for medication_id in touched:
+                adherence_cache.invalidate(medication_id)
+        self._daily.clear()
+        return deltas
+
+
+    @staticmethod
+    def _move_sketch_buckets(deltas, bucket_model, medication_model):
+        """Move medications between sketch buckets after a counter update."""
+        moves = defaultdict(int)
+        current = medication_model.objects.filter(pk__in=deltas).values_list(
+            "pk", "taken_count", "total_count"
+        )
+        for medication_id, taken, total in current:
+            taken_delta, total_delta = deltas[medication_id]
+            before = bucket_model.bucket_for(taken - taken_delta, total - total_delta)
+            after = bucket_model.bucket_for(taken, total)
+            if before != after:
+                if before is not None:
+                    moves[before] -= 1
+                if after is not None:
+                    moves[after] += 1
+        for bucket, delta in moves.items():
+            if delta:
+                bucket_model.apply_delta(bucket, delta)
+
+
+def rebuild_adherence_sketch():
+    """
+    Recompute the fleet adherence sketch from the Medication counters.
+
+    Returns:
+        int: Number of medications counted.
+    """
+    from .models import AdherenceSketchBucket, Medication
+
+    counts = defaultdict(int)
+    counters = (
+        Medication.objects.filter(total_count__gt=0)
+        .values_list("taken_count", "total_count")
+        .iterator()
+    )
+    for taken, total in counters:
+        counts[AdherenceSketchBucket.bucket_for(taken, total)] += 1
+
+    with transaction.atomic():
+        AdherenceSketchBucket.objects.all().delete()
+        AdherenceSketchBucket.objects.bulk_create(
+            AdherenceSketchBucket(bucket=bucket, count=count)
+            for bucket, count in counts.items()
+        )
+    return sum(counts.values())
+
+
+def grouped_day_counts(logs):
+    """
+    Group DoseLog-like rows by medication and local day in the database.
+
+    Returns:
+        QuerySet: ``(medication_id, day, taken, missed)`` tuples.
+    """
+    return (
+        logs.annotate(day=TruncDate("taken_at"))
+        .values_list("medication_id", "day")
+        .annotate(
+            taken=Count("pk", filter=Q(was_taken=True)),
+            missed=Count("pk", filter=Q(was_taken=False)),
+        )
+        .order_by()
+    )
+
+
+def history_day_counts(medication_ids) -> dict:
+    """
+    Count taken and missed doses per medication and local day in every tier.
+
+    Combines the live DoseLog table, the recorded days of every DoseLog
+    partition (detached and dropped ones still count), archived
+    segments and compacted days, i.e. all the doses the rollups and
+    counters are meant to summarize.
+
+    Args:
+        medication_ids (list[int]): Medications to count.
+
+    Returns:
+        dict: ``(medication_id, date)`` mapped to ``[taken, missed]``.
+    """
+    from . import archive
+    from .models import CompactedDoseDay, DoseLog, DoseLogArchiveSegment, PartitionedDoseDay
+
+    counts = defaultdict(lambda: [0, 0])
+    for medication_id, day, taken, missed in grouped_day_counts(
+        DoseLog.objects.filter(medication_id__in=medication_ids)
+    ):
+        counts[(medication_id, day)][0] += taken
+        counts[(medication_id, day)][1] += missed
+
+    for segment in DoseLogArchiveSegment.objects.filter(medication_id__in=medication_ids):
+        columns = archive.read_segment(segment)
+        for day, was_taken in zip(columns["day"].tolist(), columns["was_taken"].tolist()):
+            counts[(segment.medication_id, date.fromordinal(day))][0 if was_taken else 1] += 1
+
+    for model in (PartitionedDoseDay, CompactedDoseDay):
+        days = model.objects.filter(medication_id__in=medication_ids)
+        for medication_id, day, taken, missed in days.values_list("medication_id", "date", "taken", "missed"):
+            counts[(medication_id, day)][0] += taken
+            counts[(medication_id, day)][1] += missed
+    return counts
+
+
+def rebuild_rollups(medication_ids):
+    """
+    Recompute the DoseDailyRollup rows of the given medications.
+
+    Existing rollups are replaced, inside one transaction, by the
+    per-day counts of every storage tier (see ``history_day_counts``).
+    The Medication rows are locked first and the counts are read in the
+    same transaction, so a DoseLog write cannot land between the read
+    and the rewrite and be lost.
+
+    Args:
+        medication_ids (list[int]): Medications to rebuild.
+
+    Returns:
+        int: Number of rollup rows written.
+    """
+    from .models import DoseDailyRollup, Medication
+
+    with transaction.atomic():
+        list(Medication.objects.select_for_update().filter(pk__in=medication_ids).values_list("pk"))
+        counts = history_day_counts(medication_ids)
+        DoseDailyRollup.objects.filter(medication_id__in=medication_ids).delete()
+        rollups = DoseDailyRollup.objects.bulk_create(
+            DoseDailyRollup(medication_id=medication_id, date=day, taken=taken, missed=missed)
+            for (medication_id, day), (taken, missed) in counts.items()
+            if taken or missed
+        )
+        for medication_id in medication_ids:
+            adherence_cache.invalidate(medication_id)
+    return len(rollups)
@@ -0,0 +1,362 @@
+"""
+Vectorized population-level adherence analytics.
+
+Dose logs are streamed out of the database column by column with
+``values_list`` in fixed-size chunks and packed into NumPy arrays, so
+reports over tens of millions of logs never materialize model
+instances. All per-medication and per-day figures are then computed
+with ``bincount``/``searchsorted`` instead of per-object ORM calls.
+
+Results match :meth:`Medication.adherence_rate` and
+:meth:`Medication.adherence_rate_over_period` exactly. Missed-dose
+streaks are computed the same way, over every storage tier.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from itertools import chain, islice
+
+import numpy as np
+from django.db.models.functions import TruncDate
+
+from . import archive, compaction
+from .aggregates import day_bounds
+from .models import CompactedDoseDay, Medication
+from .partitions import dose_log_sources, dropped_days, unread_days
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+@dataclass
+class DoseArrays:
+    """
+    Column-oriented dose logs, sorted by day.
+
+    Attributes:
+        medication_ids (np.ndarray): Sorted unique medication ids.
+        medication_index (np.ndarray): Per log, index into ``medication_ids``.
+        days (np.ndarray): Per log, proleptic ordinal of its local day.
+        taken (np.ndarray): Per log, whether the dose was taken.
+    """
+
+    medication_ids: np.ndarray
+    medication_index: np.ndarray
+    days: np.ndarray
+    taken: np.ndarray
+
+    def __len__(self):
+        return len(self.days)
+
+    def between(self, start_date: date, end_date: date) -> slice:
+        """Return the slice of logs whose day lies in [start_date, end_date]."""
+        lo = np.searchsorted(self.days, start_date.toordinal(), side="left")
+        hi = np.searchsorted(self.days, end_date.toordinal(), side="right")
+        return slice(int(lo), int(hi))
+
+
+def load_dose_arrays(
+    queryset=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start_date: date = None,
+    end_date: date = None
+) -> DoseArrays:
+    """
+    Load dose logs into NumPy arrays in chunks.
+
+    The local calendar day is computed by the database with
+    ``TruncDate``, using the same time zone semantics as the
+    ``taken_at__date`` lookup and the daily rollups.
+
+    Args:
+        queryset (QuerySet): DoseLog rows to load (default: all, including
+            attached partitions, archived segments, compacted days and
+            the recorded days of detached and dropped partitions).
+        chunk_size (int): Rows fetched and converted per batch.
+        start_date (date): With ``end_date``, only load the doses of the
+            days in ``[start_date, end_date]`` from every tier; the live
+            table and partitions are range-scanned on ``taken_at``.
+        end_date (date): Last day loaded (inclusive).
+
+    Returns:
+        DoseArrays: The loaded columns, sorted by day.
+
+    Raises:
+        OverflowError: If the range cannot be converted to datetimes.
+    """
+    compacted, unread = CompactedDoseDay.objects.all(), unread_days()
+    if queryset is not None:
+        sources = [queryset]
+    elif start_date is None:
+        sources = dose_log_sources()
+    else:
+        start_at, end_before = day_bounds(start_date, end_date)
+        sources = [
+            source.filter(taken_at__gte=start_at, taken_at__lt=end_before)
+            for source in dose_log_sources(start_at, end_before)
+        ]
+        compacted = compacted.filter(date__gte=start_date, date__lte=end_date)
+        unread = unread.filter(date__gte=start_date, date__lte=end_date)
+    rows = chain.from_iterable(
+        source.annotate(day=TruncDate("taken_at"))
+        .order_by()
+        .values_list("medication_id", "day", "was_taken")
+        .iterator(chunk_size=chunk_size)
+        for source in sources
+    )
+
+    med_chunks, day_chunks, taken_chunks = [], [], []
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        meds, days, taken = zip(*chunk)
+        count = len(chunk)
+        med_chunks.append(np.fromiter(meds, dtype=np.int64, count=count))
+        day_chunks.append(np.fromiter((d.toordinal() for d in days), dtype=np.int64, count=count))
+        taken_chunks.append(np.fromiter(taken, dtype=bool, count=count))
+
+    if queryset is None:
+        for meds, days, taken in chain(
+            archive.load_columns(start_date, end_date),
+            compaction.load_columns(compacted),
+            compaction.load_columns(unread)
+        ):
+            med_chunks.append(meds)
+            day_chunks.append(days)
+            taken_chunks.append(taken)
+
+    if not day_chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return DoseArrays(empty, empty, empty, np.empty(0, dtype=bool))
+
+    meds = np.concatenate(med_chunks)
+    days = np.concatenate(day_chunks)
+    taken = np.concatenate(taken_chunks)
+    order = np.argsort(days, kind="stable")
+    medication_ids, medication_index = np.unique(meds[order], return_inverse=True)
+    return DoseArrays(medication_ids, medication_index, days[order], taken[order])
+
+
+def load_dose_sequence(medication_ids, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Load every dose of the given medications in chronological order.
+
+    Reads all storage tiers: the live table, every partition (attached
+    or detached), archived segments, compacted days and the recorded
+    days of dropped partitions. The last two only know the day of
+    their doses, so each becomes two weighted entries at the start of
+    the day: its taken doses, then its missed doses.
+
+    Args:
+        medication_ids: Medications to load (a list or a ``pk`` queryset).
+        chunk_size (int): Rows fetched and converted per batch.
+
+    Returns:
+        tuple: ``(medication_ids, taken, weights)`` arrays sorted by
+        medication, then ``(taken_at, id)``; each entry stands for
+        ``weight`` doses.
+    """
+    med_chunks, time_chunks, id_chunks, taken_chunks, weight_chunks = [], [], [], [], []
+
+    def add(meds, times, ids, taken, weights=None):
+        med_chunks.append(np.asarray(meds, dtype=np.int64))
+        time_chunks.append(np.asarray(times, dtype=np.int64))
+        id_chunks.append(np.asarray(ids, dtype=np.int64))
+        taken_chunks.append(np.asarray(taken, dtype=bool))
+        weight_chunks.append(np.ones(len(med_chunks[-1]), dtype=np.int64) if weights is None
+                             else np.asarray(weights, dtype=np.int64))
+
+    rows = chain.from_iterable(
+        source.filter(medication_id__in=medication_ids)
+        .order_by()
+        .values_list("medication_id", "taken_at", "id", "was_taken")
+        .iterator(chunk_size=chunk_size)
+        for source in dose_log_sources(include_detached=True)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        meds, times, ids, taken = zip(*chunk)
+        add(meds, [(t - archive.EPOCH) // timedelta(microseconds=1) for t in times], ids, taken)
+
+    for columns in archive.load_log_columns(medication_ids):
+        add(*columns)
+
+    for summaries in (CompactedDoseDay.objects.all(), dropped_days()):
+        counts = list(summaries.filter(medication_id__in=medication_ids).values_list("medication_id", "date", "taken", "missed"))
+        if not counts:
+            continue
+        meds, days, taken, missed = zip(*counts)
+        starts = [(day_bounds(day, day)[0] - archive.EPOCH) // timedelta(microseconds=1) for day in days]
+        # Taken before missed: ids -2 and -1 sort them ahead of real logs at midnight.
+        add(meds + meds, starts + starts, [-2] * len(meds) + [-1] * len(meds),
+            [True] * len(meds) + [False] * len(meds), taken + missed)
+
+    if not med_chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, np.empty(0, dtype=bool), empty
+    meds, times, ids = np.concatenate(med_chunks), np.concatenate(time_chunks), np.concatenate(id_chunks)
+    taken, weights = np.concatenate(taken_chunks), np.concatenate(weight_chunks)
+    order = np.lexsort((ids, times, meds))
+    order = order[weights[order] > 0]
+    return meds[order], taken[order], weights[order]
+
+
+def missed_dose_streaks(medication_ids, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Current and longest missed-dose streaks, as in ``MedicationQuerySet.missed_dose_streaks``.
+
+    Runs are found with vectorized gaps-and-islands over
+    :func:`load_dose_sequence`: a run starts wherever the medication or
+    the taken flag changes, and its length is the sum of its weights.
+
+    Returns:
+        dict: Medication id mapped to ``{"current": int, "longest": int}``
+              for the medications with at least one missed dose.
+    """
+    meds, taken, weights = load_dose_sequence(medication_ids, chunk_size)
+    if not len(meds):
+        return {}
+    starts = np.ones(len(meds), dtype=bool)
+    starts[1:] = (meds[1:] != meds[:-1]) | (taken[1:] != taken[:-1])
+    run = np.cumsum(starts) - 1
+    lengths = np.bincount(run, weights=weights).astype(np.int64)
+    run_meds, run_missed = meds[starts], ~taken[starts]
+    run_last = np.append(run_meds[1:] != run_meds[:-1], True)
+
+    medication_ids, index = np.unique(run_meds[run_missed], return_inverse=True)
+    longest = np.zeros(len(medication_ids), dtype=np.int64)
+    np.maximum.at(longest, index, lengths[run_missed])
+    current = np.zeros(len(medication_ids), dtype=np.int64)
+    current[index[run_last[run_missed]]] = lengths[run_missed & run_last]
+    return {
+        int(med_id): {"current": int(cur), "longest": int(long)}
+        for med_id, cur, long in zip(medication_ids, current, longest)
+    }
+
+
+def adherence_by_medication(arrays: DoseArrays) -> dict:
+    """
+    Overall adherence per medication, as in ``Medication.adherence_rate``.
+
+    Returns:
+        dict: Medication id mapped to adherence percentage. Medications
+              without logs are absent (their rate is 0.0).
+    """
+    n = len(arrays.medication_ids)
+    taken = np.bincount(arrays.medication_index, weights=arrays.taken, minlength=n)
+    total = np.bincount(arrays.medication_index, minlength=n)
+    rates = taken / total * 100
+    return {
+        int(med_id): round(float(rate), 2)
+        for med_id, rate in zip(arrays.medication_ids, rates)
+    }
+
+
+def daily_matrix(arrays: DoseArrays, start_date: date, end_date: date):
+    """
+    Per-medication, per-day taken and missed counts.
+
+    Returns:
+        tuple: ``(medication_ids, taken, missed)`` where ``taken`` and
+               ``missed`` are integer matrices of shape
+               ``(len(medication_ids), days)``; column 0 is start_date.
+    """
+    n_days = (end_date - start_date).days + 1
+    n_meds = len(arrays.medication_ids)
+    window = arrays.between(start_date, end_date)
+    cells = (
+        arrays.medication_index[window] * n_days
+        + (arrays.days[window] - start_date.toordinal())
+    )
+    taken_mask = arrays.taken[window]
+    size = n_meds * n_days
+    taken = np.bincount(cells[taken_mask], minlength=size).reshape(n_meds, n_days)
+    missed = np.bincount(cells[~taken_mask], minlength=size).reshape(n_meds, n_days)
+    return arrays.medication_ids, taken, missed
+
+
+def period_rates(arrays: DoseArrays, start_date: date, end_date: date, medications=None) -> dict:
+    """
+    Adherence over a period, as in ``Medication.adherence_rate_over_period``.
+
+    Args:
+        arrays (DoseArrays): Loaded dose logs.
+        start_date (date): Start of the evaluation period.
+        end_date (date): End of the evaluation period.
+        medications (QuerySet): Medications to report (default: all).
+
+    Returns:
+        dict: Medication id mapped to adherence percentage, or to None
+              when the medication has no valid schedule.
+
+    Raises:
+        ValueError: If start_date > end_date.
+    """
+    if start_date > end_date:
+        raise ValueError("start_date must be before or equal to end_date")
+    if medications is None:
+        medications = Medication.objects.all()
+
+    schedule = np.array(
+        list(medications.order_by("pk").values_list("pk", "prescribed_per_day")),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    ids, per_day = schedule[:, 0], schedule[:, 1]
+    if not len(ids):
+        return {}
+
+    window = arrays.between(start_date, end_date)
+    log_meds = arrays.medication_ids[arrays.medication_index[window]]
+    log_meds = log_meds[arrays.taken[window]]
+    position = np.searchsorted(ids, log_meds)
+    known = (position < len(ids)) & (ids[np.minimum(position, len(ids) - 1)] == log_meds)
+    taken = np.bincount(position[known], minlength=len(ids))
+
+    days = (end_date - start_date).days + 1
+    expected = per_day * days
+    results = {}
+    for med_id, taken_count, expected_count in zip(ids, taken, expected):
+        if expected_count <= 0:
+            results[int(med_id)] = None
+        else:
+            results[int(med_id)] = round(float(taken_count / expected_count * 100), 2)
+    return results
+
+
+def population_report(start_date: date, end_date: date, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Build the population-level adherence report used by the API and CLI.
+
+    Only the doses of the period are loaded; overall adherence and the
+    total number of logs come from the Medication dose counters.
+
+    Returns:
+        dict: ``summary`` statistics and per-medication ``results``.
+
+    Raises:
+        ValueError: If start_date > end_date.
+        OverflowError: If the period cannot be converted to datetimes.
+    """
+    if start_date > end_date:
+        raise ValueError("start_date must be before or equal to end_date")
+    arrays = load_dose_arrays(chunk_size=chunk_size, start_date=start_date, end_date=end_date)
+    period = period_rates(arrays, start_date, end_date)
+    counters = {
+        med_id: (taken, total)
+        for med_id, taken, total in Medication.objects.values_list("pk", "taken_count", "total_count")
+    }
+
+    valid = np.array([rate for rate in period.values() if rate is not None], dtype=float)
+    summary = {
+        "medications": len(period),
+        "logs": sum(total for _taken, total in counters.values()),
+        "mean_period_adherence": round(float(valid.mean()), 2) if valid.size else None,
+        "median_period_adherence": round(float(np.median(valid)), 2) if valid.size else None,
+    }
+    results = [
+        {
+            "medication_id": med_id,
+            "adherence": Medication.adherence_from_counts(*counters.get(med_id, (0, 0))),
+            "period_adherence": rate,
+        }
+        for med_id, rate in period.items()
+    ]
+    return {"start": start_date, "end": end_date, "summary": summary, "results": results}
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class TrackerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "medtrackerapp"
+
+    def ready(self):
+        """Connect signal handlers maintaining derived dose aggregates."""
+        from . import signals  # noqa: F401
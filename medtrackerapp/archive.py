@@ -0,0 +1,321 @@
+"""
+Cold archive of old dose logs in compressed columnar files.
+
+``archive_doses`` moves logs older than a cutoff out of the live
+DoseLog table into one NumPy ``.npz`` file (``savez_compressed``) per
+medication and month under ``DOSELOG_ARCHIVE_DIR``. Each file holds the
+columns ``id``, ``taken_at`` (microseconds since the Unix epoch, UTC),
+``day`` (proleptic ordinal of the local day), ``was_taken``,
+``client_event_id`` and ``change_seq``, sorted by ``(taken_at, id)``.
+
+Archiving a segment writes a new file, then swaps the segment's
+registry row and deletes the live rows in one transaction; the old file
+is removed only after commit. A crash at any point therefore leaves
+either the old or the new state, never duplicates.
+
+Daily rollups, dose counters and change sequence numbers are kept, so
+the adherence methods stay exact without reading archives.
+:func:`logs_between`, :func:`load_columns` and :func:`changed_logs`
+expose archived logs to ``filter_by_date``, the population analytics
+and delta sync.
+"""
+import heapq
+import os
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain, groupby
+from operator import attrgetter
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .aggregates import dose_day, month_bounds, month_start
+from .models import DoseLog, DoseLogArchiveSegment
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+QUARTER_HOUR = 15 * 60 * 1_000_000  # microseconds
+DELETE_CHUNK_SIZE = 500
+
+
+def archive_dir() -> Path:
+    """Return the configured archive directory."""
+    return Path(getattr(settings, "DOSELOG_ARCHIVE_DIR", settings.BASE_DIR / "archive"))
+
+
+def _micros(taken_at) -> int:
+    return (taken_at - EPOCH) // timedelta(microseconds=1)
+
+
+def read_segment(segment: DoseLogArchiveSegment) -> dict:
+    """Load the columns of an archived segment."""
+    with np.load(archive_dir() / segment.file) as data:
+        return {name: data[name] for name in data.files}
+
+
+def _write_segment(medication_id, month, columns) -> str:
+    name = f"{medication_id}/{month:%Y-%m}-{uuid.uuid4().hex[:12]}.npz"
+    path = archive_dir() / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as handle:
+        np.savez_compressed(handle, **columns)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+    return name
+
+
+def archive_segment(medication_id: int, month, cutoff) -> int:
+    """
+    Archive one medication's live logs of one month older than ``cutoff``.
+
+    Logs already archived for that month are merged into the new file.
+
+    Returns:
+        int: Number of logs moved out of the database.
+    """
+    start, end = month_bounds(month)
+    logs = list(
+        DoseLog.objects.filter(
+            medication_id=medication_id,
+            taken_at__gte=start,
+            taken_at__lt=min(end, cutoff)
+        )
+        .order_by("taken_at", "id")
+        .values_list("id", "taken_at", "was_taken", "client_event_id", "change_seq")
+    )
+    if not logs:
+        return 0
+
+    ids, taken_at, was_taken, event_ids, seqs = zip(*logs)
+    columns = {
+        "id": np.array(ids, dtype=np.int64),
+        "taken_at": np.array([_micros(t) for t in taken_at], dtype=np.int64),
+        "day": np.array([dose_day(t).toordinal() for t in taken_at], dtype=np.int64),
+        "was_taken": np.array(was_taken, dtype=bool),
+        "client_event_id": np.array([e or "" for e in event_ids], dtype="<U64"),
+        "change_seq": np.array(seqs, dtype=np.int64),
+    }
+    previous = DoseLogArchiveSegment.objects.filter(medication_id=medication_id, month=month).first()
+    if previous is not None:
+        old = read_segment(previous)
+        columns = {name: np.concatenate([old[name], values]) for name, values in columns.items()}
+        order = np.lexsort((columns["id"], columns["taken_at"]))
+        columns = {name: values[order] for name, values in columns.items()}
+
+    name = _write_segment(medication_id, month, columns)
+    with transaction.atomic():
+        DoseLogArchiveSegment.objects.update_or_create(
+            medication_id=medication_id,
+            month=month,
+            defaults={
+                "file": name,
+                "rows": len(columns["id"]),
+                "max_change_seq": int(columns["change_seq"].max()),
+            }
+        )
+        table = connection.ops.quote_name(DoseLog._meta.db_table)
+        with connection.cursor() as cursor:
+            for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+                chunk = ids[i:i + DELETE_CHUNK_SIZE]
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk
+                )
+        if previous is not None:
+            stale = archive_dir() / previous.file
+            transaction.on_commit(lambda: stale.unlink(missing_ok=True))
+    return len(ids)
+
+
+def archive_before(cutoff):
+    """
+    Archive every live log with ``taken_at < cutoff``, segment by segment.
+
+    Yields:
+        tuple: ``(medication_id, month, moved)`` per archived segment.
+    """
+    segments = (
+        DoseLog.objects.filter(taken_at__lt=cutoff)
+        .annotate(month=TruncMonth("taken_at"))
+        .values_list("medication_id", "month")
+        .distinct()
+        .order_by("medication_id", "month")
+    )
+    for medication_id, month in list(segments):
+        month = month_start(dose_day(month))
+        yield medication_id, month, archive_segment(medication_id, month, cutoff)
+
+
+def _segments(start, end, medication_ids=None):
+    segments = DoseLogArchiveSegment.objects.filter(
+        month__gte=month_start(dose_day(start)),
+        month__lte=month_start(dose_day(end - timedelta(microseconds=1)))
+    )
+    if medication_ids is not None:
+        segments = segments.filter(medication_id__in=medication_ids)
+    return segments.select_related("medication")
+
+
+def _log(segment, columns, i) -> DoseLog:
+    return DoseLog(
+        id=int(columns["id"][i]),
+        medication=segment.medication,
+        taken_at=EPOCH + timedelta(microseconds=int(columns["taken_at"][i])),
+        was_taken=bool(columns["was_taken"][i]),
+        client_event_id=str(columns["client_event_id"][i]) or None,
+        change_seq=int(columns["change_seq"][i]),
+    )
+
+
+def _segment_logs(segment, start, end):
+    columns = read_segment(segment)
+    lo, hi = np.searchsorted(columns["taken_at"], [_micros(start), _micros(end)], side="left")
+    for i in range(lo, hi):
+        yield _log(segment, columns, i)
+
+
+def logs_between(start, end, medication_ids=None):
+    """
+    Yield archived logs with ``start <= taken_at < end`` in ``(taken_at, id)`` order.
+
+    Only segments whose month overlaps the range are opened, one month
+    at a time: the segments of a month are loaded when its first log is
+    needed and merged, and each is binary-searched on ``taken_at``.
+    Memory therefore holds at most one month of segments, however long
+    the range. Logs are unsaved, read-only DoseLog instances.
+    """
+    segments = _segments(start, end, medication_ids).order_by("month", "pk")
+    for _month, group in groupby(segments.iterator(), key=attrgetter("month")):
+        yield from heapq.merge(
+            *[_segment_logs(segment, start, end) for segment in group],
+            key=attrgetter("taken_at", "id")
+        )
+
+
+def changed_logs(since: int, limit: int) -> list:
+    """
+    Return the ``limit`` archived logs with the lowest ``change_seq`` above ``since``.
+
+    Only segments whose ``max_change_seq`` is above ``since`` are
+    opened, so incremental syncs normally read no file at all. Logs are
+    unsaved, read-only DoseLog instances in ``change_seq`` order.
+    """
+    logs = []
+    segments = DoseLogArchiveSegment.objects.filter(max_change_seq__gt=since).select_related("medication")
+    for segment in segments.order_by("pk").iterator():
+        columns = read_segment(segment)
+        seqs = columns["change_seq"]
+        picked = np.flatnonzero(seqs > since)
+        picked = picked[np.argsort(seqs[picked], kind="stable")][:limit]
+        logs = heapq.nsmallest(
+            limit,
+            chain(logs, (_log(segment, columns, i) for i in picked)),
+            key=attrgetter("change_seq")
+        )
+    return logs
+
+
+def load_log_columns(medication_ids):
+    """
+    Yield the ``(medication_ids, taken_at, ids, taken)`` arrays of every archived log.
+
+    ``taken_at`` is in microseconds since the Unix epoch (UTC).
+
+    Args:
+        medication_ids: Medications whose segments are read (a list or
+            a ``pk`` queryset).
+    """
+    segments = DoseLogArchiveSegment.objects.filter(medication_id__in=medication_ids).order_by("pk")
+    for segment in segments.iterator():
+        columns = read_segment(segment)
+        yield (
+            np.full(len(columns["id"]), segment.medication_id, dtype=np.int64),
+            columns["taken_at"],
+            columns["id"],
+            columns["was_taken"],
+        )
+
+
+def heatmap_counts(medication_ids):
+    """
+    Count archived doses by local day of week and hour of day.
+
+    Timestamps are converted to the current time zone once per distinct
+    quarter hour (every UTC offset is a multiple of 15 minutes), then
+    counted with ``bincount``.
+
+    Returns:
+        tuple: ``taken`` and ``missed`` 7 × 24 integer arrays, indexed
+        ``[weekday][hour]`` with weekday 0 as Monday.
+    """
+    taken = np.zeros(7 * 24, dtype=np.int64)
+    missed = np.zeros(7 * 24, dtype=np.int64)
+    for _meds, taken_at, _ids, was_taken in load_log_columns(medication_ids):
+        quarters, index = np.unique(taken_at // QUARTER_HOUR, return_inverse=True)
+        local = [
+            timezone.localtime(EPOCH + timedelta(microseconds=int(quarter) * QUARTER_HOUR))
+            for quarter in quarters
+        ]
+        cells = np.array([moment.weekday() * 24 + moment.hour for moment in local], dtype=np.int64)[index]
+        taken += np.bincount(cells[was_taken], minlength=7 * 24)
+        missed += np.bincount(cells[~was_taken], minlength=7 * 24)
+    return taken.reshape(7, 24), missed.reshape(7, 24)
+
+
+def load_columns(start_date=None, end_date=None):
+    """
+    Yield ``(medication_ids, days, taken)`` arrays of the archived segments.
+
+    Days are local-day ordinals as in ``analytics.load_dose_arrays``.
+    With ``start_date`` and ``end_date`` only the segments of the
+    overlapping months are read, and only the logs of the days in
+    ``[start_date, end_date]`` are returned.
+    """
+    segments = DoseLogArchiveSegment.objects.order_by("pk")
+    if start_date is not None:
+        segments = segments.filter(month__gte=month_start(start_date), month__lte=month_start(end_date))
+    for segment in segments.iterator():
+        columns = read_segment(segment)
+        days, was_taken = columns["day"], columns["was_taken"]
+        if start_date is not None:
+            lo, hi = np.searchsorted(days, [start_date.toordinal(), end_date.toordinal() + 1], side="left")
+            days, was_taken = days[lo:hi], was_taken[lo:hi]
+        yield np.full(len(days), segment.medication_id, dtype=np.int64), days, was_taken
+
+
+def truncate_segment(segment: DoseLogArchiveSegment, cutoff) -> dict:
+    """
+    Remove a segment's logs taken before ``cutoff``.
+
+    The remaining logs are written to a new file, or the segment is
+    deleted when none remain; the old file is removed after commit.
+    Call inside the transaction recording what the logs are turned into.
+
+    Returns:
+        dict: The columns of the removed logs.
+    """
+    columns = read_segment(segment)
+    split = int(np.searchsorted(columns["taken_at"], _micros(cutoff), side="left"))
+    removed = {name: values[:split] for name, values in columns.items()}
+    if not split:
+        return removed
+    if split == len(columns["id"]):
+        segment.delete()  # The post_delete handler removes the file.
+    else:
+        remove_segment_file(segment)
+        kept = {name: values[split:] for name, values in columns.items()}
+        segment.file = _write_segment(segment.medication_id, segment.month, kept)
+        segment.rows = len(kept["id"])
+        segment.max_change_seq = int(kept["change_seq"].max())
+        segment.save(update_fields=["file", "rows", "max_change_seq"])
+    return removed
+
+
+def remove_segment_file(segment: DoseLogArchiveSegment):
+    """Delete a segment's file once the deleting transaction commits."""
+    path = archive_dir() / segment.file
+    transaction.on_commit(lambda: path.unlink(missing_ok=True))
@@ -0,0 +1,141 @@
+"""
+Versioned caching of adherence results.
+
+Every medication has a version number stored in Django's cache. Result
+keys embed the current version, so invalidation is a single ``incr``:
+after a bump, older entries are simply never read again and expire on
+their own. Versions are bumped by the DoseLog and Medication signal
+handlers, ``rebuild_rollups`` and ``check_dose_counters --repair``,
+both immediately and again on commit, so a reader racing an
+uncommitted write cannot pin a stale value under the new version.
+
+Only ``adherence_rate_over_period`` is cached; ``adherence_rate`` reads
+the in-memory counters and would gain nothing.
+
+The cache must be shared by all worker processes (Redis via
+``REDIS_URL``): a bump in one process has to be seen by the others.
+Without a shared backend the settings fall back to ``DummyCache``, so
+every lookup misses and results are always computed fresh.
+"""
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Thread-safe, process-local hit/miss counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        """Return the current counters and hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def _cache():
+    return caches[getattr(settings, "ADHERENCE_CACHE_ALIAS", "default")]
+
+
+def _version_key(medication_id) -> str:
+    return f"medtracker:adherence:version:{medication_id}"
+
+
+def get_version(medication_id) -> int:
+    """Return the current cache version of a medication, creating it if needed."""
+    cache = _cache()
+    key = _version_key(medication_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeding from the clock keeps a re-created version (e.g. after
+        # eviction) from colliding with values cached under older ones.
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(medication_id):
+    """Invalidate every cached result of a medication."""
+    cache = _cache()
+    key = _version_key(medication_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(medication_id):
+    """Bump the medication's version now and again when the transaction commits."""
+    bump_version(medication_id)
+    transaction.on_commit(lambda: bump_version(medication_id))
+
+
+def cached_adherence(*fields):
+    """
+    Cache a Medication adherence method per medication version and arguments.
+
+    Results are computed from the database and from the instance fields
+    named in ``fields``; those values are part of the key, so a stale
+    in-memory instance never stores its result for fresher readers.
+    Unsaved instances bypass the cache, and exceptions are never cached.
+
+    Usage:
+        @cached_adherence("prescribed_per_day")
+        def adherence_rate_over_period(self, start_date, end_date): ...
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.pk is None:
+                return method(self, *args, **kwargs)
+
+            cache = _cache()
+            arguments = [str(arg) for arg in args]
+            arguments += [f"{name}={value}" for name, value in sorted(kwargs.items())]
+            arguments += [f"{field}={getattr(self, field)}" for field in fields]
+            key = "medtracker:adherence:{}:{}:{}:{}".format(
+                self.pk, get_version(self.pk), method.__name__, ",".join(arguments)
+            )
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                stats.record(hit=True)
+                return value
+
+            stats.record(hit=False)
+            value = method(self, *args, **kwargs)
+            cache.set(key, value, getattr(settings, "ADHERENCE_CACHE_TIMEOUT", 3600))
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,218 @@
+"""
+Retention compaction of old dose logs into per-day summaries.
+
+``compact_doses`` deletes every dose log older than a retention horizon
+and adds its per-day taken/missed counts to :class:`CompactedDoseDay`,
+whichever storage tier holds it: the live DoseLog table, the monthly
+partitions (attached or detached) or the archived segments. The
+recorded days of dropped partitions past the horizon are folded into
+the compacted days too, so nothing older than the horizon is kept in
+any other form and storage stays flat however long the history.
+
+Each transaction is short: live and partitioned logs go in batches of
+at most ``batch_size`` (the oldest remaining, found through the
+``taken_at`` index) and archived logs one segment at a time, so
+SQLite's write lock is never held for long and an interrupted run
+simply resumes. Partitions left empty are dropped. Compacted logs get
+no tombstones of their own: a single ``Tombstone.COMPACTION`` carrying
+the cutoff tells synced clients to drop every log taken before it.
+
+The daily rollups and Medication counters already include every log
+and are left untouched, so ``adherence_rate`` and
+``adherence_rate_over_period`` keep combining compacted and raw doses
+without reading either. ``rebuild_rollups`` and ``check_dose_counters``
+add the compacted days back to the counts of the remaining logs, and
+:func:`load_columns` expands them for the population analytics.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from . import archive, partitions
+from .aggregates import dose_day, month_start
+from .models import (
+    ChangeSequence, CompactedDoseDay, DoseLog, DoseLogArchiveSegment, DoseLogPartition, PartitionedDoseDay, Tombstone
+)
+
+DEFAULT_BATCH_SIZE = 1000
+DELETE_CHUNK_SIZE = 500
+
+
+def record_compacted(counts):
+    """
+    Add per-day counts to the compacted days.
+
+    Args:
+        counts (dict): ``(medication_id, date)`` mapped to ``[taken, missed]``.
+    """
+    for (medication_id, day), (taken, missed) in counts.items():
+        if taken or missed:
+            CompactedDoseDay.apply_delta(medication_id, day, taken, missed)
+
+
+def _compact_rows(model, cutoff, batch_size) -> dict:
+    """Delete the oldest rows of a DoseLog-like table before ``cutoff``; return their day counts."""
+    logs = list(
+        model.objects.filter(taken_at__lt=cutoff)
+        .order_by("taken_at", "id")
+        .values_list("id", "medication_id", "taken_at", "was_taken")[:batch_size]
+    )
+    counts = defaultdict(lambda: [0, 0])
+    for _id, medication_id, taken_at, was_taken in logs:
+        counts[(medication_id, dose_day(taken_at))][0 if was_taken else 1] += 1
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    ids = [log[0] for log in logs]
+    with connection.cursor() as cursor:
+        for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+            chunk = ids[i:i + DELETE_CHUNK_SIZE]
+            cursor.execute(f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    return counts
+
+
+def compact_batch(cutoff, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Compact the oldest live logs taken before ``cutoff``, in one transaction.
+
+    Returns:
+        int: Number of logs compacted; 0 when nothing is left.
+    """
+    with transaction.atomic():
+        counts = _compact_rows(DoseLog, cutoff, batch_size)
+        record_compacted(counts)
+    return sum(taken + missed for taken, missed in counts.values())
+
+
+def compact_partition_batch(partition: DoseLogPartition, cutoff, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Compact the oldest logs of one partition taken before ``cutoff``, in one transaction.
+
+    Their counts move from :class:`PartitionedDoseDay` to the compacted
+    days; a partition left empty is dropped.
+
+    Returns:
+        int: Number of logs compacted; 0 when nothing is left.
+    """
+    with transaction.atomic():
+        partition = DoseLogPartition.objects.select_for_update().filter(pk=partition.pk).first()
+        if partition is None:
+            return 0
+        model = partitions.partition_model(partition)
+        counts = _compact_rows(model, cutoff, batch_size)
+        record_compacted(counts)
+        for (medication_id, day), (taken, missed) in counts.items():
+            PartitionedDoseDay.apply_delta(medication_id, day, -taken, -missed)
+        PartitionedDoseDay.objects.filter(taken=0, missed=0).delete()
+        compacted = sum(taken + missed for taken, missed in counts.values())
+        DoseLogPartition.objects.filter(pk=partition.pk).update(rows=Greatest(F("rows") - compacted, 0))
+        if not model.objects.exists():
+            partitions.drop_partition(partition.month)
+    return compacted
+
+
+def compact_segment(segment: DoseLogArchiveSegment, cutoff) -> int:
+    """
+    Compact the logs of one archived segment taken before ``cutoff``, in one transaction.
+
+    Returns:
+        int: Number of logs compacted.
+    """
+    with transaction.atomic():
+        removed = archive.truncate_segment(segment, cutoff)
+        counts = defaultdict(lambda: [0, 0])
+        for day, was_taken in zip(removed["day"].tolist(), removed["was_taken"].tolist()):
+            counts[(segment.medication_id, date.fromordinal(day))][0 if was_taken else 1] += 1
+        record_compacted(counts)
+    return len(removed["id"])
+
+
+def compact_dropped_days(cutoff) -> int:
+    """
+    Fold the recorded days of dropped partitions before ``cutoff`` into the compacted days.
+
+    Returns:
+        int: Number of doses those days summarized.
+    """
+    with transaction.atomic():
+        days = partitions.dropped_days().filter(date__lt=dose_day(cutoff))
+        rows = list(days.values_list("pk", "medication_id", "date", "taken", "missed"))
+        record_compacted({(medication_id, day): [taken, missed] for _pk, medication_id, day, taken, missed in rows})
+        PartitionedDoseDay.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    return sum(taken + missed for *_key, taken, missed in rows)
+
+
+def record_compaction(cutoff):
+    """
+    Tell synced clients that every log taken before ``cutoff`` is gone.
+
+    Leaves one ``Tombstone.COMPACTION`` and deletes those it supersedes.
+    """
+    micros = (cutoff - archive.EPOCH) // timedelta(microseconds=1)
+    with transaction.atomic():
+        Tombstone.objects.filter(kind=Tombstone.COMPACTION, object_id__lte=micros).delete()
+        Tombstone.objects.create(kind=Tombstone.COMPACTION, object_id=micros, change_seq=ChangeSequence.allocate())
+
+
+def _compact_tiers(cutoff, batch_size):
+    while compacted := compact_batch(cutoff, batch_size):
+        yield compacted
+
+    last_month = month_start(dose_day(cutoff))
+    for partition in DoseLogPartition.objects.filter(month__lte=last_month):
+        while compacted := compact_partition_batch(partition, cutoff, batch_size):
+            yield compacted
+
+    for segment in DoseLogArchiveSegment.objects.filter(month__lte=last_month).order_by("month", "pk"):
+        if compacted := compact_segment(segment, cutoff):
+            yield compacted
+
+    if compacted := compact_dropped_days(cutoff):
+        yield compacted
+
+
+def compact_before(cutoff, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Compact every dose taken before ``cutoff`` in every storage tier.
+
+    Live logs go first, then each partition and archived segment
+    overlapping the range, then the recorded days of dropped partitions.
+    Once done, a compaction tombstone is left for delta sync.
+
+    Yields:
+        int: Number of doses compacted by each transaction.
+    """
+    total = 0
+    for compacted in _compact_tiers(cutoff, batch_size):
+        total += compacted
+        yield compacted
+    if total:
+        record_compaction(cutoff)
+
+
+def load_columns(days=None):
+    """
+    Yield ``(medication_ids, days, taken)`` arrays with one entry per compacted dose.
+
+    Days are local-day ordinals as in ``analytics.load_dose_arrays``.
+
+    Args:
+        days (QuerySet): Per-day counts to expand (default: every
+            CompactedDoseDay).
+    """
+    if days is None:
+        days = CompactedDoseDay.objects.all()
+    rows = list(days.order_by().values_list("medication_id", "date", "taken", "missed"))
+    if not rows:
+        return
+    meds, days, taken, missed = zip(*rows)
+    # Interleave taken/missed counts per day and repeat each day's values.
+    counts = np.column_stack([taken, missed]).ravel()
+    yield (
+        np.repeat(np.repeat(np.array(meds, dtype=np.int64), 2), counts),
+        np.repeat(np.repeat(np.array([day.toordinal() for day in days], dtype=np.int64), 2), counts),
+        np.repeat(np.tile([True, False], len(rows)), counts),
+    )
@@ -0,0 +1,120 @@
+"""
+Conditional GET for the Medication, DoseLog and Note endpoints.
+
+Polling clients send back the ``ETag`` (``If-None-Match``) or
+``Last-Modified`` (``If-Modified-Since``) of their previous response
+and get an empty HTTP 304 while nothing changed. Validators come from
+cheap fingerprints computed before anything is serialized:
+
+* lists: one aggregate of count, max id and max ``updated_at`` over the
+  filtered queryset (plus, for models showing their medication's name,
+  the newest ``edited_at`` of the medications in the result) and the
+  newest tombstone of the model, so deletes are seen by
+  ``Last-Modified`` too. The paginated dose log list instead
+  fingerprints the rows of the requested page, which it fetches anyway
+  (see ``DoseLogViewSet.list``), so a page stays O(page size);
+* details: the object's id and ``updated_at`` (and its medication's
+  ``edited_at``).
+
+``Medication.edited_at`` only changes when a medication is saved, not
+when dose writes bump its counters, so dose logging does not
+invalidate the notes of every medication.
+
+ETags are weak, since the same state may be rendered in several
+formats, and also cover the request path and query string (filters,
+pagination cursor) and the negotiated format.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .models import Tombstone
+
+
+def latest(*values):
+    """Return the newest of the given timestamps, ignoring None."""
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified validation to ``list`` and ``retrieve``.
+
+    Attributes:
+        tombstone_kind (str): ``Tombstone.kind`` of the viewset's model.
+        etag_related_field (str): Foreign key to a Medication whose
+            ``edited_at`` also changes the representation (e.g. a joined
+            name), or None.
+    """
+
+    tombstone_kind = None
+    etag_related_field = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list(lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        related_at = None
+        if self.etag_related_field:
+            related_at = getattr(instance, self.etag_related_field).edited_at
+        return self.conditional_response(
+            [instance.pk, instance.updated_at, related_at],
+            latest(instance.updated_at, related_at),
+            lambda: Response(self.get_serializer(instance).data)
+        )
+
+    def conditional_list(self, render):
+        """
+        Answer a list request with 304 or ``render()``.
+
+        For viewsets that override ``list``; the fingerprint covers
+        ``filter_queryset(get_queryset())``.
+        """
+        aggregates = {"count": Count("pk"), "max_id": Max("pk"), "updated_at": Max("updated_at")}
+        if self.etag_related_field:
+            aggregates["related_at"] = Max(f"{self.etag_related_field}__edited_at")
+        fingerprint = self.filter_queryset(self.get_queryset()).aggregate(**aggregates)
+        deleted_at = self.latest_deletion()
+
+        return self.conditional_response(
+            [*fingerprint.values(), deleted_at],
+            latest(fingerprint["updated_at"], fingerprint.get("related_at"), deleted_at),
+            render
+        )
+
+    def latest_deletion(self):
+        """Return when a row of the viewset's model was last deleted, or None."""
+        return (
+            Tombstone.objects.filter(kind=self.tombstone_kind)
+            .order_by("-change_seq")
+            .values_list("deleted_at", flat=True)
+            .first()
+        )
+
+    def conditional_response(self, parts, last_modified, render):
+        """
+        Answer 304 if the client's validators match, else ``render()``.
+
+        Args:
+            parts (list): Values fingerprinting the response content.
+            last_modified (datetime): Newest change covered, or None.
+            render (callable): Builds the full response.
+        """
+        request = self.request
+        key = [request.get_full_path(), request.accepted_renderer.format, *parts]
+        etag = 'W/"%s"' % hashlib.sha1(repr(key).encode()).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
@@ -0,0 +1,148 @@
+"""
+Batched DoseLog ingestion.
+
+Rows are inserted with ``bulk_create`` in fixed-size batches, one
+transaction per batch. ``bulk_create`` bypasses model signals, so each
+batch feeds its rows through :class:`DoseChangeSet` to keep the daily
+rollups, counters, sketch and caches in sync, and stamps the rows
+with change sequence numbers for delta sync. Rows with a
+``client_event_id`` are upserted, so client retries never duplicate.
+"""
+from itertools import count, islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .aggregates import DoseChangeSet
+from .models import ChangeSequence, DoseLog
+
+DEFAULT_BATCH_SIZE = 500
+CONFLICT_MODES = ("ignore", "update")
+
+
+def default_batch_size() -> int:
+    """Return the configured ingestion batch size."""
+    return getattr(settings, "DOSELOG_BULK_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+
+def batched(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def insert_batch(rows, on_conflict: str = "ignore") -> dict:
+    """
+    Insert one batch of dose rows and their aggregate deltas atomically.
+
+    Rows carrying a ``client_event_id`` are upserted: with
+    ``on_conflict="ignore"`` an id that is already stored (or repeated
+    earlier in the batch) is skipped, with ``on_conflict="update"`` the
+    stored row is overwritten by the last occurrence.
+
+    The aggregate deltas follow the rows actually written. Stored rows
+    are read (and, when overwritten, locked) in one query; new keyed
+    rows are inserted with ``ignore_conflicts`` and read back by their
+    change sequence numbers, so a row that a concurrent request
+    inserted first is never counted twice. In ``update`` mode such rows
+    are then locked and overwritten like the other stored rows.
+
+    Args:
+        rows (list[dict]): Rows with ``medication_id``, ``taken_at``,
+            ``was_taken`` and optionally ``client_event_id`` keys;
+            medications must exist.
+        on_conflict (str): ``"ignore"`` or ``"update"``.
+
+    Returns:
+        dict: ``created``, ``updated`` and ``ignored`` row counts.
+    """
+    if on_conflict not in CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_MODES}")
+
+    plain = []
+    keyed = {}
+    for row in rows:
+        key = row.get("client_event_id")
+        if key is None:
+            plain.append(row)
+        elif on_conflict == "update" or key not in keyed:
+            keyed[key] = row
+
+    with transaction.atomic():
+        changes = DoseChangeSet()
+        existing = _stored_states(list(keyed), lock=on_conflict == "update")
+
+        reserved = len(plain) + len(keyed)
+        seqs = count(ChangeSequence.allocate(reserved) - reserved + 1 if reserved else 0)
+        DoseLog.objects.bulk_create([DoseLog(**row, change_seq=next(seqs)) for row in plain])
+
+        fresh = [DoseLog(**row, change_seq=next(seqs)) for key, row in keyed.items() if key not in existing]
+        inserted = []
+        if fresh:
+            DoseLog.objects.bulk_create(fresh, ignore_conflicts=True)
+            written = dict(
+                DoseLog.objects.filter(client_event_id__in=[log.client_event_id for log in fresh])
+                .values_list("client_event_id", "change_seq")
+            )
+            inserted = [log for log in fresh if written.get(log.client_event_id) == log.change_seq]
+            if on_conflict == "update" and len(inserted) < len(fresh):
+                inserted_keys = {log.client_event_id for log in inserted}
+                raced = [log.client_event_id for log in fresh if log.client_event_id not in inserted_keys]
+                existing.update(_stored_states(raced, lock=True))
+
+        overwritten = []
+        if on_conflict == "update" and existing:
+            overwritten = [DoseLog(**keyed[key], change_seq=next(seqs)) for key in existing]
+            DoseLog.objects.bulk_create(
+                overwritten,
+                update_conflicts=True,
+                unique_fields=["client_event_id"],
+                update_fields=["medication", "taken_at", "was_taken", "change_seq", "updated_at"]
+            )
+            for state in existing.values():
+                changes.remove(*state)
+
+        for row in plain:
+            changes.add(row["medication_id"], row["taken_at"], row["was_taken"])
+        for log in inserted + overwritten:
+            changes.add(log.medication_id, log.taken_at, log.was_taken)
+        changes.apply()
+
+    created = len(plain) + len(inserted)
+    return {"created": created, "updated": len(overwritten), "ignored": len(rows) - created - len(overwritten)}
+
+
+def _stored_states(keys, lock: bool) -> dict:
+    """Return ``client_event_id`` mapped to ``(medication_id, taken_at, was_taken)`` of stored rows."""
+    if not keys:
+        return {}
+    logs = DoseLog.objects.filter(client_event_id__in=keys)
+    if lock:
+        logs = logs.select_for_update()
+    return {
+        key: state
+        for key, *state in logs.values_list("client_event_id", "medication_id", "taken_at", "was_taken")
+    }
+
+
+def ingest_dose_logs(rows, batch_size=None, on_conflict: str = "ignore") -> dict:
+    """
+    Insert dose rows in batches, one transaction per batch.
+
+    Args:
+        rows (iterable[dict]): Validated rows (see ``insert_batch``).
+        batch_size (int): Rows per batch (default: DOSELOG_BULK_BATCH_SIZE).
+        on_conflict (str): How repeated ``client_event_id`` values are handled.
+
+    Returns:
+        dict: ``created``, ``updated`` and ``ignored`` row counts and
+              the number of ``batches``.
+    """
+    batch_size = batch_size or default_batch_size()
+    result = {"created": 0, "updated": 0, "ignored": 0, "batches": 0}
+    for batch in batched(rows, batch_size):
+        for key, value in insert_batch(batch, on_conflict).items():
+            result[key] += value
+        result["batches"] += 1
+    return result
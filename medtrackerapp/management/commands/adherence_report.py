@@ -0,0 +1,68 @@
+import csv
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from medtrackerapp import analytics
+
+
+class Command(BaseCommand):
+    """
+    Print a population-level adherence report computed with NumPy.
+
+    Usage:
+        python manage.py adherence_report --start YYYY-MM-DD --end YYYY-MM-DD
+            [--format json|csv] [--daily] [--chunk-size N]
+
+    With ``--daily`` the per-medication, per-day taken/missed matrix
+    for the period is written as CSV instead of the summary report.
+    """
+
+    help = "Compute population-level adherence statistics over a period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", required=True, type=date.fromisoformat, help="Period start (YYYY-MM-DD).")
+        parser.add_argument("--end", required=True, type=date.fromisoformat, help="Period end (YYYY-MM-DD).")
+        parser.add_argument("--format", choices=["json", "csv"], default="json", help="Output format (default: json).")
+        parser.add_argument("--daily", action="store_true", help="Write the per-day taken/missed matrix as CSV.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=analytics.DEFAULT_CHUNK_SIZE,
+            help=f"Rows loaded per batch (default: {analytics.DEFAULT_CHUNK_SIZE})."
+        )
+
+    def handle(self, *args, **options):
+        start_date, end_date = options["start"], options["end"]
+        if start_date > end_date:
+            raise CommandError("start_date must be before or equal to end_date")
+
+        if options["daily"]:
+            arrays = analytics.load_dose_arrays(
+                chunk_size=options["chunk_size"], start_date=start_date, end_date=end_date
+            )
+            medication_ids, taken, missed = analytics.daily_matrix(arrays, start_date, end_date)
+            writer = csv.writer(self.stdout)
+            writer.writerow(["medication_id", "date", "taken", "missed"])
+            start_ordinal = start_date.toordinal()
+            for row, med_id in enumerate(medication_ids):
+                for col in range(taken.shape[1]):
+                    writer.writerow([
+                        int(med_id),
+                        date.fromordinal(start_ordinal + col).isoformat(),
+                        int(taken[row, col]),
+                        int(missed[row, col]),
+                    ])
+            return
+
+        report = analytics.population_report(start_date, end_date, chunk_size=options["chunk_size"])
+        if options["format"] == "json":
+            self.stdout.write(json.dumps(report, cls=DjangoJSONEncoder, indent=2))
+            return
+
+        writer = csv.writer(self.stdout)
+        writer.writerow(["medication_id", "adherence", "period_adherence"])
+        for row in report["results"]:
+            writer.writerow([row["medication_id"], row["adherence"], row["period_adherence"]])
@@ -0,0 +1,44 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from medtrackerapp import archive
+from medtrackerapp.aggregates import day_bounds
+
+
+class Command(BaseCommand):
+    """
+    Move old dose logs into compressed per-medication-month archive files.
+
+    Logs taken before ``--before`` (default: ``DOSELOG_HOT_DAYS`` days
+    ago) are written to ``DOSELOG_ARCHIVE_DIR`` and deleted from the
+    database, one segment per transaction. Daily rollups and dose
+    counters are kept, and ``filter_by_date`` keeps returning archived
+    logs. Re-running the command is safe.
+
+    Usage:
+        python manage.py archive_doses [--before YYYY-MM-DD]
+    """
+
+    help = "Archive dose logs older than a cutoff date to compressed files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="Archive logs taken before this date (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                before = date.fromisoformat(options["before"])
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+        else:
+            before = timezone.localdate() - timedelta(days=getattr(settings, "DOSELOG_HOT_DAYS", 90))
+
+        cutoff, _end = day_bounds(before, before)
+        total = 0
+        for medication_id, month, moved in archive.archive_before(cutoff):
+            total += moved
+            self.stdout.write(f"Archived {moved} logs of medication {medication_id} for {month:%Y-%m}")
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} logs archived before {before}."))
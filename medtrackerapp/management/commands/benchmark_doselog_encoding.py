@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from medtrackerapp.models import DoseLog
+from medtrackerapp.serializers import DoseLogRowEncoder, DoseLogSerializer
+
+
+class Command(BaseCommand):
+    """
+    Compare the per-row cost of DoseLogSerializer and DoseLogRowEncoder.
+
+    Reads the newest ``--rows`` existing dose logs through both paths
+    (the serializer over a plain queryset, as the list endpoint did
+    before, and the encoder over ``values()``), checks that their
+    output is identical and reports the best of ``--repeat`` runs.
+    Read-only; seed logs first (e.g. with ``import_doses``).
+
+    Usage:
+        python manage.py benchmark_doselog_encoding [--rows N] [--repeat N]
+    """
+
+    help = "Benchmark serializer vs. values() encoding of dose logs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Logs encoded per run (default: 10000).")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per path (default: 3).")
+
+    def handle(self, *args, **options):
+        queryset = DoseLog.objects.order_by("-taken_at", "-id")[:max(options["rows"], 1)]
+        rows = queryset.count()
+        if not rows:
+            raise CommandError("No dose logs to encode.")
+
+        paths = {
+            # Fresh querysets so no run reuses cached rows or medications.
+            "serializer": lambda: DoseLogSerializer(queryset.all(), many=True).data,
+            "values": lambda: DoseLogRowEncoder().encode_rows(DoseLogRowEncoder.values(queryset.all())),
+        }
+        outputs = {}
+        for name, run in paths.items():
+            best = None
+            for _ in range(max(options["repeat"], 1)):
+                queries = []
+                with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                    started = time.perf_counter()
+                    outputs[name] = [dict(row) for row in run()]
+                    elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f"{name:>10}: {best * 1e6 / rows:8.2f} µs/row, {best * 1e3:9.1f} ms total, "
+                f"{len(queries)} queries"
+            )
+
+        if outputs["serializer"] != outputs["values"]:
+            raise CommandError("Encoder output differs from DoseLogSerializer output.")
+        self.stdout.write(self.style.SUCCESS(f"Outputs identical for {rows} logs."))
@@ -0,0 +1,92 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from medtrackerapp import cache as adherence_cache
+from medtrackerapp.aggregates import history_day_counts, rebuild_adherence_sketch
+from medtrackerapp.models import Medication
+
+
+class Command(BaseCommand):
+    """
+    Verify the denormalized Medication dose counters against DoseLog.
+
+    Medications are checked in primary-key chunks by comparing
+    ``taken_count``/``total_count`` with grouped counts over their
+    logs in every storage tier (live, partitioned, archived and
+    compacted; see ``aggregates.history_day_counts``). With
+    ``--repair`` mismatching counters are overwritten, one transaction
+    per chunk, and the fleet adherence sketch is rebuilt afterwards.
+    Each chunk's counters are locked and compared with counts read in
+    that same transaction, so concurrent dose writes are never undone.
+
+    Usage:
+        python manage.py check_dose_counters [--repair] [--chunk-size N]
+    """
+
+    help = "Check (and optionally repair) Medication taken/total dose counters."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Overwrite counters that do not match the dose logs."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of medications checked per query (default: 500)."
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 1)
+        medications = Medication.objects.order_by("pk")
+
+        last_id = 0
+        checked = 0
+        mismatched = 0
+        if options["repair"]:
+            medications = medications.select_for_update()
+        while True:
+            with transaction.atomic():
+                chunk = list(
+                    medications.filter(pk__gt=last_id).values("pk", "taken_count", "total_count")[:chunk_size]
+                )
+                if not chunk:
+                    break
+                ids = [row["pk"] for row in chunk]
+                totals = defaultdict(lambda: [0, 0])
+                for (medication_id, _day), (taken, missed) in history_day_counts(ids).items():
+                    totals[medication_id][0] += taken
+                    totals[medication_id][1] += taken + missed
+                for row in chunk:
+                    stored = (row["taken_count"], row["total_count"])
+                    actual = tuple(totals[row["pk"]])
+                    if stored == actual:
+                        continue
+                    mismatched += 1
+                    self.stdout.write(
+                        f"Medication {row['pk']}: stored taken/total {stored[0]}/{stored[1]}, "
+                        f"actual {actual[0]}/{actual[1]}"
+                    )
+                    if options["repair"]:
+                        Medication.objects.filter(pk=row["pk"]).update(
+                            taken_count=actual[0],
+                            total_count=actual[1],
+                            updated_at=timezone.now()
+                        )
+                        adherence_cache.invalidate(row["pk"])
+            checked += len(chunk)
+            last_id = chunk[-1]["pk"]
+
+        if options["repair"] and mismatched:
+            rebuild_adherence_sketch()
+
+        action = "repaired" if options["repair"] else "found"
+        style = self.style.SUCCESS if not mismatched or options["repair"] else self.style.WARNING
+        self.stdout.write(style(
+            f"Checked {checked} medications, {action} {mismatched} mismatched counters."
+        ))
@@ -0,0 +1,50 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from medtrackerapp import compaction
+from medtrackerapp.aggregates import day_bounds
+
+
+class Command(BaseCommand):
+    """
+    Collapse dose logs older than the retention horizon into daily summaries.
+
+    Meant to run on a schedule (e.g. nightly cron). Logs taken before
+    ``--before`` (default: ``DOSELOG_RETENTION_DAYS`` days ago) are
+    deleted in transactions of at most ``--batch-size`` logs and their
+    per-day counts are kept in CompactedDoseDay, whether they are live,
+    partitioned or archived. Adherence results do not change.
+
+    Usage:
+        python manage.py compact_doses [--before YYYY-MM-DD] [--batch-size N]
+    """
+
+    help = "Compact old dose logs into per-day summaries in bounded transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="Compact logs taken before this date (YYYY-MM-DD).")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=compaction.DEFAULT_BATCH_SIZE,
+            help=f"Logs compacted per transaction (default: {compaction.DEFAULT_BATCH_SIZE})."
+        )
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            try:
+                before = date.fromisoformat(options["before"])
+            except ValueError:
+                raise CommandError("Invalid date format. Use YYYY-MM-DD")
+        else:
+            before = timezone.localdate() - timedelta(days=getattr(settings, "DOSELOG_RETENTION_DAYS", 730))
+
+        cutoff, _end = day_bounds(before, before)
+        total = 0
+        for compacted in compaction.compact_before(cutoff, max(options["batch_size"], 1)):
+            total += compacted
+            self.stdout.write(f"Compacted {total} logs")
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} logs before {before} compacted."))
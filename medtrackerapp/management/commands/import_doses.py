@@ -0,0 +1,162 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from medtrackerapp import ingest
+from medtrackerapp.models import Medication
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y", "taken"}
+FALSE_VALUES = {"0", "false", "f", "no", "n", "missed"}
+
+
+class Command(BaseCommand):
+    """
+    Import historical dose events from a CSV or NDJSON file.
+
+    Each record needs ``medication`` (the medication name) or
+    ``medication_id``, a ``taken_at`` ISO timestamp (naive values are
+    read in the current time zone) and optionally ``was_taken``
+    (default true) and ``client_event_id``; records whose event id is
+    already stored are skipped, so an interrupted import can simply be
+    re-run. The file is streamed record by record, names are
+    resolved through an in-memory name → id map, and rows are inserted
+    with ``bulk_create``, committing after every batch, so memory stays
+    constant regardless of file size.
+
+    Usage:
+        python manage.py import_doses history.csv [--format csv|ndjson]
+            [--batch-size N] [--skip-invalid]
+    """
+
+    help = "Stream dose history from a CSV or NDJSON file into DoseLog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="Path to the CSV/NDJSON file, or '-' for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Input format (default: guessed from the file extension, csv for stdin)."
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows inserted and committed per batch (default: 5000)."
+        )
+        parser.add_argument(
+            "--skip-invalid",
+            action="store_true",
+            help="Report and skip invalid records instead of aborting."
+        )
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        fmt = options["format"] or ("ndjson" if path.endswith((".ndjson", ".jsonl")) else "csv")
+        batch_size = max(options["batch_size"], 1)
+
+        self.names = {}
+        ambiguous = set()
+        for name, pk in Medication.objects.values_list("name", "pk").iterator():
+            if name in self.names:
+                ambiguous.add(name)
+            self.names[name] = pk
+        for name in ambiguous:
+            del self.names[name]
+        self.ambiguous = ambiguous
+        self.known_ids = set(Medication.objects.values_list("pk", flat=True).iterator())
+        self.skip_invalid = options["skip_invalid"]
+        self.skipped = 0
+
+        handle = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            records = self.read_csv(handle) if fmt == "csv" else self.read_ndjson(handle)
+            rows = self.to_rows(records)
+
+            started = time.monotonic()
+            imported = 0
+            for batch in ingest.batched(rows, batch_size):
+                imported += ingest.insert_batch(batch)["created"]
+                elapsed = max(time.monotonic() - started, 1e-9)
+                self.stdout.write(f"{imported} rows imported ({imported / elapsed:,.0f} rows/s)")
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} rows in {elapsed:.1f}s ({imported / elapsed:,.0f} rows/s), "
+            f"skipped {self.skipped} invalid records."
+        ))
+
+    def read_csv(self, handle):
+        for number, record in enumerate(csv.DictReader(handle), start=2):
+            yield number, record
+
+    def read_ndjson(self, handle):
+        for number, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                self.invalid(number, f"invalid JSON ({exc})")
+
+    def to_rows(self, records):
+        """Convert raw records into DoseLog field dicts, lazily."""
+        for number, record in records:
+            try:
+                yield self.to_row(record)
+            except ValueError as exc:
+                self.invalid(number, str(exc))
+
+    def to_row(self, record):
+        medication_id = record.get("medication_id")
+        if medication_id not in (None, ""):
+            try:
+                medication_id = int(medication_id)
+            except (TypeError, ValueError):
+                raise ValueError(f"invalid medication_id {medication_id!r}")
+            if medication_id not in self.known_ids:
+                raise ValueError(f"unknown medication_id {medication_id}")
+        else:
+            name = record.get("medication")
+            if name in self.ambiguous:
+                raise ValueError(f"ambiguous medication name {name!r}")
+            if name not in self.names:
+                raise ValueError(f"unknown medication {name!r}")
+            medication_id = self.names[name]
+
+        taken_at = parse_datetime(str(record.get("taken_at") or ""))
+        if taken_at is None:
+            raise ValueError(f"invalid taken_at {record.get('taken_at')!r}")
+        if timezone.is_naive(taken_at):
+            taken_at = timezone.make_aware(taken_at)
+
+        was_taken = record.get("was_taken", True)
+        if not isinstance(was_taken, bool):
+            value = str(was_taken).strip().lower()
+            if value in TRUE_VALUES or value == "":
+                was_taken = True
+            elif value in FALSE_VALUES:
+                was_taken = False
+            else:
+                raise ValueError(f"invalid was_taken {record.get('was_taken')!r}")
+
+        return {
+            "medication_id": medication_id,
+            "taken_at": taken_at,
+            "was_taken": was_taken,
+            "client_event_id": record.get("client_event_id") or None,
+        }
+
+    def invalid(self, number, message):
+        if not self.skip_invalid:
+            raise CommandError(f"Record {number}: {message}")
+        self.skipped += 1
+        self.stderr.write(f"Skipping record {number}: {message}")
@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+
+from medtrackerapp import partitions
+from medtrackerapp.aggregates import dose_day, month_bounds, month_start, next_month
+from medtrackerapp.models import DoseLog, DoseLogPartition
+
+
+def parse_month(value: str) -> date:
+    """Parse a ``YYYY-MM`` argument into the first day of that month."""
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}'. Use YYYY-MM")
+
+
+class Command(BaseCommand):
+    """
+    Manage monthly DoseLog partitions.
+
+    ``--before`` moves every whole month of live logs older than the
+    given month into its partition table, one transaction per month.
+    ``--detach``/``--attach`` hide or restore a partition for reads and
+    ``--drop`` deletes its table; all three take constant time. Daily
+    rollups and dose counters are never changed.
+
+    Usage:
+        python manage.py partition_doses --before YYYY-MM
+        python manage.py partition_doses [--list] [--detach|--attach|--drop YYYY-MM]
+    """
+
+    help = "Move old dose logs into monthly partitions and manage them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", help="Partition all months before this one (YYYY-MM).")
+        parser.add_argument("--detach", help="Stop reading a partition (YYYY-MM).")
+        parser.add_argument("--attach", help="Read a detached partition again (YYYY-MM).")
+        parser.add_argument("--drop", help="Drop a partition and its logs (YYYY-MM).")
+        parser.add_argument("--list", action="store_true", help="List partitions.")
+
+    def handle(self, *args, **options):
+        if options["before"]:
+            self.partition_before(parse_month(options["before"]))
+
+        try:
+            if options["detach"]:
+                partitions.set_attached(parse_month(options["detach"]), False)
+                self.stdout.write(f"Detached {options['detach']}")
+            if options["attach"]:
+                partitions.set_attached(parse_month(options["attach"]), True)
+                self.stdout.write(f"Attached {options['attach']}")
+            if options["drop"]:
+                rows = partitions.drop_partition(parse_month(options["drop"]))
+                self.stdout.write(f"Dropped {options['drop']} ({rows} logs)")
+        except DoseLogPartition.DoesNotExist:
+            raise CommandError("No such partition")
+
+        if options["list"]:
+            for partition in DoseLogPartition.objects.all():
+                self.stdout.write(str(partition))
+
+    def partition_before(self, before: date):
+        oldest = DoseLog.objects.aggregate(oldest=Min("taken_at"))["oldest"]
+        if oldest is None:
+            self.stdout.write("No live dose logs.")
+            return
+
+        month = month_start(dose_day(oldest))
+        total = 0
+        while month < before:
+            start, end = month_bounds(month)
+            if DoseLog.objects.filter(taken_at__gte=start, taken_at__lt=end).exists():
+                moved = partitions.partition_month(month)
+                total += moved
+                self.stdout.write(f"Partitioned {month:%Y-%m}: {moved} logs")
+            month = next_month(month)
+        self.stdout.write(self.style.SUCCESS(f"Done: {total} logs partitioned."))
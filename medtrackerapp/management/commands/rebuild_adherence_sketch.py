@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from medtrackerapp.aggregates import rebuild_adherence_sketch
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the fleet adherence sketch from the Medication counters.
+
+    The sketch is maintained incrementally on every DoseLog write; this
+    command is only needed after counters were repaired or changed
+    outside the ORM.
+
+    Usage:
+        python manage.py rebuild_adherence_sketch
+    """
+
+    help = "Rebuild the persisted fleet-wide adherence distribution sketch."
+
+    def handle(self, *args, **options):
+        counted = rebuild_adherence_sketch()
+        self.stdout.write(self.style.SUCCESS(f"Sketch rebuilt from {counted} medications."))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from medtrackerapp.aggregates import rebuild_rollups
+from medtrackerapp.models import Medication
+
+
+class Command(BaseCommand):
+    """
+    Backfill or repair the DoseDailyRollup table from DoseLog history.
+
+    Medications are processed in primary-key order, ``--chunk-size``
+    at a time, each chunk in its own transaction so the database is
+    never locked for the whole rebuild.
+
+    Usage:
+        python manage.py rebuild_rollups [--chunk-size N] [--medication ID ...]
+    """
+
+    help = "Rebuild per-day adherence rollups from dose logs in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of medications rebuilt per transaction (default: 500)."
+        )
+        parser.add_argument(
+            "--medication",
+            type=int,
+            action="append",
+            dest="medications",
+            help="Only rebuild this medication id (may be repeated)."
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 1)
+        medications = Medication.objects.order_by("pk")
+        if options["medications"]:
+            medications = medications.filter(pk__in=options["medications"])
+
+        last_id = 0
+        total_rows = 0
+        total_medications = 0
+        while True:
+            ids = list(
+                medications.filter(pk__gt=last_id).values_list("pk", flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            total_rows += rebuild_rollups(ids)
+            total_medications += len(ids)
+            last_id = ids[-1]
+            self.stdout.write(f"Rebuilt {total_medications} medications ({total_rows} rollup rows)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {total_medications} medications, {total_rows} rollup rows."
+        ))
@@ -0,0 +1,169 @@
+"""
+Transparent decompression of compressed request bodies.
+
+Mobile clients may send ``Content-Encoding: gzip``, ``deflate`` or
+``zstd`` bodies to the API. :class:`DecompressRequestMiddleware` swaps
+the request's input stream for a decompressing one, so DRF parsers
+(JSON, NDJSON, form data) read plain bytes without knowing about the
+encoding. Decompression happens lazily as the parser reads, in bounded
+chunks, and aborts with HTTP 413 once the decompressed body exceeds
+``REQUEST_MAX_DECOMPRESSED_SIZE`` bytes, so a small "zip bomb" cannot
+exhaust memory. Corrupt bodies are reported as HTTP 400.
+
+zstd needs either Python 3.14's ``compression.zstd`` or the optional
+``zstandard`` package; without them ``zstd`` bodies are rejected with
+HTTP 415.
+"""
+import gzip
+import io
+import zlib
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DEFAULT_MAX_DECOMPRESSED_SIZE = 20 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class RequestBodyTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Decompressed request body is too large."
+    default_code = "request_too_large"
+
+
+class _DeflateReader(io.RawIOBase):
+    """Readable stream inflating a zlib-wrapped or raw deflate body."""
+
+    def __init__(self, source):
+        self._source = source
+        self._decompressor = None
+        self._pending = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while True:
+            if self._decompressor is None:
+                head = self._source.read(CHUNK_SIZE)
+                if not head:
+                    return 0
+                # RFC 9110 "deflate" is zlib-wrapped, but some clients send
+                # raw deflate; a zlib header is a multiple of 31.
+                is_zlib = len(head) >= 2 and head[0] & 0x0F == 8 and (head[0] << 8 | head[1]) % 31 == 0
+                self._decompressor = zlib.decompressobj(zlib.MAX_WBITS if is_zlib else -zlib.MAX_WBITS)
+                self._pending = head
+            elif not self._pending and not self._decompressor.eof:
+                self._pending = self._source.read(CHUNK_SIZE)
+                if not self._pending:
+                    raise EOFError("Compressed body ended unexpectedly")
+
+            data = self._decompressor.decompress(self._pending, len(buffer))
+            self._pending = self._decompressor.unconsumed_tail
+            if data:
+                buffer[:len(data)] = data
+                return len(data)
+            if self._decompressor.eof:
+                return 0
+
+
+def _zstd_reader(source):
+    if zstd is not None:
+        return zstd.ZstdFile(source)
+    return zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True)
+
+
+def _decode_errors():
+    errors = (OSError, EOFError, zlib.error)
+    if zstd is not None:
+        errors += (zstd.ZstdError,)
+    if zstandard is not None:
+        errors += (zstandard.ZstdError,)
+    return errors
+
+
+DECODERS = {
+    "gzip": lambda source: gzip.GzipFile(fileobj=source, mode="rb"),
+    "x-gzip": lambda source: gzip.GzipFile(fileobj=source, mode="rb"),
+    "deflate": _DeflateReader,
+}
+if zstd is not None or zstandard is not None:
+    DECODERS["zstd"] = _zstd_reader
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Size-limited view of a decoder, translating its errors for DRF.
+
+    Args:
+        decoder: Readable file-like object producing decompressed bytes.
+        limit (int): Maximum number of decompressed bytes.
+    """
+
+    def __init__(self, decoder, limit):
+        self._decoder = decoder
+        self._limit = limit
+        self._read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Ask for one byte more than allowed so an oversized body is detected.
+        size = min(len(buffer), self._limit - self._read + 1)
+        try:
+            data = self._decoder.read(size)
+        except _decode_errors() as exc:
+            raise ParseError(f"Malformed compressed request body: {exc}")
+        self._read += len(data)
+        if self._read > self._limit:
+            raise RequestBodyTooLarge()
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class DecompressRequestMiddleware:
+    """
+    Decode ``Content-Encoding`` request bodies for API paths.
+
+    Applies to paths starting with one of ``DECOMPRESS_REQUEST_PREFIXES``
+    (default ``["/api/"]``). Several encodings (``gzip, zstd``) are
+    undone in reverse order of application.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        encoding = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        prefixes = getattr(settings, "DECOMPRESS_REQUEST_PREFIXES", ["/api/"])
+        if encoding and encoding != "identity" and request.path.startswith(tuple(prefixes)):
+            codings = [coding.strip() for coding in encoding.split(",")]
+            unsupported = [coding for coding in codings if coding not in DECODERS and coding != "identity"]
+            if unsupported:
+                return JsonResponse(
+                    {"error": f"Unsupported Content-Encoding: {', '.join(unsupported)}",
+                     "supported": sorted(DECODERS)},
+                    status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+                )
+
+            limit = getattr(settings, "REQUEST_MAX_DECOMPRESSED_SIZE", DEFAULT_MAX_DECOMPRESSED_SIZE)
+            stream = request._stream
+            for coding in reversed(codings):
+                if coding != "identity":
+                    stream = DECODERS[coding](stream)
+            request._stream = io.BufferedReader(DecompressedStream(stream, limit), CHUNK_SIZE)
+            del request.META["HTTP_CONTENT_ENCODING"]
+        return self.get_response(request)
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollups from existing logs with one grouped query."""
+    DoseLog = apps.get_model('medtrackerapp', 'DoseLog')
+    DoseDailyRollup = apps.get_model('medtrackerapp', 'DoseDailyRollup')
+
+    days = (
+        DoseLog.objects.annotate(day=TruncDate('taken_at'))
+        .values_list('medication_id', 'day')
+        .annotate(
+            taken=Count('pk', filter=Q(was_taken=True)),
+            missed=Count('pk', filter=Q(was_taken=False)),
+        )
+        .order_by()
+    )
+    DoseDailyRollup.objects.bulk_create(
+        (
+            DoseDailyRollup(medication_id=medication_id, date=day, taken=taken, missed=missed)
+            for medication_id, day, taken, missed in days.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0002_note'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoseDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='medtrackerapp.medication')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'date'), name='unique_rollup_per_medication_day')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
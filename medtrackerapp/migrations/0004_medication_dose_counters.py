@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_dose_counters(apps, schema_editor):
+    """Populate the counters from existing logs with one UPDATE statement."""
+    Medication = apps.get_model('medtrackerapp', 'Medication')
+    DoseLog = apps.get_model('medtrackerapp', 'DoseLog')
+
+    logs = DoseLog.objects.filter(medication=OuterRef('pk')).order_by().values('medication')
+    total = logs.annotate(n=Count('pk')).values('n')
+    taken = logs.filter(was_taken=True).annotate(n=Count('pk')).values('n')
+    Medication.objects.update(
+        total_count=Coalesce(Subquery(total), 0),
+        taken_count=Coalesce(Subquery(taken), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0003_dosedailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='taken_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Denormalized number of doses logged as taken'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Denormalized number of logged doses'),
+        ),
+        migrations.RunPython(backfill_dose_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0004_medication_dose_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['medication', 'taken_at'], name='doselog_med_taken_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['taken_at'], name='doselog_taken_at_idx'),
+        ),
+    ]
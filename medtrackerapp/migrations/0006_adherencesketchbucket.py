@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:15
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_sketch(apps, schema_editor):
+    """Seed the adherence sketch from the existing Medication counters."""
+    Medication = apps.get_model('medtrackerapp', 'Medication')
+    AdherenceSketchBucket = apps.get_model('medtrackerapp', 'AdherenceSketchBucket')
+
+    counts = Counter()
+    counters = Medication.objects.filter(total_count__gt=0).values_list('taken_count', 'total_count')
+    for taken, total in counters.iterator():
+        rate = round((taken / total) * 100, 2)
+        counts[min(int(round(rate * 10)), 1000)] += 1
+    AdherenceSketchBucket.objects.bulk_create(
+        AdherenceSketchBucket(bucket=bucket, count=count) for bucket, count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0005_doselog_taken_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceSketchBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField(unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['bucket'],
+            },
+        ),
+        migrations.RunPython(backfill_sketch, migrations.RunPython.noop),
+    ]
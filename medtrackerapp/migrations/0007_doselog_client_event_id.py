@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0006_adherencesketchbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doselog',
+            name='client_event_id',
+            field=models.CharField(blank=True, help_text='Client-generated id making retried submissions idempotent', max_length=64, null=True, unique=True),
+        ),
+    ]
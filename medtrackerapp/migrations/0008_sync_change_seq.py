@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:21
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def backfill_change_seq(apps, schema_editor):
+    """Give every existing row a distinct change number and seed the counter."""
+    offset = 0
+    for model_name in ('Medication', 'DoseLog', 'Note'):
+        model = apps.get_model('medtrackerapp', model_name)
+        model.objects.update(change_seq=F('pk') + offset)
+        offset += model.objects.aggregate(top=Max('pk'))['top'] or 0
+    ChangeSequence = apps.get_model('medtrackerapp', 'ChangeSequence')
+    ChangeSequence.objects.create(pk=1, value=offset)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0007_doselog_client_event_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('medication', 'Medication'), ('doselog', 'Dose log'), ('note', 'Note')], max_length=16)),
+                ('object_id', models.BigIntegerField()),
+                ('change_seq', models.PositiveBigIntegerField(db_index=True)),
+            ],
+            options={
+                'ordering': ['change_seq'],
+            },
+        ),
+        migrations.AddField(
+            model_name='doselog',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False, help_text='Change sequence number of the last write (see /api/sync/)'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False, help_text='Change sequence number of the last write (see /api/sync/)'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False, help_text='Change sequence number of the last write (see /api/sync/)'),
+        ),
+        migrations.RunPython(backfill_change_seq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0008_sync_change_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoseLogPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the partitioned month', unique=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('attached', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+    ]
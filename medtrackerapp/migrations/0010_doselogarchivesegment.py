@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0009_doselogpartition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoseLogArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the archived month')),
+                ('file', models.CharField(help_text='Path relative to DOSELOG_ARCHIVE_DIR', max_length=255)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='medtrackerapp.medication')),
+            ],
+            options={
+                'ordering': ['medication', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'month'), name='unique_archive_segment_per_medication_month')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0010_doselogarchivesegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactedDoseDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compacted_days', to='medtrackerapp.medication')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'date'), name='unique_compacted_day_per_medication')],
+            },
+        ),
+    ]
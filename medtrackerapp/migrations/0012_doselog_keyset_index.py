@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0011_compacteddoseday'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='doselog',
+            options={'ordering': ['-taken_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='doselog',
+            index=models.Index(fields=['taken_at', 'id'], name='doselog_taken_at_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='doselog',
+            name='doselog_taken_at_idx',
+        ),
+    ]
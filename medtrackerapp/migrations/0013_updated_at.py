@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:36
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0012_doselog_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doselog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Time of the last write (ETag/Last-Modified, see conditional.py)'),
+        ),
+        migrations.AddField(
+            model_name='medication',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Time of the last write (ETag/Last-Modified, see conditional.py)'),
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='Time of the last write (ETag/Last-Modified, see conditional.py)'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='deleted_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
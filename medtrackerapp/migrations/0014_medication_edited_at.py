@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0013_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medication',
+            name='edited_at',
+            field=models.DateTimeField(auto_now=True, help_text='Time of the last save(), i.e. edit of the name, dosage or schedule; dose counter updates leave it alone'),
+        ),
+    ]
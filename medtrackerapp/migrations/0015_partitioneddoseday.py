@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:50
+
+import django.db.models.deletion
+from django.apps.registry import Apps
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+
+
+def backfill_partitioned_days(apps, schema_editor):
+    """Record the per-day counts of the existing partition tables."""
+    DoseLog = apps.get_model('medtrackerapp', 'DoseLog')
+    DoseLogPartition = apps.get_model('medtrackerapp', 'DoseLogPartition')
+    PartitionedDoseDay = apps.get_model('medtrackerapp', 'PartitionedDoseDay')
+
+    # Partition tables are not part of the migration state: map each one
+    # onto a throwaway unmanaged model in an isolated registry.
+    registry = Apps()
+    for month in DoseLogPartition.objects.values_list('month', flat=True):
+        table = f'{DoseLog._meta.db_table}_{month:%Y%m}'
+        logs = type(f'DoseLog{month:%Y%m}', (models.Model,), {
+            '__module__': __name__,
+            'Meta': type('Meta', (), {'app_label': 'medtrackerapp', 'db_table': table, 'managed': False, 'apps': registry}),
+            'id': models.BigIntegerField(primary_key=True),
+            'medication_id': models.BigIntegerField(),
+            'taken_at': models.DateTimeField(),
+            'was_taken': models.BooleanField(),
+        })
+        days = (
+            logs.objects.annotate(day=TruncDate('taken_at'))
+            .values_list('medication_id', 'day')
+            .annotate(
+                taken=Count('pk', filter=Q(was_taken=True)),
+                missed=Count('pk', filter=Q(was_taken=False)),
+            )
+            .order_by()
+        )
+        PartitionedDoseDay.objects.bulk_create(
+            (
+                PartitionedDoseDay(medication_id=medication_id, date=day, taken=taken, missed=missed)
+                for medication_id, day, taken, missed in days.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0014_medication_edited_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartitionedDoseDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('taken', models.PositiveIntegerField(default=0)),
+                ('missed', models.PositiveIntegerField(default=0)),
+                ('medication', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='partitioned_days', to='medtrackerapp.medication')),
+            ],
+            options={
+                'ordering': ['date'],
+                'constraints': [models.UniqueConstraint(fields=('medication', 'date'), name='unique_partitioned_day_per_medication')],
+            },
+        ),
+        migrations.RunPython(backfill_partitioned_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-16 15:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0015_partitioneddoseday'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doselog',
+            name='medication',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='medtrackerapp.medication'),
+        ),
+    ]
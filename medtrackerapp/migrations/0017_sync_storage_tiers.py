@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-16 16:11
+
+from pathlib import Path
+
+import numpy as np
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_max_change_seq(apps, schema_editor):
+    """Record the highest change_seq held by each partition and archived segment."""
+    DoseLog = apps.get_model('medtrackerapp', 'DoseLog')
+    DoseLogPartition = apps.get_model('medtrackerapp', 'DoseLogPartition')
+    DoseLogArchiveSegment = apps.get_model('medtrackerapp', 'DoseLogArchiveSegment')
+
+    # Partition tables are not part of the migration state (see 0015).
+    registry = Apps()
+    for partition in DoseLogPartition.objects.all():
+        table = f'{DoseLog._meta.db_table}_{partition.month:%Y%m}'
+        logs = type(f'DoseLog{partition.month:%Y%m}', (models.Model,), {
+            '__module__': __name__,
+            'Meta': type('Meta', (), {'app_label': 'medtrackerapp', 'db_table': table, 'managed': False, 'apps': registry}),
+            'id': models.BigIntegerField(primary_key=True),
+            'change_seq': models.PositiveBigIntegerField(),
+        })
+        partition.max_change_seq = logs.objects.aggregate(seq=Max('change_seq'))['seq'] or 0
+        partition.save(update_fields=['max_change_seq'])
+
+    archive_dir = Path(getattr(settings, 'DOSELOG_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+    for segment in DoseLogArchiveSegment.objects.all():
+        with np.load(archive_dir / segment.file) as data:
+            segment.max_change_seq = int(data['change_seq'].max(initial=0))
+        segment.save(update_fields=['max_change_seq'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medtrackerapp', '0016_doselog_medication_bulk_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doselogarchivesegment',
+            name='max_change_seq',
+            field=models.PositiveBigIntegerField(default=0, help_text='Highest change_seq of the held logs'),
+        ),
+        migrations.AddField(
+            model_name='doselogpartition',
+            name='max_change_seq',
+            field=models.PositiveBigIntegerField(default=0, help_text='Highest change_seq of the held logs'),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='kind',
+            field=models.CharField(choices=[('medication', 'Medication'), ('doselog', 'Dose log'), ('note', 'Note'), ('compaction', 'Compacted dose logs')], max_length=16),
+        ),
+        migrations.RunPython(backfill_max_change_seq, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,139 @@
-from django.db import models
-from datetime import date as _date
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour, ExtractWeekDay
+from datetime import date as _date, timedelta
+from math import ceil
 from django.utils import timezone
+from .cache import cached_adherence
 from .services import DrugInfoService
 
+# Upper bounds for per-day series, so one request cannot ask for
+# millions of days.
+MAX_SERIES_DAYS = 3660
+MAX_SERIES_WINDOW = 366
+
+
+class MedicationQuerySet(models.QuerySet):
+    """Custom queryset for :class:`Medication` with aggregate helpers."""
+
+    def adherence_over_period(self, start_date: _date, end_date: _date) -> dict:
+        """
+        Compute ``adherence_rate_over_period`` for every medication at once.
+
+        Taken doses are summed with a single ``GROUP BY medication_id``
+        query over the daily rollups, plus one query loading the
+        prescription schedules.
+
+        Args:
+            start_date (date): Start of the evaluation period.
+            end_date (date): End of the evaluation period.
+
+        Returns:
+            dict: Medication id mapped to its adherence percentage, or to
+                  the ``ValueError`` raised by ``expected_doses`` for
+                  medications without a valid schedule.
+
+        Raises:
+            ValueError: If start_date > end_date.
+        """
+        if start_date > end_date:
+            raise ValueError("start_date must be before or equal to end_date")
+
+        days = (end_date - start_date).days + 1
+        taken = dict(
+            DoseDailyRollup.objects.filter(
+                medication_id__in=self.values("pk"),
+                date__gte=start_date,
+                date__lte=end_date
+            )
+            .values("medication_id")
+            .annotate(total=Sum("taken"))
+            .order_by()
+            .values_list("medication_id", "total")
+        )
+
+        results = {}
+        for medication in self.only("pk", "prescribed_per_day").order_by("pk"):
+            try:
+                expected = medication.expected_doses(days)
+            except ValueError as exc:
+                results[medication.pk] = exc
+                continue
+            results[medication.pk] = Medication.adherence_from_counts(
+                taken.get(medication.pk, 0), expected
+            )
+        return results
+
+
+    def missed_dose_streaks(self) -> dict:
+        """
+        Current and longest missed-dose streaks for every medication.
+
+        A streak is a run of consecutive logs (ordered by ``taken_at``)
+        marked as missed. Every storage tier is read, so archiving,
+        partitioning or compacting logs does not change the streaks: see
+        ``analytics.missed_dose_streaks``. Compacted days and dropped
+        partitions only keep per-day counts; their taken doses are
+        assumed to precede their missed ones.
+
+        Returns:
+            dict: Medication id mapped to ``{"current": int, "longest": int}``.
+                  ``current`` is the streak ending at the newest log.
+                  Medications without any missed dose are omitted.
+        """
+        from .analytics import missed_dose_streaks
+
+        return missed_dose_streaks(self.order_by().values("pk"))
+
+
+    def dose_heatmap(self) -> dict:
+        """
+        Taken and missed dose counts by day of week and hour of day.
+
+        Counts are grouped in the database with ``ExtractWeekDay`` and
+        ``ExtractHour`` (in the current time zone), so only at most
+        7 × 24 × 2 rows per DoseLog partition (attached or detached)
+        leave the database regardless of log volume. Archived logs are
+        counted from their segments (see ``archive.heatmap_counts``).
+
+        Compacted days and dropped partitions keep no time of day, so
+        their doses cannot be placed in the matrices; they are reported
+        separately as ``untimed`` counts.
+
+        Returns:
+            dict: ``taken`` and ``missed`` 7 × 24 matrices (lists of
+                  lists), indexed ``[weekday][hour]`` with weekday 0 as
+                  Monday, summed over the medications in the queryset,
+                  and the ``untimed`` ``{"taken": int, "missed": int}``
+                  doses left out of them.
+        """
+        from . import archive
+        from .partitions import dose_log_sources, dropped_days
+
+        medication_ids = self.order_by().values("pk")
+        archived_taken, archived_missed = archive.heatmap_counts(medication_ids)
+        taken = archived_taken.tolist()
+        missed = archived_missed.tolist()
+        for source in dose_log_sources(include_detached=True):
+            cells = (
+                source.filter(medication_id__in=medication_ids)
+                .annotate(weekday=ExtractWeekDay("taken_at"), hour=ExtractHour("taken_at"))
+                .values("weekday", "hour", "was_taken")
+                .annotate(count=Count("pk"))
+                .order_by()
+            )
+            for cell in cells:
+                # ExtractWeekDay numbers days 1 (Sunday) to 7 (Saturday).
+                weekday = (cell["weekday"] - 2) % 7
+                target = taken if cell["was_taken"] else missed
+                target[weekday][cell["hour"]] += cell["count"]
+
+        untimed = {"taken": 0, "missed": 0}
+        for days in (CompactedDoseDay.objects.all(), dropped_days()):
+            totals = days.filter(medication_id__in=medication_ids).aggregate(taken=Sum("taken"), missed=Sum("missed"))
+            untimed["taken"] += totals["taken"] or 0
+            untimed["missed"] += totals["missed"] or 0
+        return {"taken": taken, "missed": missed, "untimed": untimed}
 
 
 class Medication(models.Model):
@@ -16,11 +147,59 @@ class Medication(models.Model):
     name = models.CharField(max_length=100)
     dosage_mg = models.PositiveIntegerField()
     prescribed_per_day = models.PositiveIntegerField(help_text="Expected number of doses per day")
+    taken_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Denormalized number of doses logged as taken"
+    )
+    total_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Denormalized number of logged doses"
+    )
+    change_seq = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        help_text="Change sequence number of the last write (see /api/sync/)"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text="Time of the last write (ETag/Last-Modified, see conditional.py)"
+    )
+    edited_at = models.DateTimeField(
+        auto_now=True,
+        help_text="Time of the last save(), i.e. edit of the name, dosage or schedule; "
+                  "dose counter updates leave it alone"
+    )
+
+    objects = MedicationQuerySet.as_manager()
+
+    COUNTER_FIELDS = ("taken_count", "total_count")
 
     def __str__(self):
         """Return a human-readable representation of the medication."""
         return f"{self.name} ({self.dosage_mg}mg)"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the medication without overwriting its dose counters.
+
+        The counters are only changed through ``F()`` updates driven by
+        DoseLog writes, so updates of an existing row skip them to avoid
+        clobbering concurrent increments with stale in-memory values.
+        Every save stamps a new change sequence number.
+        """
+        if not self._state.adding and not args and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        with transaction.atomic(using=kwargs.get("using")):
+            ChangeSequence.stamp(self, kwargs)
+            super().save(*args, **kwargs)
+
     def adherence_rate(self):
         """
         Calculate the overall adherence rate for this medication.
@@ -28,14 +207,32 @@ class Medication(models.Model):
         The adherence rate is the percentage of all recorded doses that
         were marked as taken. Rounded to two decimals.
 
+        Reads the denormalized ``taken_count``/``total_count`` counters,
+        which are kept in sync on every DoseLog write, so no query is
+        issued. They still include logs compacted into CompactedDoseDay.
+        ``manage.py check_dose_counters`` verifies and repairs them.
+
         Returns:
             float: Adherence percentage between 0.0 and 100.0.
         """
-        logs = self.doselog_set.all()
-        if not logs.exists():
+        return self.adherence_from_counts(self.taken_count, self.total_count)
+
+    @staticmethod
+    def adherence_from_counts(taken: int, total: int) -> float:
+        """
+        Convert taken/total dose counts into an adherence percentage.
+
+        Args:
+            taken (int): Number of doses marked as taken.
+            total (int): Number of recorded doses.
+
+        Returns:
+            float: Adherence percentage rounded to two decimals,
+                   or 0.0 if no doses were recorded.
+        """
+        if not total:
             return 0.0
-        taken = logs.filter(was_taken=True).count()
-        return round((taken / logs.count()) * 100, 2)
+        return round((taken / total) * 100, 2)
 
     def expected_doses(self, days: int) -> int:
         """
@@ -54,13 +251,16 @@ class Medication(models.Model):
             raise ValueError("Days must be positive (≥1) and prescribed_per_day must be > 0.")
         return days * self.prescribed_per_day
 
+    @cached_adherence("prescribed_per_day")
     def adherence_rate_over_period(self, start_date: _date, end_date: _date) -> float:
         """
         Calculate adherence rate between two dates (inclusive).
 
-        The method counts doses taken (was_taken=True) between the given
-        start and end dates and compares them to the expected number
-        based on the prescription schedule.
+        The method sums the taken counts of the per-day rollup rows
+        between the given start and end dates (at most one row per day)
+        and compares them to the expected number based on the
+        prescription schedule. Rollups are not touched by compaction,
+        so compacted and raw doses are counted alike.
 
         Args:
             start_date (date): Start of the evaluation period.
@@ -76,19 +276,141 @@ class Medication(models.Model):
         if start_date > end_date:
             raise ValueError("start_date must be before or equal to end_date")
 
-        logs = self.doselog_set.filter(
-            taken_at__date__gte=start_date,
-            taken_at__date__lte=end_date
-        )
         days = (end_date - start_date).days + 1
         expected = self.expected_doses(days)
 
         if expected == 0:
             return 0.0
 
-        taken = logs.filter(was_taken=True).count()
-        adherence = (taken / expected) * 100
-        return round(adherence, 2)
+        taken = self.daily_rollups.filter(
+            date__gte=start_date,
+            date__lte=end_date
+        ).aggregate(total=Sum("taken"))["total"] or 0
+        return self.adherence_from_counts(taken, expected)
+
+    def adherence_series(self, start_date: _date, end_date: _date, window: int = 7) -> list:
+        """
+        Calculate rolling adherence for each day between two dates (inclusive).
+
+        The value for a day D equals
+        ``adherence_rate_over_period(D - window + 1, D)``. It is computed
+        in one pass over the daily rollups with a sliding sum, so a
+        90-day series costs one query instead of 90.
+
+        Args:
+            start_date (date): First day of the series.
+            end_date (date): Last day of the series.
+            window (int): Rolling window length in days (must be ≥ 1).
+
+        Returns:
+            list[tuple[date, float]]: ``(day, adherence)`` pairs in date order.
+
+        Raises:
+            ValueError: If start_date > end_date, the series is longer than
+                        ``MAX_SERIES_DAYS``, window is not between 1 and
+                        ``MAX_SERIES_WINDOW``, or prescribed_per_day ≤ 0.
+        """
+        if start_date > end_date:
+            raise ValueError("start_date must be before or equal to end_date")
+        if (end_date - start_date).days >= MAX_SERIES_DAYS:
+            raise ValueError(f"Date range must not exceed {MAX_SERIES_DAYS} days")
+        if not 1 <= window <= MAX_SERIES_WINDOW:
+            raise ValueError(f"window must be an integer between 1 and {MAX_SERIES_WINDOW}")
+
+        expected = self.expected_doses(window)
+        # No dose can precede date.min, so the first windows are just shorter there.
+        first_day = start_date - timedelta(days=min(window - 1, (start_date - _date.min).days))
+        taken_by_day = dict(
+            self.daily_rollups.filter(
+                date__gte=first_day,
+                date__lte=end_date
+            ).values_list("date", "taken")
+        )
+
+        series = []
+        taken_in_window = 0
+        for offset in range((end_date - first_day).days + 1):
+            day = first_day + timedelta(days=offset)
+            taken_in_window += taken_by_day.get(day, 0)
+            if offset >= window:
+                taken_in_window -= taken_by_day.get(day - timedelta(days=window), 0)
+            if day >= start_date:
+                series.append((day, self.adherence_from_counts(taken_in_window, expected)))
+        return series
+
+    def missed_dose_streaks(self) -> dict:
+        """
+        Return the current and longest missed-dose streaks.
+
+        See :meth:`MedicationQuerySet.missed_dose_streaks`.
+
+        Returns:
+            dict: ``{"current": int, "longest": int}``.
+        """
+        streaks = Medication.objects.filter(pk=self.pk).missed_dose_streaks()
+        return streaks.get(self.pk, {"current": 0, "longest": 0})
+
+    def dose_heatmap(self) -> dict:
+        """
+        Return the weekday × hour taken/missed matrices for this medication.
+
+        See :meth:`MedicationQuerySet.dose_heatmap`.
+        """
+        return Medication.objects.filter(pk=self.pk).dose_heatmap()
+
+    def coverage_over_period(self, start_date: _date, end_date: _date) -> dict:
+        """
+        Calculate proportion of days covered (PDC) and the longest gap.
+
+        A day is covered when at least ``prescribed_per_day`` doses were
+        taken on it. Both metrics are computed in a single streaming pass
+        over the covered days of the daily rollups, in date order, so
+        long-running prescriptions never load individual logs.
+
+        Args:
+            start_date (date): Start of the evaluation period.
+            end_date (date): End of the evaluation period.
+
+        Returns:
+            dict: ``days`` in the period, ``covered_days``, ``pdc`` as a
+                  percentage rounded to two decimals, and ``max_gap_days``,
+                  the longest run of consecutive uncovered days.
+
+        Raises:
+            ValueError: If start_date > end_date, the period is longer than
+                        ``MAX_SERIES_DAYS`` or prescribed_per_day ≤ 0.
+        """
+        if start_date > end_date:
+            raise ValueError("start_date must be before or equal to end_date")
+
+        days = (end_date - start_date).days + 1
+        if days > MAX_SERIES_DAYS:
+            raise ValueError(f"Date range must not exceed {MAX_SERIES_DAYS} days")
+        self.expected_doses(days)
+
+        covered_days = self.daily_rollups.filter(
+            date__gte=start_date,
+            date__lte=end_date,
+            taken__gte=self.prescribed_per_day
+        ).order_by("date").values_list("date", flat=True)
+
+        covered = 0
+        max_gap = 0
+        # Ordinal of the last covered day, starting just before the period
+        # (computed on ordinals so a period starting at date.min works).
+        previous = start_date.toordinal() - 1
+        for day in covered_days.iterator():
+            max_gap = max(max_gap, day.toordinal() - previous - 1)
+            previous = day.toordinal()
+            covered += 1
+        max_gap = max(max_gap, end_date.toordinal() - previous)
+
+        return {
+            "days": days,
+            "covered_days": covered,
+            "pdc": self.adherence_from_counts(covered, days),
+            "max_gap_days": max_gap,
+        }
 
     def fetch_external_info(self):
         """
@@ -115,13 +437,38 @@ class DoseLog(models.Model):
     medication was either taken or missed.
     """
 
-    medication = models.ForeignKey(Medication, on_delete=models.CASCADE)
+    # Deleted in bulk by ``signals.delete_medication_doses`` rather than
+    # by a cascade, which would load and signal every log.
+    medication = models.ForeignKey(Medication, on_delete=models.DO_NOTHING)
     taken_at = models.DateTimeField()
     was_taken = models.BooleanField(default=True)
+    client_event_id = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Client-generated id making retried submissions idempotent"
+    )
+    change_seq = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        help_text="Change sequence number of the last write (see /api/sync/)"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text="Time of the last write (ETag/Last-Modified, see conditional.py)"
+    )
 
     class Meta:
         """Metadata options for the DoseLog model."""
-        ordering = ["-taken_at"]
+        ordering = ["-taken_at", "-id"]
+        indexes = [
+            models.Index(fields=["medication", "taken_at"], name="doselog_med_taken_at_idx"),
+            # Serves keyset pagination over (-taken_at, -id) and taken_at ranges.
+            models.Index(fields=["taken_at", "id"], name="doselog_taken_at_id_idx"),
+        ]
 
     def __str__(self):
         """Return a human-readable description of the dose event."""
@@ -129,6 +476,394 @@ class DoseLog(models.Model):
         when = timezone.localtime(self.taken_at).strftime("%Y-%m-%d %H:%M")
         return f"{self.medication.name} at {when} - {status}"
 
+    def save(self, *args, **kwargs):
+        """
+        Save the dose log together with its derived aggregates.
+
+        The save runs inside a transaction so the DoseDailyRollup
+        updates performed by the ``pre_save``/``post_save`` handlers in
+        ``signals.py`` commit or roll back together with the row, and
+        stamps a new change sequence number.
+        """
+        with transaction.atomic(using=kwargs.get("using")):
+            ChangeSequence.stamp(self, kwargs)
+            super().save(*args, **kwargs)
+
+
+class DailyDoseCounts(models.Model):
+    """Abstract per-medication, per-day taken and missed dose counts."""
+
+    date = models.DateField()
+    taken = models.PositiveIntegerField(default=0)
+    missed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        """Return a human-readable summary of the day."""
+        return f"{self.medication_id} on {self.date}: {self.taken} taken, {self.missed} missed"
+
+    @classmethod
+    def apply_delta(cls, medication_id: int, day: _date, taken: int, missed: int):
+        """
+        Atomically add the given deltas to the row for one day.
+
+        The row is created on first use. Negative-only deltas never
+        create rows, since there is nothing to decrement.
+
+        Args:
+            medication_id (int): Medication the doses belong to.
+            day (date): Local calendar day of the doses.
+            taken (int): Change in the number of taken doses.
+            missed (int): Change in the number of missed doses.
+        """
+        rows = cls.objects.filter(medication_id=medication_id, date=day)
+        if rows.update(taken=F("taken") + taken, missed=F("missed") + missed):
+            return
+        if taken <= 0 and missed <= 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    medication_id=medication_id,
+                    date=day,
+                    taken=max(taken, 0),
+                    missed=max(missed, 0)
+                )
+        except IntegrityError:
+            # Another writer created the row in the meantime.
+            rows.update(taken=F("taken") + taken, missed=F("missed") + missed)
+
+
+class DoseDailyRollup(DailyDoseCounts):
+    """
+    Per-day taken and missed dose counts for a medication.
+
+    Rows are maintained incrementally whenever a DoseLog is created,
+    updated or deleted (see ``aggregates.DoseChangeSet``), so period
+    adherence can be computed from at most one row per day instead
+    of scanning every log. Use the ``rebuild_rollups`` management
+    command to backfill or repair the table.
+    """
+
+    medication = models.ForeignKey(
+        Medication,
+        on_delete=models.CASCADE,
+        related_name="daily_rollups"
+    )
+
+    class Meta:
+        """Metadata options for the DoseDailyRollup model."""
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["medication", "date"],
+                name="unique_rollup_per_medication_day"
+            )
+        ]
+
+
+class CompactedDoseDay(DailyDoseCounts):
+    """
+    Per-day counts of dose logs removed by retention compaction.
+
+    ``compact_doses`` deletes raw logs older than the retention horizon
+    and adds them here (see ``compaction.py``). The daily rollups and
+    dose counters keep including them, and the rebuild and check
+    commands add these rows to the counts of the remaining logs.
+    """
+
+    medication = models.ForeignKey(
+        Medication,
+        on_delete=models.CASCADE,
+        related_name="compacted_days"
+    )
+
+    class Meta:
+        """Metadata options for the CompactedDoseDay model."""
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["medication", "date"],
+                name="unique_compacted_day_per_medication"
+            )
+        ]
+
+
+class PartitionedDoseDay(DailyDoseCounts):
+    """
+    Per-day counts of dose logs moved into DoseLog partitions.
+
+    ``partition_month`` adds the counts of the logs it moves (see
+    ``partitions.py``) and the rows are kept when a partition is
+    dropped, so the rebuild and check commands count partitioned logs
+    without scanning the partition tables, and dropping one stays a
+    plain ``DROP TABLE``.
+    """
+
+    medication = models.ForeignKey(
+        Medication,
+        on_delete=models.CASCADE,
+        related_name="partitioned_days"
+    )
+
+    class Meta:
+        """Metadata options for the PartitionedDoseDay model."""
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["medication", "date"],
+                name="unique_partitioned_day_per_medication"
+            )
+        ]
+
+
+class AdherenceSketchBucket(models.Model):
+    """
+    One bucket of the fleet-wide adherence distribution sketch.
+
+    The sketch is a fixed-resolution histogram of
+    ``Medication.adherence_rate()`` values: bucket ``b`` counts the
+    medications whose adherence rounds to ``b / 10`` percent, so there
+    are at most 1001 rows. Unlike t-digest or KLL sketches it supports
+    removals, which is needed because each DoseLog write moves one
+    medication from one bucket to another. Buckets are merged by adding
+    counts. Medications without any logged dose are not counted.
+    """
+
+    RESOLUTION = 10  # buckets per percentage point
+    MAX_BUCKET = 100 * RESOLUTION
+
+    bucket = models.PositiveSmallIntegerField(unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        """Metadata options for the AdherenceSketchBucket model."""
+        ordering = ["bucket"]
+
+    def __str__(self):
+        """Return a human-readable summary of the bucket."""
+        return f"{self.bucket / self.RESOLUTION}%: {self.count}"
+
+    @classmethod
+    def bucket_for(cls, taken: int, total: int):
+        """Return the bucket of a medication's counters, or None without doses."""
+        if not total:
+            return None
+        rate = Medication.adherence_from_counts(taken, total)
+        return min(int(round(rate * cls.RESOLUTION)), cls.MAX_BUCKET)
+
+    @classmethod
+    def apply_delta(cls, bucket: int, delta: int):
+        """Atomically add ``delta`` to one bucket, creating it on first use."""
+        rows = cls.objects.filter(bucket=bucket)
+        if rows.update(count=F("count") + delta) or delta <= 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(bucket=bucket, count=delta)
+        except IntegrityError:
+            rows.update(count=F("count") + delta)
+
+    @classmethod
+    def summary(cls, percentiles=(50, 90, 99), bins: int = 10) -> dict:
+        """
+        Approximate percentiles and a coarse histogram of fleet adherence.
+
+        Percentiles use the nearest-rank method over the buckets and are
+        exact up to the sketch resolution (0.1 percentage points).
+
+        Args:
+            percentiles (tuple[int]): Percentiles to report.
+            bins (int): Number of equal-width histogram bins over 0–100%.
+
+        Returns:
+            dict: ``medications`` counted, ``percentiles`` mapping
+                  ``"p50"``-style keys to values (None when empty), and
+                  ``histogram`` as a list of ``{lower, upper, count}``.
+        """
+        buckets = list(cls.objects.filter(count__gt=0).values_list("bucket", "count"))
+        total = sum(count for _bucket, count in buckets)
+
+        values = {}
+        for p in percentiles:
+            rank = max(ceil(p / 100 * total), 1)
+            values[f"p{p}"] = None
+            seen = 0
+            for bucket, count in buckets:
+                seen += count
+                if seen >= rank:
+                    values[f"p{p}"] = bucket / cls.RESOLUTION
+                    break
+
+        histogram = [0] * bins
+        for bucket, count in buckets:
+            histogram[min(bucket * bins // cls.MAX_BUCKET, bins - 1)] += count
+        width = 100 / bins
+        return {
+            "medications": total,
+            "percentiles": values,
+            "histogram": [
+                {"lower": round(i * width, 2), "upper": round((i + 1) * width, 2), "count": count}
+                for i, count in enumerate(histogram)
+            ],
+        }
+
+
+class ChangeSequence(models.Model):
+    """
+    Single-row counter handing out change sequence numbers.
+
+    Every write to a synced model (Medication, DoseLog, Note) and every
+    Tombstone is stamped with a number from this counter, inside the
+    transaction of the write. Incrementing the row locks it until that
+    transaction ends, so numbers become visible in allocation order and
+    a client reading ``change_seq > cursor`` never skips a late commit.
+    """
+
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Change sequence at {self.value}"
+
+    @classmethod
+    def allocate(cls, count: int = 1) -> int:
+        """
+        Reserve ``count`` consecutive sequence numbers.
+
+        Must be called inside the transaction of the write being stamped.
+
+        Returns:
+            int: The last reserved number; the block is
+                 ``(last - count, last]``.
+        """
+        rows = cls.objects.filter(pk=1)
+        if not rows.update(value=F("value") + count):
+            try:
+                with transaction.atomic():
+                    cls.objects.create(pk=1, value=count)
+                return count
+            except IntegrityError:
+                rows.update(value=F("value") + count)
+        return rows.values_list("value", flat=True).get()
+
+    @classmethod
+    def stamp(cls, instance, save_kwargs):
+        """
+        Give a model instance about to be saved a new ``change_seq``.
+
+        Partial saves (``update_fields``) also write ``change_seq`` and
+        the ``auto_now`` timestamps (``updated_at``, ``edited_at``).
+        """
+        instance.change_seq = cls.allocate()
+        update_fields = save_kwargs.get("update_fields")
+        if update_fields is not None:
+            stamped = ["change_seq"] + [
+                field.name for field in instance._meta.concrete_fields if getattr(field, "auto_now", False)
+            ]
+            missing = [name for name in stamped if name not in update_fields]
+            save_kwargs["update_fields"] = [*update_fields, *missing]
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted synced row, so offline clients can drop it.
+
+    Created by the ``post_delete`` handlers in ``signals.py`` and by
+    ``partitions.drop_partition``. Retention compaction leaves a single
+    ``COMPACTION`` tombstone instead, whose ``object_id`` is its cutoff
+    in microseconds since the Unix epoch: every log taken before it is
+    gone. A newer one supersedes the older ones, which are deleted.
+    """
+
+    MEDICATION = "medication"
+    DOSELOG = "doselog"
+    NOTE = "note"
+    COMPACTION = "compaction"
+    KIND_CHOICES = [
+        (MEDICATION, "Medication"),
+        (DOSELOG, "Dose log"),
+        (NOTE, "Note"),
+        (COMPACTION, "Compacted dose logs"),
+    ]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    change_seq = models.PositiveBigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        """Metadata options for the Tombstone model."""
+        ordering = ["change_seq"]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id} at {self.change_seq}"
+
+
+class DoseLogPartition(models.Model):
+    """
+    Registry of monthly DoseLog partition tables.
+
+    Whole months of old dose logs can be moved out of the live DoseLog
+    table into one table per month (see ``partitions.py``). Only
+    attached partitions are read; detaching or dropping one is a single
+    row update or ``DROP TABLE``, as their per-day counts are kept in
+    :class:`PartitionedDoseDay`.
+    """
+
+    month = models.DateField(unique=True, help_text="First day of the partitioned month")
+    rows = models.PositiveIntegerField(default=0)
+    attached = models.BooleanField(default=True)
+    max_change_seq = models.PositiveBigIntegerField(default=0, help_text="Highest change_seq of the held logs")
+
+    class Meta:
+        """Metadata options for the DoseLogPartition model."""
+        ordering = ["month"]
+
+    def __str__(self):
+        state = "attached" if self.attached else "detached"
+        return f"DoseLog partition {self.month:%Y-%m} ({self.rows} rows, {state})"
+
+    @property
+    def table_name(self) -> str:
+        """Name of the table holding this month's logs."""
+        return f"{DoseLog._meta.db_table}_{self.month:%Y%m}"
+
+
+class DoseLogArchiveSegment(models.Model):
+    """
+    Registry of archived DoseLog segments, one per medication and month.
+
+    ``archive_doses`` moves old logs out of the database into compressed
+    columnar files (see ``archive.py``). A segment row points at the
+    current file of its medication-month and is the commit point of an
+    archive run: files it does not reference are ignored by readers.
+    """
+
+    medication = models.ForeignKey(
+        Medication,
+        on_delete=models.CASCADE,
+        related_name="archive_segments"
+    )
+    month = models.DateField(help_text="First day of the archived month")
+    file = models.CharField(max_length=255, help_text="Path relative to DOSELOG_ARCHIVE_DIR")
+    rows = models.PositiveIntegerField(default=0)
+    max_change_seq = models.PositiveBigIntegerField(default=0, help_text="Highest change_seq of the held logs")
+
+    class Meta:
+        """Metadata options for the DoseLogArchiveSegment model."""
+        ordering = ["medication", "month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["medication", "month"],
+                name="unique_archive_segment_per_medication_month"
+            )
+        ]
+
+    def __str__(self):
+        return f"Archive of {self.medication_id} for {self.month:%Y-%m} ({self.rows} logs)"
+
 
 class Note(models.Model):
     """
@@ -144,10 +879,27 @@ class Note(models.Model):
     )
     text = models.TextField()
     date = models.DateTimeField(auto_now_add=True)
+    change_seq = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        help_text="Change sequence number of the last write (see /api/sync/)"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        help_text="Time of the last write (ETag/Last-Modified, see conditional.py)"
+    )
 
     class Meta:
         ordering = ['-date']
 
     def __str__(self):
         medication_name = self.medication.name if self.medication else "Unknown"
-        return f"Note for {medication_name} ({self.date.date()})"
\ No newline at end of file
+        return f"Note for {medication_name} ({self.date.date()})"
+
+    def save(self, *args, **kwargs):
+        """Save the note, stamping a new change sequence number."""
+        with transaction.atomic(using=kwargs.get("using")):
+            ChangeSequence.stamp(self, kwargs)
+            super().save(*args, **kwargs)
@@ -0,0 +1,135 @@
+"""
+Keyset pagination for the dose log list.
+
+``GET /api/logs/`` returns logs newest first in pages ordered by
+``(-taken_at, -id)``. The ``next`` link carries an opaque cursor with
+the key of the last log on the page, and the following page is fetched
+with ``WHERE (taken_at, id) < (cursor)`` through the ``(taken_at, id)``
+index, so every page costs O(page size) however deep it is. Offsets
+are never used.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+CURSOR_PREFIX = "v1:"
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(taken_at, pk: int) -> str:
+    """Wrap the ``(taken_at, id)`` key of a log in an opaque cursor."""
+    micros = (taken_at - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{micros}:{pk}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Unwrap a cursor returned by ``encode_cursor``.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError
+        micros, pk = (int(part) for part in raw[len(CURSOR_PREFIX):].split(":"))
+        return EPOCH + timedelta(microseconds=micros), pk
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError):
+        raise ValueError("Invalid cursor")
+
+
+class DoseLogCursorPagination(BasePagination):
+    """
+    Forward-only keyset pagination over ``(-taken_at, -id)``.
+
+    Query parameters:
+        cursor: Value of the previous page's ``next`` link (omit for the first page).
+        page_size: Logs per page, 1 to 1000 (default ``DOSELOG_PAGE_SIZE``).
+
+    Responses are ``{next, results}``; ``next`` is null on the last page.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+
+    def get_page_size(self, request) -> int:
+        default = getattr(settings, "DOSELOG_PAGE_SIZE", 100)
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, default))
+            if not 1 <= page_size <= MAX_PAGE_SIZE:
+                raise ValueError
+        except ValueError:
+            raise ValidationError(
+                {self.page_size_query_param: f"Must be an integer between 1 and {MAX_PAGE_SIZE}"}
+            )
+        return page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by("-taken_at", "-id")
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                taken_at, pk = decode_cursor(cursor)
+            except ValueError as exc:
+                raise ValidationError({self.cursor_query_param: str(exc)})
+            queryset = queryset.filter(Q(taken_at__lt=taken_at) | Q(taken_at=taken_at, id__lt=pk))
+
+        # One extra row tells whether another page follows.
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # Pages hold model instances or ``values()`` dicts.
+        if isinstance(self.last, dict):
+            key = encode_cursor(self.last["taken_at"], self.last["id"])
+        else:
+            key = encode_cursor(self.last.taken_at, self.last.pk)
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, key)
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Pagination cursor from the previous page's next link.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Number of logs per page (1-{MAX_PAGE_SIZE}).",
+                "schema": {"type": "integer"},
+            },
+        ]
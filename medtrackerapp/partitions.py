@@ -0,0 +1,271 @@
+"""
+Monthly partitioning of DoseLog history.
+
+Whole months of dose logs can be moved out of the live ``DoseLog``
+table into one table per month, registered in :class:`DoseLogPartition`.
+Each partition table has the DoseLog columns and indexes, and is mapped
+to an unmanaged model built on first use, so it is queried with the ORM
+like the live table.
+
+Moving rows does not change what they count towards: daily rollups,
+dose counters, sketch buckets and change sequence numbers are left
+untouched, and the adherence methods (which read those aggregates)
+never scan logs at all. Readers of raw logs go through
+:func:`dose_log_sources`, which pairs the live table with only the
+attached partitions overlapping the requested range. The per-day
+counts of the moved logs are recorded in :class:`PartitionedDoseDay`
+by the same transaction, so rebuilding the aggregates never scans
+partition tables. Detaching a partition is a registry update and
+dropping one is a ``DROP TABLE``, both independent of its size. The
+logs of a detached or dropped partition are no longer returned by
+:func:`dose_log_sources`, but their recorded days (:func:`unread_days`)
+keep counting towards the population analytics.
+
+Partitioned logs are read-only through the API: the DoseLog endpoints
+and ingestion paths only write to the live table.
+"""
+import heapq
+from datetime import date, timedelta
+from operator import attrgetter
+
+from django.db import connection, models, transaction
+from django.db.models import Max
+from django.db.models.functions import Greatest, TruncMonth
+
+from . import archive
+from .aggregates import dose_day, grouped_day_counts, month_bounds, month_start
+from .models import ChangeSequence, DoseLog, DoseLogPartition, Medication, PartitionedDoseDay, Tombstone
+
+#: Columns copied between the live table and the partition tables.
+COLUMNS = ("id", "medication_id", "taken_at", "was_taken", "client_event_id", "change_seq")
+TOMBSTONE_BATCH_SIZE = 1000
+
+_models = {}
+
+
+def partition_model(partition: DoseLogPartition):
+    """
+    Return the unmanaged model mapped onto a partition's table.
+
+    Models are built once per table and process.
+    """
+    table = partition.table_name
+    if table not in _models:
+        suffix = f"{partition.month:%Y%m}"
+        meta = type("Meta", (), {
+            "app_label": DoseLog._meta.app_label,
+            "db_table": table,
+            "managed": False,
+            "ordering": ["-taken_at"],
+            "indexes": [
+                models.Index(fields=["medication", "taken_at"], name=f"doselog_{suffix}_med_idx"),
+                models.Index(fields=["taken_at"], name=f"doselog_{suffix}_taken_idx"),
+                models.Index(fields=["change_seq"], name=f"doselog_{suffix}_seq_idx"),
+            ],
+        })
+        _models[table] = type(f"DoseLog{suffix}", (models.Model,), {
+            "__module__": __name__,
+            "__str__": DoseLog.__str__,
+            "Meta": meta,
+            "id": models.BigIntegerField(primary_key=True),
+            "medication": models.ForeignKey(
+                Medication,
+                on_delete=models.DO_NOTHING,
+                db_constraint=False,
+                db_index=False,
+                related_name="+"
+            ),
+            "taken_at": models.DateTimeField(),
+            "was_taken": models.BooleanField(default=True),
+            "client_event_id": models.CharField(max_length=64, null=True, blank=True),
+            "change_seq": models.PositiveBigIntegerField(default=0),
+        })
+    return _models[table]
+
+
+def _create_table(model):
+    # The schema editor cannot be entered inside an atomic block on
+    # SQLite, so only render its DDL and run it in the current transaction.
+    editor = connection.schema_editor()
+    with connection.cursor() as cursor:
+        cursor.execute(*editor.table_sql(model))
+        for index in model._meta.indexes:
+            cursor.execute(str(index.create_sql(model, editor)))
+
+
+def _qualified_columns():
+    return ", ".join(connection.ops.quote_name(column) for column in COLUMNS)
+
+
+def partition_month(month: date) -> int:
+    """
+    Move the live logs of one month into its partition table.
+
+    Creates and registers the partition on first use; moving a month
+    again appends logs written to it since. Runs in one transaction
+    with set-based statements: the rows are copied, their per-day
+    counts are added to :class:`PartitionedDoseDay` from one
+    ``GROUP BY`` (at most one delta per medication and day), and the
+    live rows are deleted. DoseLog signals are bypassed so no aggregate
+    changes.
+
+    Returns:
+        int: Number of logs moved.
+    """
+    month = month_start(month)
+    start, end = month_bounds(month)
+    bounds = [connection.ops.adapt_datetimefield_value(bound) for bound in (start, end)]
+    live = connection.ops.quote_name(DoseLog._meta.db_table)
+    columns = _qualified_columns()
+    with transaction.atomic():
+        partition, created = DoseLogPartition.objects.select_for_update().get_or_create(month=month)
+        model = partition_model(partition)
+        if created:
+            _create_table(model)
+        table = connection.ops.quote_name(partition.table_name)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {live} "
+                f"WHERE taken_at >= %s AND taken_at < %s",
+                bounds
+            )
+            logs = DoseLog.objects.filter(taken_at__gte=start, taken_at__lt=end)
+            record_days(logs)
+            max_seq = logs.aggregate(seq=Max("change_seq"))["seq"] or 0
+            cursor.execute(f"DELETE FROM {live} WHERE taken_at >= %s AND taken_at < %s", bounds)
+            moved = cursor.rowcount
+        DoseLogPartition.objects.filter(pk=partition.pk).update(
+            rows=models.F("rows") + moved,
+            max_change_seq=Greatest(models.F("max_change_seq"), max_seq)
+        )
+    return moved
+
+
+def record_days(logs):
+    """Add the per-day counts of DoseLog-like rows to the partitioned days."""
+    for medication_id, day, taken, missed in grouped_day_counts(logs):
+        PartitionedDoseDay.apply_delta(medication_id, day, taken, missed)
+
+
+def set_attached(month: date, attached: bool) -> DoseLogPartition:
+    """Attach or detach a partition; detached partitions are not read."""
+    partition = DoseLogPartition.objects.get(month=month_start(month))
+    partition.attached = attached
+    partition.save(update_fields=["attached"])
+    return partition
+
+
+def drop_partition(month: date) -> int:
+    """
+    Drop a partition table and its registry row.
+
+    The logs are deleted without touching the aggregates, which keep
+    summarizing them; their per-day counts stay in
+    :class:`PartitionedDoseDay` so the aggregates can still be rebuilt.
+    Each log leaves a Tombstone so synced clients drop it too.
+
+    Returns:
+        int: Number of logs the partition held.
+    """
+    partition = DoseLogPartition.objects.get(month=month_start(month))
+    with transaction.atomic():
+        ids = list(partition_model(partition).objects.order_by("id").values_list("id", flat=True))
+        if ids:
+            last = ChangeSequence.allocate(len(ids))
+            Tombstone.objects.bulk_create(
+                (
+                    Tombstone(kind=Tombstone.DOSELOG, object_id=log_id, change_seq=last - len(ids) + 1 + i)
+                    for i, log_id in enumerate(ids)
+                ),
+                batch_size=TOMBSTONE_BATCH_SIZE
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(partition.table_name)}")
+        partition.delete()
+    return partition.rows
+
+
+def dropped_days():
+    """Return the PartitionedDoseDay rows of months whose partition was dropped."""
+    return PartitionedDoseDay.objects.annotate(month=TruncMonth("date")).exclude(
+        month__in=DoseLogPartition.objects.values("month")
+    )
+
+
+def unread_days():
+    """
+    Return the PartitionedDoseDay rows of months without an attached partition.
+
+    These are the days of detached and dropped partitions, whose logs
+    :func:`dose_log_sources` does not return; counts-only readers such
+    as the population analytics expand them instead.
+    """
+    return PartitionedDoseDay.objects.annotate(month=TruncMonth("date")).exclude(
+        month__in=DoseLogPartition.objects.filter(attached=True).values("month")
+    )
+
+
+def purge_medication(medication_id: int):
+    """Delete a removed medication's logs from every partition."""
+    for partition in DoseLogPartition.objects.all():
+        partition_model(partition).objects.filter(medication_id=medication_id).delete()
+
+
+def changed_log_sources(since: int) -> list:
+    """
+    Return the partitions' DoseLog-like querysets that may hold logs changed after ``since``.
+
+    Detached partitions are included: detaching only hides a month from
+    range readers, and synced clients keep its logs.
+    """
+    partitions = DoseLogPartition.objects.filter(max_change_seq__gt=since)
+    return [partition_model(p).objects.all() for p in partitions]
+
+
+def dose_log_sources(start=None, end=None, include_detached: bool = False) -> list:
+    """
+    Return DoseLog-like querysets covering a ``taken_at`` range.
+
+    Args:
+        start (datetime): Inclusive lower bound, or None.
+        end (datetime): Exclusive upper bound, or None.
+        include_detached (bool): Whether detached partitions are
+            returned too, for whole-history readers.
+
+    Returns:
+        list[QuerySet]: The live table first, then each attached
+        partition overlapping the range, unfiltered.
+    """
+    partitions = DoseLogPartition.objects.all()
+    if not include_detached:
+        partitions = partitions.filter(attached=True)
+    if start is not None:
+        partitions = partitions.filter(month__gte=month_start(dose_day(start)))
+    if end is not None:
+        partitions = partitions.filter(month__lte=month_start(dose_day(end - timedelta(microseconds=1))))
+    return [DoseLog.objects.all()] + [partition_model(p).objects.all() for p in partitions]
+
+
+def logs_between(start, end, medication_ids=None, chunk_size: int = 2000):
+    """
+    Yield the logs with ``start <= taken_at < end`` in ``(taken_at, id)`` order.
+
+    Each relevant source is range-scanned through its ``taken_at``
+    index, archived segments of the overlapping months are included
+    one month at a time (see ``archive.py``), and the ordered streams
+    are merged lazily.
+
+    Args:
+        start (datetime): Inclusive lower bound.
+        end (datetime): Exclusive upper bound.
+        medication_ids (list[int]): Optional medication filter.
+        chunk_size (int): Rows fetched per round trip from each source.
+    """
+    streams = []
+    for source in dose_log_sources(start, end):
+        logs = source.filter(taken_at__gte=start, taken_at__lt=end)
+        if medication_ids is not None:
+            logs = logs.filter(medication_id__in=medication_ids)
+        streams.append(logs.select_related("medication").order_by("taken_at", "id").iterator(chunk_size=chunk_size))
+    streams.append(archive.logs_between(start, end, medication_ids))
+    return heapq.merge(*streams, key=attrgetter("taken_at", "id"))
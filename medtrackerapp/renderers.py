@@ -0,0 +1,30 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def ndjson_line(row) -> bytes:
+    """Encode one object as a compact NDJSON line."""
+    return json.dumps(row, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders a list as newline-delimited JSON (one object per line).
+
+    Streaming views bypass ``render`` and emit ``ndjson_line`` chunks
+    themselves; this renderer lets clients negotiate the format with
+    ``Accept: application/x-ndjson`` and renders non-streamed (e.g.
+    error) responses as a single line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(ndjson_line(row) for row in rows)
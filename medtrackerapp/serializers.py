@@ -10,6 +10,7 @@ class MedicationSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "dosage_mg", "prescribed_per_day", "adherence"]
 
     def get_adherence(self, obj):
+        """Return the overall adherence rate from the dose counters."""
         return obj.adherence_rate()
 
 
@@ -21,7 +22,106 @@ class DoseLogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DoseLog
-        fields = ["id", "medication", "medication_name", "taken_at", "was_taken"]
+        fields = ["id", "medication", "medication_name", "taken_at", "was_taken", "client_event_id"]
+
+    def validate_client_event_id(self, value):
+        """Treat an empty client event id as absent."""
+        return value or None
+
+
+class DoseLogRowEncoder:
+    """
+    Serializer-free encoder for read-only DoseLog output.
+
+    Produces exactly what :class:`DoseLogSerializer` returns for a log,
+    but from plain ``values()`` rows (or loaded instances) and without
+    binding DRF fields per row: the only field logic kept is the
+    ``taken_at`` representation, resolved once per encoder.
+
+    Usage:
+        rows = DoseLogRowEncoder.values(DoseLog.objects.all())
+        data = DoseLogRowEncoder().encode_rows(rows)
+    """
+
+    #: Columns selected by :meth:`values`, with the medication name joined.
+    FIELDS = ("id", "medication_id", "medication__name", "taken_at", "was_taken", "client_event_id")
+
+    def __init__(self):
+        self._taken_at = DoseLogSerializer().fields["taken_at"].to_representation
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        """Return ``queryset`` as dict rows holding every encoded column and ``extra``."""
+        return queryset.values(*cls.FIELDS, *extra)
+
+    def encode_rows(self, rows) -> list:
+        """Encode dict rows produced by :meth:`values`."""
+        taken_at = self._taken_at
+        return [
+            {
+                "id": row["id"],
+                "medication": row["medication_id"],
+                "medication_name": row["medication__name"],
+                "taken_at": taken_at(row["taken_at"]),
+                "was_taken": row["was_taken"],
+                "client_event_id": row["client_event_id"],
+            }
+            for row in rows
+        ]
+
+    def encode_logs(self, logs) -> list:
+        """Encode DoseLog instances with their medication already loaded."""
+        taken_at = self._taken_at
+        return [
+            {
+                "id": log.id,
+                "medication": log.medication_id,
+                "medication_name": log.medication.name,
+                "taken_at": taken_at(log.taken_at),
+                "was_taken": log.was_taken,
+                "client_event_id": log.client_event_id,
+            }
+            for log in logs
+        ]
+
+
+class DoseLogBulkListSerializer(serializers.ListSerializer):
+    """Validates a batch of dose logs with a single medication lookup."""
+
+    def validate(self, attrs):
+        ids = {row["medication_id"] for row in attrs}
+        existing = set(Medication.objects.filter(pk__in=ids).values_list("pk", flat=True))
+        missing = sorted(ids - existing)
+        if missing:
+            raise serializers.ValidationError(f"Unknown medication ids: {missing}")
+        return attrs
+
+
+class DoseLogBulkSerializer(serializers.Serializer):
+    """
+    Input serializer for bulk dose log ingestion.
+
+    ``medication`` is validated as a plain integer; existence of all
+    referenced medications is checked once per request by
+    :class:`DoseLogBulkListSerializer` instead of once per item.
+    """
+
+    medication = serializers.IntegerField(min_value=1, source="medication_id")
+    taken_at = serializers.DateTimeField()
+    was_taken = serializers.BooleanField(default=True)
+    client_event_id = serializers.CharField(
+        max_length=64,
+        required=False,
+        allow_null=True,
+        allow_blank=True
+    )
+
+    class Meta:
+        list_serializer_class = DoseLogBulkListSerializer
+
+    def validate_client_event_id(self, value):
+        """Treat an empty client event id as absent."""
+        return value or None
 
 
 class NoteSerializer(serializers.ModelSerializer):
@@ -0,0 +1,114 @@
+"""Signal handlers keeping derived dose aggregates, caches and sync tombstones in sync."""
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import archive, cache as adherence_cache, partitions
+from .aggregates import DoseChangeSet
+from .models import (
+    AdherenceSketchBucket,
+    ChangeSequence,
+    DoseLog,
+    DoseLogArchiveSegment,
+    Medication,
+    Note,
+    Tombstone,
+)
+
+
+def _sync_cached_medication(instance, deltas):
+    """
+    Apply counter deltas to the log's in-memory Medication, if loaded.
+
+    The database counters are updated with ``F()`` expressions, so this
+    keeps an already-fetched ``log.medication`` consistent without a
+    ``refresh_from_db()`` round trip.
+    """
+    if not DoseLog.medication.is_cached(instance):
+        return
+    medication = instance.medication
+    if medication is not None and medication.pk in deltas:
+        taken, total = deltas[medication.pk]
+        medication.taken_count += taken
+        medication.total_count += total
+
+
+@receiver(pre_save, sender=DoseLog)
+def remember_previous_dose(sender, instance, **kwargs):
+    """Capture the stored state of a log before it is overwritten."""
+    instance._previous_dose = None
+    if instance.pk is not None:
+        instance._previous_dose = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("medication_id", "taken_at", "was_taken")
+            .first()
+        )
+
+
+@receiver(post_save, sender=DoseLog)
+def record_saved_dose(sender, instance, **kwargs):
+    """Move the log's contribution from its previous state to the new one."""
+    changes = DoseChangeSet()
+    previous = getattr(instance, "_previous_dose", None)
+    if previous is not None:
+        changes.remove(*previous)
+    changes.add(instance.medication_id, instance.taken_at, instance.was_taken)
+    _sync_cached_medication(instance, changes.apply())
+
+
+@receiver(post_delete, sender=DoseLog)
+def record_deleted_dose(sender, instance, **kwargs):
+    """Remove the deleted log's contribution."""
+    changes = DoseChangeSet()
+    changes.remove(instance.medication_id, instance.taken_at, instance.was_taken)
+    _sync_cached_medication(instance, changes.apply())
+
+
+@receiver(pre_delete, sender=Medication)
+def delete_medication_doses(sender, instance, using, **kwargs):
+    """
+    Delete a removed medication's live logs with one statement.
+
+    ``DoseLog.medication`` is ``DO_NOTHING`` (migration 0016) so that
+    this receiver, not a cascade, removes the logs: none is loaded and
+    no per-log signal runs. The medication's rollups and counters are
+    deleted with it, leaving one sketch bucket to adjust, and sync
+    clients drop its logs on the medication's tombstone alone.
+    """
+    taken, total = (
+        sender.objects.using(using).filter(pk=instance.pk).values_list("taken_count", "total_count").get()
+    )
+    bucket = AdherenceSketchBucket.bucket_for(taken, total)
+    if bucket is not None:
+        AdherenceSketchBucket.apply_delta(bucket, -1)
+    DoseLog.objects.using(using).filter(medication_id=instance.pk)._raw_delete(using)
+
+
+@receiver(post_save, sender=Medication)
+@receiver(post_delete, sender=Medication)
+def invalidate_medication_cache(sender, instance, **kwargs):
+    """Drop cached adherence results when a medication changes or is removed."""
+    adherence_cache.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=Medication)
+def purge_partitioned_doses(sender, instance, **kwargs):
+    """Delete a removed medication's logs from the DoseLog partitions."""
+    partitions.purge_medication(instance.pk)
+
+
+@receiver(post_delete, sender=DoseLogArchiveSegment)
+def remove_archive_file(sender, instance, **kwargs):
+    """Delete the file of a removed archive segment after commit."""
+    archive.remove_segment_file(instance)
+
+
+@receiver(post_delete, sender=Medication)
+@receiver(post_delete, sender=DoseLog)
+@receiver(post_delete, sender=Note)
+def record_tombstone(sender, instance, **kwargs):
+    """Record the deletion for delta sync, inside the deleting transaction."""
+    Tombstone.objects.create(
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+        change_seq=ChangeSequence.allocate()
+    )
@@ -0,0 +1,123 @@
+"""
+Delta sync for offline clients.
+
+Every write to a Medication, DoseLog or Note stamps the row with a
+number from :class:`ChangeSequence`, and every delete leaves a
+:class:`Tombstone` stamped the same way. A client keeps the cursor
+returned by ``GET /api/sync/`` and passes it back as ``since`` to
+receive only the rows written or deleted after it. Deleting a
+medication deletes its logs in bulk without tombstones of their own;
+clients drop the logs of a medication when its tombstone arrives.
+
+Logs are read from every storage tier: the live table, the DoseLog
+partitions (attached or detached) and the archived segments. Moving
+logs between tiers keeps their ``change_seq``, so it is invisible to
+clients. Dropping a partition leaves a tombstone per log, and
+retention compaction leaves one compaction tombstone, returned as a
+``logs_before`` timestamp: clients drop every log taken before it.
+Clients apply the deletions of a page before its changed rows.
+
+Cursors are opaque to clients; they currently wrap the last change
+sequence number seen.
+"""
+import base64
+import binascii
+import heapq
+from datetime import timedelta
+
+from . import archive, partitions
+from .models import DoseLog, Medication, Note, Tombstone
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+CURSOR_PREFIX = "v1:"
+
+#: Response keys of the synced models, by ``Tombstone.kind``.
+SECTIONS = {
+    Tombstone.MEDICATION: "medications",
+    Tombstone.DOSELOG: "logs",
+    Tombstone.NOTE: "notes",
+    Tombstone.COMPACTION: "logs_before",
+}
+
+
+def encode_cursor(seq: int) -> str:
+    """Wrap a change sequence number in an opaque cursor."""
+    return base64.urlsafe_b64encode(f"{CURSOR_PREFIX}{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor) -> int:
+    """
+    Unwrap a cursor returned by ``encode_cursor``.
+
+    An empty cursor means "from the beginning".
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError
+        seq = int(raw[len(CURSOR_PREFIX):])
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if seq < 0:
+        raise ValueError("Invalid cursor")
+    return seq
+
+
+def changes_since(since: int, limit: int = DEFAULT_LIMIT) -> dict:
+    """
+    Collect the changes with a sequence number above ``since``.
+
+    Each source is read in ``change_seq`` order with an index range
+    scan of at most ``limit + 1`` rows, and the sources are merged so
+    the page holds the ``limit`` oldest changes overall. A row changed
+    several times appears once, in its latest state.
+
+    Args:
+        since (int): Last change sequence number the client has seen.
+        limit (int): Maximum number of changes returned.
+
+    Returns:
+        dict: ``seq`` (the sequence number to resume from), ``has_more``,
+              the changed ``medications``, ``logs`` and ``notes`` as
+              model instances, and ``deleted`` ids per section plus the
+              compaction cutoffs in ``deleted["logs_before"]``.
+    """
+    sources = [
+        ("medications", Medication.objects.all()),
+        ("logs", DoseLog.objects.select_related("medication")),
+        *[("logs", source.select_related("medication")) for source in partitions.changed_log_sources(since)],
+        ("notes", Note.objects.select_related("medication")),
+        ("deleted", Tombstone.objects.all()),
+    ]
+    streams = [
+        [(obj.change_seq, section, obj) for obj in
+         queryset.filter(change_seq__gt=since).order_by("change_seq")[:limit + 1]]
+        for section, queryset in sources
+    ]
+    streams.append([(log.change_seq, "logs", log) for log in archive.changed_logs(since, limit + 1)])
+    merged = list(heapq.merge(*streams, key=lambda change: change[0]))
+
+    page = merged[:limit]
+    result = {
+        "seq": page[-1][0] if page else since,
+        "has_more": len(merged) > limit,
+        "medications": [],
+        "logs": [],
+        "notes": [],
+        "deleted": {section: [] for section in SECTIONS.values()},
+    }
+    for _seq, section, obj in page:
+        if section == "deleted" and obj.kind == Tombstone.COMPACTION:
+            result["deleted"]["logs_before"].append(archive.EPOCH + timedelta(microseconds=obj.object_id))
+        elif section == "deleted":
+            result["deleted"][SECTIONS[obj.kind]].append(obj.object_id)
+        else:
+            result[section].append(obj)
+    return result
@@ -0,0 +1,34 @@
+"""Shared fixtures for the storage-tier tests (partitions, archive, compaction)."""
+from datetime import datetime
+
+from django.utils import timezone
+
+from medtrackerapp.models import Medication, DoseLog
+
+
+def at(year, month, day, hour=8):
+    """Return an aware datetime in the current time zone."""
+    return timezone.make_aware(datetime(year, month, day, hour))
+
+
+class DoseHistoryMixin:
+    """
+    Creates ``self.med`` and helpers to log its dose history.
+
+    Attributes:
+        prescribed_per_day (int): Schedule of ``self.med``.
+    """
+
+    prescribed_per_day = 1
+
+    def setUp(self):
+        super().setUp()
+        self.med = Medication.objects.create(
+            name="Aspirin", dosage_mg=100, prescribed_per_day=self.prescribed_per_day
+        )
+
+    def log_dose(self, taken_at, was_taken, medication=None, **fields):
+        """Create a dose log, for ``self.med`` unless another medication is given."""
+        return DoseLog.objects.create(
+            medication=medication or self.med, taken_at=taken_at, was_taken=was_taken, **fields
+        )
@@ -0,0 +1,86 @@
+from io import StringIO
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp import analytics
+from medtrackerapp.models import Medication, DoseLog
+
+
+class AnalyticsEngineTests(APITestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+        self.meds = [
+            Medication.objects.create(name=f"Med{i}", dosage_mg=10, prescribed_per_day=i + 1)
+            for i in range(3)
+        ]
+        self.idle = Medication.objects.create(name="Idle", dosage_mg=10, prescribed_per_day=1)
+        self.invalid = Medication.objects.create(name="Bad", dosage_mg=10, prescribed_per_day=0)
+        for i, med in enumerate(self.meds):
+            for day in range(5):
+                for dose in range(i + 2):
+                    DoseLog.objects.create(
+                        medication=med,
+                        taken_at=self.now - timedelta(days=day, minutes=dose),
+                        was_taken=(day + dose) % 3 != 0
+                    )
+
+    def test_overall_adherence_matches_model(self):
+        arrays = analytics.load_dose_arrays(chunk_size=7)
+        rates = analytics.adherence_by_medication(arrays)
+        for med in self.meds:
+            self.assertEqual(rates[med.id], med.adherence_rate())
+        self.assertNotIn(self.idle.id, rates)
+
+    def test_period_rates_match_model(self):
+        arrays = analytics.load_dose_arrays(chunk_size=7)
+        start, end = self.today - timedelta(days=3), self.today - timedelta(days=1)
+        rates = analytics.period_rates(arrays, start, end)
+        for med in self.meds + [self.idle]:
+            self.assertEqual(rates[med.id], med.adherence_rate_over_period(start, end))
+        self.assertIsNone(rates[self.invalid.id])
+
+    def test_period_loading_reads_only_its_days(self):
+        start, end = self.today - timedelta(days=3), self.today - timedelta(days=1)
+        arrays = analytics.load_dose_arrays(start_date=start, end_date=end)
+        self.assertEqual(len(arrays), DoseLog.objects.filter(taken_at__date__range=(start, end)).count())
+        self.assertEqual(analytics.period_rates(arrays, start, end),
+                         analytics.period_rates(analytics.load_dose_arrays(), start, end))
+
+    def test_daily_matrix_counts(self):
+        arrays = analytics.load_dose_arrays()
+        ids, taken, missed = analytics.daily_matrix(arrays, self.today - timedelta(days=4), self.today)
+        self.assertEqual(taken.shape, (3, 5))
+        row = list(ids).index(self.meds[0].id)
+        for col in range(5):
+            day = self.today - timedelta(days=4 - col)
+            logs = DoseLog.objects.filter(medication=self.meds[0], taken_at__date=day)
+            self.assertEqual(taken[row, col], logs.filter(was_taken=True).count())
+            self.assertEqual(missed[row, col], logs.filter(was_taken=False).count())
+
+    def test_report_endpoint(self):
+        url = reverse("medication-population-report")
+        response = self.client.get(f"{url}?start={self.today}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["summary"]["medications"], 5)
+        self.assertEqual(response.data["summary"]["logs"], DoseLog.objects.count())
+        overall = {row["medication_id"]: row["adherence"] for row in response.data["results"]}
+        for med in self.meds + [self.idle]:
+            self.assertEqual(overall[med.id], med.adherence_rate())
+
+    def test_report_endpoint_invalid_range(self):
+        url = reverse("medication-population-report")
+        response = self.client.get(f"{url}?start={self.today}&end={self.today - timedelta(days=1)}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_report_command(self):
+        out = StringIO()
+        call_command("adherence_report", "--start", str(self.today), "--end", str(self.today),
+                     "--format", "csv", stdout=out)
+        self.assertEqual(len(out.getvalue().strip().splitlines()), 6)
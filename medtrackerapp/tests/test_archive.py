@@ -0,0 +1,109 @@
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from medtrackerapp import analytics, archive
+from medtrackerapp.models import Medication, DoseLog, DoseLogArchiveSegment
+from medtrackerapp.tests.helpers import DoseHistoryMixin, at
+
+
+class ArchiveDosesTests(DoseHistoryMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = Path(tmp.name)
+        override = override_settings(DOSELOG_ARCHIVE_DIR=self.archive_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        self.logs = [
+            self.log_dose(at(2024, 1, 10), True, client_event_id="evt-1"),
+            self.log_dose(at(2024, 1, 10, 9), False, medication=self.other),
+            self.log_dose(at(2024, 2, 3), False),
+            self.log_dose(at(2024, 6, 1), True),
+        ]
+        self.url = reverse("doselog-filter-by-date")
+
+    def archive(self, before):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("archive_doses", "--before", before, stdout=StringIO())
+
+    def filter_by_date(self, start, end):
+        return self.client.get(self.url, {"start": start, "end": end}).data
+
+    def test_archives_old_logs_per_medication_month(self):
+        before = self.filter_by_date("2024-01-01", "2024-12-31")
+        self.archive("2024-03-01")
+
+        self.assertEqual(list(DoseLog.objects.values_list("id", flat=True)), [self.logs[3].id])
+        self.assertEqual(DoseLogArchiveSegment.objects.count(), 3)
+        self.assertEqual(len(list(self.archive_dir.rglob("*.npz"))), 3)
+        self.assertEqual(self.filter_by_date("2024-01-01", "2024-12-31"), before)
+
+    def test_segments_are_opened_month_by_month(self):
+        self.archive("2024-03-01")
+        with patch.object(archive, "read_segment", wraps=archive.read_segment) as read:
+            logs = archive.logs_between(at(2024, 1, 1), at(2024, 3, 1))
+            self.assertEqual(read.call_count, 0)
+            self.assertEqual([next(logs).id, next(logs).id], [self.logs[0].id, self.logs[1].id])
+            self.assertEqual({call.args[0].month.month for call in read.call_args_list}, {1})
+            self.assertEqual([log.id for log in logs], [self.logs[2].id])
+            self.assertEqual(read.call_count, 3)
+
+    def rates(self):
+        self.med.refresh_from_db()
+        start, end = at(2024, 1, 1).date(), at(2024, 6, 30).date()
+        return self.med.adherence_rate(), self.med.adherence_rate_over_period(start, end)
+
+    def test_adherence_is_unchanged(self):
+        rates = self.rates()
+        self.archive("2024-03-01")
+        self.assertEqual(self.rates(), rates)
+        arrays = analytics.load_dose_arrays()
+        self.assertEqual(len(arrays), 4)
+        january = analytics.load_dose_arrays(start_date=at(2024, 1, 1).date(), end_date=at(2024, 1, 31).date())
+        self.assertEqual(len(january), 2)
+
+    def test_streaks_span_archived_and_live_logs(self):
+        self.log_dose(at(2024, 2, 4), False)
+        self.log_dose(at(2024, 6, 2), False)
+        streaks = self.med.missed_dose_streaks()
+        self.archive("2024-03-01")
+        self.log_dose(at(2024, 2, 5), False)
+
+        self.assertEqual(streaks, {"current": 1, "longest": 2})
+        self.assertEqual(self.med.missed_dose_streaks(), {"current": 1, "longest": 3})
+
+    def test_heatmap_counts_archived_logs(self):
+        heatmap = self.med.dose_heatmap()
+        self.archive("2024-03-01")
+        self.assertEqual(self.med.dose_heatmap(), heatmap)
+
+    def test_rerun_merges_into_segment(self):
+        self.archive("2024-01-01")
+        self.archive("2024-02-01")
+        self.archive("2024-02-01")
+        DoseLog.objects.create(medication=self.med, taken_at=at(2024, 1, 20), was_taken=True)
+        self.archive("2024-02-01")
+
+        segment = DoseLogArchiveSegment.objects.get(medication=self.med)
+        self.assertEqual(segment.rows, 2)
+        self.assertEqual(len(list((self.archive_dir / str(self.med.id)).glob("*.npz"))), 1)
+        logs = self.filter_by_date("2024-01-01", "2024-01-31")
+        self.assertEqual([log["taken_at"][:10] for log in logs], ["2024-01-10", "2024-01-10", "2024-01-20"])
+        self.assertEqual(logs[0]["client_event_id"], "evt-1")
+
+    def test_deleting_medication_removes_files(self):
+        self.archive("2024-03-01")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.med.delete()
+        self.assertEqual(len(list(self.archive_dir.rglob("*.npz"))), 1)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from medtrackerapp import cache as adherence_cache
+from medtrackerapp.aggregates import rebuild_rollups
+from medtrackerapp.models import Medication, DoseLog
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class AdherenceCacheTests(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Warfarin", dosage_mg=5, prescribed_per_day=1)
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+        adherence_cache.stats.reset()
+
+    def test_repeated_reads_hit_cache(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+
+        self.assertEqual(adherence_cache.stats.snapshot()["hits"], 1)
+        self.assertEqual(adherence_cache.stats.snapshot()["misses"], 1)
+
+    def test_dose_log_write_invalidates(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+
+        log.taken_at = self.now - timedelta(days=1)
+        log.save()
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 0.0)
+
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=False)
+        self.assertEqual(Medication.objects.get(pk=self.med.pk).adherence_rate(), 50.0)
+
+    def test_medication_update_invalidates(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+
+        self.med.prescribed_per_day = 2
+        self.med.save()
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 50.0)
+
+    def test_errors_are_not_cached(self):
+        with self.assertRaises(ValueError):
+            self.med.adherence_rate_over_period(self.today, self.today - timedelta(days=1))
+        with self.assertRaises(ValueError):
+            self.med.adherence_rate_over_period(self.today, self.today - timedelta(days=1))
+
+    def test_stale_instance_does_not_poison_cache(self):
+        DoseLog.objects.create(medication_id=self.med.pk, taken_at=self.now, was_taken=True)
+        self.assertEqual(self.med.adherence_rate(), 0.0)
+        self.assertEqual(Medication.objects.get(pk=self.med.pk).adherence_rate(), 100.0)
+
+        stale = Medication.objects.get(pk=self.med.pk)
+        Medication.objects.filter(pk=self.med.pk).update(prescribed_per_day=2)
+        self.assertEqual(stale.adherence_rate_over_period(self.today, self.today), 100.0)
+        fresh = Medication.objects.get(pk=self.med.pk)
+        self.assertEqual(fresh.adherence_rate_over_period(self.today, self.today), 50.0)
+
+    def test_rebuild_rollups_invalidates(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        version = adherence_cache.get_version(self.med.pk)
+        rebuild_rollups([self.med.pk])
+        self.assertNotEqual(adherence_cache.get_version(self.med.pk), version)
+
+    def test_counter_repair_invalidates(self):
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 0.0)
+        version = adherence_cache.get_version(self.med.pk)
+        Medication.objects.filter(pk=self.med.pk).update(taken_count=1)
+        call_command("check_dose_counters", "--repair", stdout=StringIO())
+        self.assertNotEqual(adherence_cache.get_version(self.med.pk), version)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}})
+    def test_without_shared_backend_every_read_is_computed(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+        self.assertEqual(self.med.adherence_rate_over_period(self.today, self.today), 100.0)
+        self.assertEqual(adherence_cache.stats.snapshot()["hits"], 0)
+        self.assertEqual(adherence_cache.stats.snapshot()["misses"], 2)
@@ -0,0 +1,111 @@
+import tempfile
+from datetime import date
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from medtrackerapp import analytics, archive, compaction, partitions
+from medtrackerapp.aggregates import rebuild_rollups
+from medtrackerapp.models import (
+    DoseLog, DoseDailyRollup, CompactedDoseDay, DoseLogArchiveSegment, DoseLogPartition, PartitionedDoseDay
+)
+from medtrackerapp.tests.helpers import DoseHistoryMixin, at
+
+
+class CompactDosesTests(DoseHistoryMixin, TestCase):
+
+    prescribed_per_day = 2
+
+    def setUp(self):
+        super().setUp()
+        for day, hour, taken in [(10, 8, True), (10, 20, False), (11, 8, True), (12, 8, True)]:
+            self.log_dose(at(2024, 1, day, hour), taken)
+        self.recent = self.log_dose(at(2024, 6, 1), False)
+
+    def compact(self, *args):
+        call_command("compact_doses", "--before", "2024-03-01", *args, stdout=StringIO())
+
+    def state(self):
+        self.med.refresh_from_db()
+        return (
+            self.med.adherence_rate(),
+            self.med.adherence_rate_over_period(date(2024, 1, 1), date(2024, 6, 30)),
+            list(DoseDailyRollup.objects.order_by("date").values_list("date", "taken", "missed")),
+        )
+
+    def test_compacts_old_logs_into_daily_summaries(self):
+        before = self.state()
+        arrays = analytics.load_dose_arrays()
+        self.compact()
+
+        self.assertEqual(list(DoseLog.objects.values_list("id", flat=True)), [self.recent.id])
+        self.assertEqual(
+            list(CompactedDoseDay.objects.order_by("date").values_list("date", "taken", "missed")),
+            [(date(2024, 1, 10), 1, 1), (date(2024, 1, 11), 1, 0), (date(2024, 1, 12), 1, 0)]
+        )
+        self.assertEqual(self.state(), before)
+        after = analytics.load_dose_arrays()
+        self.assertEqual(after.days.tolist(), arrays.days.tolist())
+        self.assertEqual(sorted(after.taken.tolist()), sorted(arrays.taken.tolist()))
+
+    def test_heatmap_reports_compacted_doses_as_untimed(self):
+        self.compact()
+        heatmap = self.med.dose_heatmap()
+        self.assertEqual(heatmap["untimed"], {"taken": 3, "missed": 1})
+        self.assertEqual((sum(map(sum, heatmap["taken"])), sum(map(sum, heatmap["missed"]))), (0, 1))
+
+    def test_batches_are_bounded(self):
+        self.assertEqual(list(compaction.compact_before(at(2024, 3, 1), batch_size=3)), [3, 1])
+        self.assertEqual(CompactedDoseDay.objects.get(date=date(2024, 1, 10)).missed, 1)
+
+    def test_rebuild_and_check_count_compacted_days(self):
+        before = self.state()
+        self.compact("--batch-size", "2")
+        self.compact()
+
+        rebuild_rollups([self.med.id])
+        self.assertEqual(self.state(), before)
+
+        out = StringIO()
+        call_command("check_dose_counters", stdout=out)
+        self.assertIn("found 0 mismatched", out.getvalue())
+
+    def test_compacts_partitioned_and_archived_logs(self):
+        self.log_dose(at(2024, 2, 20), False)
+        self.log_dose(at(2024, 2, 21), False)
+        self.log_dose(at(2024, 3, 5), True)
+        kept = self.log_dose(at(2024, 3, 20), True)
+        before = self.state()
+        streaks = self.med.missed_dose_streaks()
+        partitions.partition_month(date(2024, 1, 1))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        with override_settings(DOSELOG_ARCHIVE_DIR=Path(tmp.name)), self.captureOnCommitCallbacks(execute=True):
+            list(archive.archive_before(at(2024, 4, 1)))
+            arrays = analytics.load_dose_arrays()
+            list(compaction.compact_before(at(2024, 3, 10)))
+
+            self.assertFalse(DoseLogPartition.objects.exists())
+            self.assertFalse(PartitionedDoseDay.objects.exists())
+            segment = DoseLogArchiveSegment.objects.get()
+            self.assertEqual(archive.read_segment(segment)["id"].tolist(), [kept.id])
+            self.assertEqual(analytics.load_dose_arrays().days.tolist(), arrays.days.tolist())
+            self.assertEqual(self.med.missed_dose_streaks(), streaks)
+            rebuild_rollups([self.med.id])
+        self.assertEqual([path.name for path in Path(tmp.name).rglob("*.npz")], [Path(segment.file).name])
+        self.assertEqual(sum(day.taken + day.missed for day in CompactedDoseDay.objects.all()), 7)
+        self.assertEqual(self.state(), before)
+
+    def test_folds_dropped_partition_days(self):
+        partitions.partition_month(date(2024, 1, 1))
+        partitions.drop_partition(date(2024, 1, 1))
+        self.compact()
+
+        self.assertFalse(PartitionedDoseDay.objects.exists())
+        self.assertEqual(
+            list(CompactedDoseDay.objects.order_by("date").values_list("date", "taken", "missed")),
+            [(date(2024, 1, 10), 1, 1), (date(2024, 1, 11), 1, 0), (date(2024, 1, 12), 1, 0)]
+        )
@@ -0,0 +1,66 @@
+import gzip
+import json
+import zlib
+
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp import middleware
+from medtrackerapp.models import Medication, DoseLog, Note
+
+
+class CompressedRequestTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.bulk_url = reverse("doselog-bulk-create")
+        self.rows = [
+            {"medication": self.med.id, "taken_at": timezone.now().isoformat(), "was_taken": True}
+            for _ in range(50)
+        ]
+
+    def post(self, url, body, encoding, content_type="application/json"):
+        return self.client.generic("POST", url, body, content_type=content_type, HTTP_CONTENT_ENCODING=encoding)
+
+    def test_gzip_bulk_upload(self):
+        response = self.post(self.bulk_url, gzip.compress(json.dumps(self.rows).encode()), "gzip")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DoseLog.objects.count(), 50)
+
+    def test_deflate_ndjson_upload(self):
+        body = "\n".join(json.dumps(row) for row in self.rows).encode()
+        for compress in (zlib.compress, lambda data: zlib.compress(data, wbits=-zlib.MAX_WBITS)):
+            response = self.post(self.bulk_url, compress(body), "deflate", "application/x-ndjson")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DoseLog.objects.count(), 100)
+
+    def test_zstd_note_create(self):
+        if "zstd" not in middleware.DECODERS:
+            self.skipTest("no zstd implementation installed")
+        import zstandard
+        body = json.dumps({"medication_id": self.med.id, "text": "Compressed"}).encode()
+        response = self.post(reverse("note-list"), zstandard.ZstdCompressor().compress(body), "zstd")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Note.objects.get().text, "Compressed")
+
+    def test_stacked_encodings(self):
+        body = zlib.compress(gzip.compress(json.dumps(self.rows).encode()))
+        response = self.post(self.bulk_url, body, "gzip, deflate")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REQUEST_MAX_DECOMPRESSED_SIZE=1024)
+    def test_oversized_body_is_rejected(self):
+        response = self.post(self.bulk_url, gzip.compress(json.dumps(self.rows).encode()), "gzip")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(DoseLog.objects.count(), 0)
+
+    def test_corrupt_body_is_rejected(self):
+        response = self.post(self.bulk_url, gzip.compress(json.dumps(self.rows).encode())[:-20], "gzip")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_encoding_is_rejected(self):
+        response = self.post(self.bulk_url, b"...", "br")
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
@@ -0,0 +1,103 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp.models import Medication, DoseLog, Note
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.log = DoseLog.objects.create(medication=self.med, taken_at=timezone.now())
+        self.note = Note.objects.create(medication=self.med, text="Take with food")
+
+    def assertNotModified(self, url, response):
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again.content, b"")
+        self.assertEqual(again["ETag"], response["ETag"])
+
+    def test_unchanged_resources_return_304(self):
+        urls = [
+            reverse("medication-list"),
+            reverse("medication-detail", args=[self.med.id]),
+            reverse("doselog-list"),
+            reverse("doselog-detail", args=[self.log.id]),
+            reverse("note-list"),
+            reverse("note-detail", args=[self.note.id]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response["ETag"].startswith('W/"'))
+                self.assertIn("Last-Modified", response)
+                self.assertNotModified(url, response)
+
+    def test_304_skips_serialization(self):
+        url = reverse("doselog-detail", args=[self.log.id])
+        etag = self.client.get(url)["ETag"]
+        with patch("medtrackerapp.views.DoseLogSerializer.to_representation") as to_representation:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_representation.assert_not_called()
+
+    def test_if_modified_since(self):
+        url = reverse("note-list")
+        response = self.client.get(url)
+        again = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_writes_change_the_etag(self):
+        med_url = reverse("medication-detail", args=[self.med.id])
+        logs_url = reverse("doselog-list")
+        notes_url = reverse("note-list")
+        note_url = reverse("note-detail", args=[self.note.id])
+        before = {url: self.client.get(url)["ETag"] for url in (med_url, logs_url, notes_url, note_url)}
+
+        # A new log changes the log list and the medication's adherence,
+        # but not the notes, which only show the medication's name.
+        DoseLog.objects.create(medication=self.med, taken_at=timezone.now(), was_taken=False)
+        for url in (med_url, logs_url):
+            self.assertNotEqual(self.client.get(url)["ETag"], before[url])
+        for url in (notes_url, note_url):
+            self.assertEqual(self.client.get(url)["ETag"], before[url])
+
+        # Renaming the medication changes lists showing its name.
+        etag = self.client.get(notes_url)["ETag"]
+        self.med.name = "Aspirin Forte"
+        self.med.save()
+        self.assertNotEqual(self.client.get(notes_url)["ETag"], etag)
+
+        etag = self.client.get(notes_url)["ETag"]
+        self.note.delete()
+        response = self.client.get(notes_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_query_string_is_part_of_the_etag(self):
+        url = reverse("note-list")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, {"medication": self.med.id + 1}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_log_page_etag_covers_only_its_rows(self):
+        older = DoseLog.objects.create(medication=self.med, taken_at=self.log.taken_at - timedelta(days=1))
+        first = self.client.get(reverse("doselog-list"), {"page_size": 1})
+        second_url = first.data["next"]
+        etag = self.client.get(second_url)["ETag"]
+
+        # A new log on the first page leaves the second page unchanged...
+        DoseLog.objects.create(medication=self.med, taken_at=timezone.now())
+        self.assertNotModified(second_url, self.client.get(second_url))
+        self.assertEqual(self.client.get(second_url)["ETag"], etag)
+
+        # ...while an edit of one of its rows does not.
+        older.was_taken = False
+        older.save()
+        self.assertEqual(self.client.get(second_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
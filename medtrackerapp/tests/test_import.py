@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from medtrackerapp.models import Medication, DoseLog
+
+
+class ImportDosesCommandTests(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+
+    def write(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_import_csv(self):
+        path = self.write(".csv", (
+            "medication,taken_at,was_taken\n"
+            "Aspirin,2024-01-01T08:00:00Z,true\n"
+            "Ibuprofen,2024-01-01 20:00:00,0\n"
+            "Aspirin,2024-01-02T08:00:00+00:00,missed\n"
+        ))
+        out = StringIO()
+        call_command("import_doses", path, "--batch-size", "2", stdout=out)
+
+        self.assertIn("Imported 3 rows", out.getvalue())
+        self.assertEqual(DoseLog.objects.filter(medication=self.med).count(), 2)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (1, 2))
+
+    def test_import_ndjson_by_id(self):
+        lines = [
+            {"medication_id": self.other.id, "taken_at": "2024-01-01T08:00:00Z"},
+            {"medication": "Aspirin", "taken_at": "2024-01-01T09:00:00Z", "was_taken": False},
+        ]
+        path = self.write(".ndjson", "\n".join(json.dumps(line) for line in lines))
+        call_command("import_doses", path, stdout=StringIO())
+
+        self.assertEqual(DoseLog.objects.count(), 2)
+        self.assertFalse(DoseLog.objects.get(medication=self.med).was_taken)
+
+    def test_unknown_medication_aborts(self):
+        path = self.write(".csv", "medication,taken_at\nUnknown,2024-01-01T08:00:00Z\n")
+        with self.assertRaises(CommandError):
+            call_command("import_doses", path, stdout=StringIO())
+
+    def test_skip_invalid(self):
+        Medication.objects.create(name="Aspirin", dosage_mg=500, prescribed_per_day=1)
+        path = self.write(".csv", (
+            "medication,taken_at\n"
+            "Aspirin,2024-01-01T08:00:00Z\n"
+            "Ibuprofen,not-a-date\n"
+            "Ibuprofen,2024-01-01T08:00:00Z\n"
+        ))
+        err = StringIO()
+        call_command("import_doses", path, "--skip-invalid", stdout=StringIO(), stderr=err)
+
+        self.assertEqual(DoseLog.objects.count(), 1)
+        self.assertIn("ambiguous", err.getvalue())
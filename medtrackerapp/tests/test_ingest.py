@@ -0,0 +1,181 @@
+import json
+from unittest.mock import patch
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp import ingest
+from medtrackerapp.models import ChangeSequence, Medication, DoseLog, DoseDailyRollup
+
+
+class BulkDoseLogEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        self.url = reverse("doselog-bulk-create")
+        self.now = timezone.now()
+
+    def rows(self, count):
+        return [
+            {
+                "medication": self.med.id if i % 2 else self.other.id,
+                "taken_at": self.now.isoformat(),
+                "was_taken": i % 3 != 0
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_json_array(self):
+        response = self.client.post(f"{self.url}?batch_size=4", self.rows(10), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"created": 10, "updated": 0, "ignored": 0, "batches": 3})
+        self.assertEqual(DoseLog.objects.count(), 10)
+
+    def test_bulk_ndjson(self):
+        body = "\n".join(json.dumps(row) for row in self.rows(3)) + "\n"
+        response = self.client.post(self.url, body, content_type="application/x-ndjson")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DoseLog.objects.count(), 3)
+
+    def test_bulk_updates_aggregates(self):
+        self.client.post(self.url, self.rows(6), format="json")
+
+        self.med.refresh_from_db()
+        logs = DoseLog.objects.filter(medication=self.med)
+        self.assertEqual(self.med.total_count, logs.count())
+        self.assertEqual(self.med.taken_count, logs.filter(was_taken=True).count())
+        rollup = DoseDailyRollup.objects.get(medication=self.med, date=timezone.localdate(self.now))
+        self.assertEqual(rollup.taken + rollup.missed, logs.count())
+
+    def test_bulk_query_count_independent_of_rows(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(self.url, self.rows(10), format="json")
+        with CaptureQueriesContext(connection) as large:
+            self.client.post(self.url, self.rows(200), format="json")
+
+        self.assertEqual(DoseLog.objects.count(), 210)
+        self.assertLessEqual(len(large), len(small))
+
+    def test_bulk_unknown_medication_rejects_everything(self):
+        rows = self.rows(3) + [{"medication": 9999, "taken_at": self.now.isoformat()}]
+        response = self.client.post(self.url, rows, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(DoseLog.objects.count(), 0)
+
+    def test_bulk_invalid_payloads(self):
+        self.assertEqual(self.client.post(self.url, {"medication": 1}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, [], format="json").status_code, 400)
+        bad_ndjson = self.client.post(self.url, "{\"a\": 1}\nnot json\n", content_type="application/x-ndjson")
+        self.assertEqual(bad_ndjson.status_code, 400)
+        self.assertEqual(self.client.post(f"{self.url}?batch_size=0", self.rows(1), format="json").status_code, 400)
+
+
+class IdempotentDoseLogTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.list_url = reverse("doselog-list")
+        self.bulk_url = reverse("doselog-bulk-create")
+        self.now = timezone.now()
+
+    def payload(self, event_id, was_taken=True):
+        return {
+            "medication": self.med.id,
+            "taken_at": self.now.isoformat(),
+            "was_taken": was_taken,
+            "client_event_id": event_id
+        }
+
+    def test_create_retry_returns_existing(self):
+        first = self.client.post(self.list_url, self.payload("evt-1"), format="json")
+        retry = self.client.post(self.list_url, self.payload("evt-1", False), format="json")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertTrue(retry.data["was_taken"])
+        self.med.refresh_from_db()
+        self.assertEqual(self.med.total_count, 1)
+
+    def test_create_retry_with_update(self):
+        self.client.post(self.list_url, self.payload("evt-1"), format="json")
+        retry = self.client.post(f"{self.list_url}?on_conflict=update", self.payload("evt-1", False), format="json")
+
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertFalse(retry.data["was_taken"])
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (0, 1))
+
+    def test_create_without_event_id_is_not_deduplicated(self):
+        data = {"medication": self.med.id, "taken_at": self.now.isoformat(), "was_taken": True}
+        self.client.post(self.list_url, data, format="json")
+        self.client.post(self.list_url, dict(data, client_event_id=""), format="json")
+        self.assertEqual(DoseLog.objects.count(), 2)
+
+    def test_bulk_ignores_known_and_repeated_ids(self):
+        self.client.post(self.list_url, self.payload("evt-1"), format="json")
+        rows = [self.payload("evt-1", False), self.payload("evt-2"), self.payload("evt-2"), self.payload(None)]
+        response = self.client.post(self.bulk_url, rows, format="json")
+
+        self.assertEqual(response.data, {"created": 2, "updated": 0, "ignored": 2, "batches": 1})
+        self.assertEqual(DoseLog.objects.count(), 3)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (3, 3))
+
+    def test_bulk_update_conflicts(self):
+        self.client.post(self.list_url, self.payload("evt-1"), format="json")
+        rows = [self.payload("evt-1", False), self.payload("evt-2", False)]
+        response = self.client.post(f"{self.bulk_url}?on_conflict=update", rows, format="json")
+
+        self.assertEqual(response.data["created"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.assertFalse(DoseLog.objects.get(client_event_id="evt-1").was_taken)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (0, 2))
+
+    def insert_racing(self, was_taken, on_conflict):
+        """Run insert_batch while another writer stores the same event id after its read."""
+        allocate = ChangeSequence.allocate
+        raced = []
+
+        def allocate_after_race(count=1):
+            if not raced:
+                raced.append(True)
+                ingest.insert_batch([{"medication_id": self.med.id, "taken_at": self.now,
+                                      "was_taken": True, "client_event_id": "evt-1"}])
+            return allocate(count)
+
+        row = {"medication_id": self.med.id, "taken_at": self.now, "was_taken": was_taken,
+               "client_event_id": "evt-1"}
+        with patch.object(ChangeSequence, "allocate", side_effect=allocate_after_race):
+            return ingest.insert_batch([row], on_conflict)
+
+    def test_racing_insert_is_not_counted_twice(self):
+        result = self.insert_racing(False, "ignore")
+
+        self.assertEqual(result, {"created": 0, "updated": 0, "ignored": 1})
+        self.assertTrue(DoseLog.objects.get(client_event_id="evt-1").was_taken)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (1, 1))
+        self.assertEqual(list(DoseDailyRollup.objects.values_list("taken", "missed")), [(1, 0)])
+
+    def test_racing_insert_is_overwritten_once(self):
+        result = self.insert_racing(False, "update")
+
+        self.assertEqual(result, {"created": 0, "updated": 1, "ignored": 0})
+        self.assertFalse(DoseLog.objects.get(client_event_id="evt-1").was_taken)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (0, 1))
+        self.assertEqual(list(DoseDailyRollup.objects.values_list("taken", "missed")), [(0, 1)])
+
+    def test_invalid_conflict_mode(self):
+        response = self.client.post(f"{self.bulk_url}?on_conflict=merge", [self.payload("x")], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
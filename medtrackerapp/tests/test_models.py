@@ -1,7 +1,11 @@
+from unittest import skipUnless
+
+from django.db import connection
 from django.test import TestCase
 from django.utils import timezone
 from datetime import date, timedelta
 
+from medtrackerapp.aggregates import day_bounds
 from medtrackerapp.models import Medication, DoseLog
 
 
@@ -77,6 +81,114 @@ class TestMedicationModel(TestCase):
         with self.assertRaises(ValueError):
             self.med.adherence_rate_over_period(start, end)
 
+    # --- ROLLING ADHERENCE SERIES ---
+
+    def test_adherence_series_matches_period_rate(self):
+        now = timezone.now()
+        today = timezone.localdate(now)
+        for day in range(10):
+            for dose in range(day % 3):
+                DoseLog.objects.create(
+                    medication=self.med,
+                    taken_at=now - timedelta(days=day, minutes=dose),
+                    was_taken=True
+                )
+
+        start, end = today - timedelta(days=6), today
+        series = self.med.adherence_series(start, end, window=3)
+
+        self.assertEqual(len(series), 7)
+        for day, rate in series:
+            expected = self.med.adherence_rate_over_period(day - timedelta(days=2), day)
+            self.assertEqual(rate, expected)
+
+    def test_adherence_series_invalid_window(self):
+        with self.assertRaises(ValueError):
+            self.med.adherence_series(date.today(), date.today(), window=0)
+        with self.assertRaises(ValueError):
+            self.med.adherence_series(date.today(), date.today(), window=1000000000)
+
+    def test_adherence_series_range_is_capped(self):
+        with self.assertRaises(ValueError):
+            self.med.adherence_series(date(100, 1, 1), date(9999, 12, 31), window=1)
+
+    def test_adherence_series_at_calendar_start(self):
+        series = self.med.adherence_series(date.min, date(1, 1, 3), window=7)
+        self.assertEqual([day for day, _rate in series], [date(1, 1, 1), date(1, 1, 2), date(1, 1, 3)])
+
+    # --- PROPORTION OF DAYS COVERED ---
+
+    def test_coverage_over_period(self):
+        now = timezone.now()
+        today = timezone.localdate(now)
+        # Covered (2 taken doses) on days -9, -8 and -3; day -5 only half covered.
+        for day, doses in ((9, 2), (8, 2), (5, 1), (3, 2)):
+            for dose in range(doses):
+                DoseLog.objects.create(
+                    medication=self.med,
+                    taken_at=now - timedelta(days=day, minutes=dose),
+                    was_taken=True
+                )
+
+        coverage = self.med.coverage_over_period(today - timedelta(days=9), today)
+
+        self.assertEqual(coverage["days"], 10)
+        self.assertEqual(coverage["covered_days"], 3)
+        self.assertEqual(coverage["pdc"], 30.0)
+        self.assertEqual(coverage["max_gap_days"], 4)  # days -7 .. -4
+
+    def test_coverage_without_logs_is_one_gap(self):
+        coverage = self.med.coverage_over_period(date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(coverage["pdc"], 0.0)
+        self.assertEqual(coverage["max_gap_days"], 31)
+
+    def test_coverage_at_calendar_start(self):
+        coverage = self.med.coverage_over_period(date.min, date(1, 1, 10))
+        self.assertEqual(coverage["days"], 10)
+        self.assertEqual(coverage["max_gap_days"], 10)
+
+    def test_coverage_range_is_capped(self):
+        with self.assertRaises(ValueError):
+            self.med.coverage_over_period(date(100, 1, 1), date(9999, 12, 31))
+
+    # --- MISSED-DOSE STREAKS ---
+
+    def log_pattern(self, med, pattern):
+        start = timezone.now() - timedelta(days=len(pattern))
+        for i, mark in enumerate(pattern):
+            DoseLog.objects.create(
+                medication=med,
+                taken_at=start + timedelta(hours=12 * i),
+                was_taken=mark == "T"
+            )
+
+    def test_missed_dose_streaks(self):
+        self.log_pattern(self.med, "TMMMTMTMM")
+        self.assertEqual(self.med.missed_dose_streaks(), {"current": 2, "longest": 3})
+
+    def test_missed_dose_streaks_ending_with_taken(self):
+        self.log_pattern(self.med, "MMT")
+        self.assertEqual(self.med.missed_dose_streaks(), {"current": 0, "longest": 2})
+
+    def test_missed_dose_streaks_no_logs(self):
+        self.assertEqual(self.med.missed_dose_streaks(), {"current": 0, "longest": 0})
+
+    def test_fleet_streaks_constant_queries(self):
+        other = Medication.objects.create(name="Other", dosage_mg=1, prescribed_per_day=1)
+        clean = Medication.objects.create(name="Clean", dosage_mg=1, prescribed_per_day=1)
+        self.log_pattern(self.med, "MMTM")
+        self.log_pattern(other, "TMMMM")
+        self.log_pattern(clean, "TT")
+
+        # partition registry, live logs, archive segments, compacted and dropped days
+        with self.assertNumQueries(5):
+            streaks = Medication.objects.all().missed_dose_streaks()
+
+        self.assertEqual(streaks, {
+            self.med.id: {"current": 1, "longest": 2},
+            other.id: {"current": 4, "longest": 4},
+        })
+
     # --- EXTERNAL INFO MOCKED IN VIEW TESTS, NOT HERE ---
 
 
@@ -113,3 +225,38 @@ class TestDoseLogModel(TestCase):
     def test_doselog_missing_taken_at(self):
         with self.assertRaises(Exception):
             DoseLog.objects.create(medication=self.med, taken_at=None, was_taken=True)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN output checked is SQLite-specific")
+class TestDoseLogQueryPlans(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        today = timezone.localdate()
+        self.start, self.end = day_bounds(today - timedelta(days=7), today)
+
+    def test_day_bounds_match_date_lookup(self):
+        now = timezone.now()
+        for hours in (-200, -30, -1, 0, 1, 30):
+            DoseLog.objects.create(medication=self.med, taken_at=now + timedelta(hours=hours))
+        today = timezone.localdate(now)
+        start, end = day_bounds(today - timedelta(days=1), today)
+
+        by_bounds = DoseLog.objects.filter(taken_at__gte=start, taken_at__lt=end)
+        by_date = DoseLog.objects.filter(
+            taken_at__date__gte=today - timedelta(days=1),
+            taken_at__date__lte=today
+        )
+        self.assertEqual(set(by_bounds), set(by_date))
+
+    def test_date_range_uses_taken_at_index(self):
+        plan = DoseLog.objects.filter(
+            taken_at__gte=self.start, taken_at__lt=self.end
+        ).order_by("taken_at").explain()
+        self.assertIn("doselog_taken_at_id_idx", plan)
+
+    def test_medication_date_range_uses_composite_index(self):
+        plan = DoseLog.objects.filter(
+            medication=self.med, taken_at__gte=self.start, taken_at__lt=self.end
+        ).explain()
+        self.assertIn("doselog_med_taken_at_idx", plan)
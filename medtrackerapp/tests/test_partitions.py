@@ -0,0 +1,102 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from medtrackerapp import analytics, partitions
+from medtrackerapp.aggregates import month_bounds, rebuild_rollups
+from medtrackerapp.models import DoseLog, DoseDailyRollup, DoseLogPartition, PartitionedDoseDay
+from medtrackerapp.tests.helpers import DoseHistoryMixin, at
+
+
+class DoseLogPartitionTests(DoseHistoryMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.logs = [
+            self.log_dose(at(2024, 1, 10), True),
+            self.log_dose(at(2024, 1, 31, 23), False),
+            self.log_dose(at(2024, 2, 1), False),
+            self.log_dose(at(2024, 3, 5), True),
+        ]
+        self.url = reverse("doselog-filter-by-date")
+
+    def filter_ids(self, start, end):
+        response = self.client.get(self.url, {"start": start, "end": end})
+        return [log["id"] for log in response.data]
+
+    def test_command_moves_whole_months(self):
+        rollups = list(DoseDailyRollup.objects.values_list("date", "taken", "missed"))
+        call_command("partition_doses", "--before", "2024-03", stdout=StringIO())
+
+        self.assertEqual(list(DoseLog.objects.values_list("id", flat=True)), [self.logs[3].id])
+        self.assertEqual(list(DoseLogPartition.objects.values_list("month", "rows")),
+                         [(date(2024, 1, 1), 2), (date(2024, 2, 1), 1)])
+        self.assertEqual(list(DoseDailyRollup.objects.values_list("date", "taken", "missed")), rollups)
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (2, 4))
+
+    def test_filter_by_date_merges_relevant_partitions(self):
+        call_command("partition_doses", "--before", "2024-03", stdout=StringIO())
+
+        self.assertEqual(self.filter_ids("2024-01-01", "2024-12-31"), [log.id for log in self.logs])
+        self.assertEqual(self.filter_ids("2024-01-31", "2024-02-01"), [self.logs[1].id, self.logs[2].id])
+
+        start, end = month_bounds(date(2024, 2, 1))
+        tables = [source.model._meta.db_table for source in partitions.dose_log_sources(start, end)]
+        self.assertEqual(tables, [DoseLog._meta.db_table, "medtrackerapp_doselog_202402"])
+
+    def test_detach_attach_and_drop(self):
+        call_command("partition_doses", "--before", "2024-02", stdout=StringIO())
+        call_command("partition_doses", "--detach", "2024-01", stdout=StringIO())
+        self.assertEqual(self.filter_ids("2024-01-01", "2024-01-31"), [])
+
+        call_command("partition_doses", "--attach", "2024-01", stdout=StringIO())
+        self.assertEqual(len(self.filter_ids("2024-01-01", "2024-01-31")), 2)
+
+        # lookup, savepoint, log ids, sequence update and read, tombstones, DROP TABLE, delete, release
+        with self.assertNumQueries(9):
+            call_command("partition_doses", "--drop", "2024-01", stdout=StringIO())
+        self.assertFalse(DoseLogPartition.objects.exists())
+        self.assertNotIn("medtrackerapp_doselog_202401", connection.introspection.table_names())
+
+    def test_partitioned_days_outlive_dropped_partitions(self):
+        call_command("partition_doses", "--before", "2024-03", stdout=StringIO())
+        self.assertEqual(list(PartitionedDoseDay.objects.values_list("date", "taken", "missed")),
+                         [(date(2024, 1, 10), 1, 0), (date(2024, 1, 31), 0, 1), (date(2024, 2, 1), 0, 1)])
+        rollups = list(DoseDailyRollup.objects.values_list("date", "taken", "missed"))
+        days = analytics.load_dose_arrays().days.tolist()
+
+        partitions.drop_partition(date(2024, 1, 1))
+        rebuild_rollups([self.med.id])
+
+        self.assertEqual(list(DoseDailyRollup.objects.values_list("date", "taken", "missed")), rollups)
+        self.assertEqual(sorted(analytics.load_dose_arrays().days.tolist()), sorted(days))
+
+    def test_analytics_count_detached_partitions(self):
+        call_command("partition_doses", "--before", "2024-03", stdout=StringIO())
+        days = analytics.load_dose_arrays().days.tolist()
+        report = analytics.population_report(date(2024, 1, 1), date(2024, 3, 31))
+
+        partitions.set_attached(date(2024, 1, 1), False)
+        self.assertEqual(sorted(analytics.load_dose_arrays().days.tolist()), sorted(days))
+        self.assertEqual(analytics.population_report(date(2024, 1, 1), date(2024, 3, 31)), report)
+
+    def test_history_readers_include_partitions(self):
+        streaks = self.med.missed_dose_streaks()
+        heatmap = self.med.dose_heatmap()
+        arrays = analytics.load_dose_arrays()
+        call_command("partition_doses", "--before", "2024-03", stdout=StringIO())
+
+        self.assertEqual(self.med.missed_dose_streaks(), streaks)
+        self.assertEqual(self.med.dose_heatmap(), heatmap)
+        self.assertEqual(analytics.load_dose_arrays().days.tolist(), arrays.days.tolist())
+
+    def test_deleting_medication_purges_partitions(self):
+        partitions.partition_month(date(2024, 1, 1))
+        partition = DoseLogPartition.objects.get()
+        self.med.delete()
+        self.assertFalse(partitions.partition_model(partition).objects.exists())
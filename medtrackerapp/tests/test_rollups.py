@@ -0,0 +1,179 @@
+from io import StringIO
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from medtrackerapp.models import Medication, DoseLog, DoseDailyRollup, AdherenceSketchBucket
+
+
+class MedicationDoseCounterTests(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Lisinopril", dosage_mg=10, prescribed_per_day=1)
+        self.other = Medication.objects.create(name="Atorvastatin", dosage_mg=20, prescribed_per_day=1)
+        self.now = timezone.now()
+
+    def counters(self, med):
+        med.refresh_from_db()
+        return med.taken_count, med.total_count
+
+    def test_counters_follow_create_update_delete(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=False)
+        self.assertEqual(self.counters(self.med), (1, 2))
+
+        log.was_taken = False
+        log.save()
+        self.assertEqual(self.counters(self.med), (0, 2))
+
+        log.medication = self.other
+        log.save()
+        self.assertEqual(self.counters(self.med), (0, 1))
+        self.assertEqual(self.counters(self.other), (0, 1))
+
+        log.delete()
+        self.assertEqual(self.counters(self.other), (0, 0))
+
+    def test_adherence_rate_reads_counters_without_queries(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=False)
+        med = Medication.objects.get(pk=self.med.pk)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(med.adherence_rate(), 50.0)
+
+    def test_saving_stale_medication_keeps_counters(self):
+        stale = Medication.objects.get(pk=self.med.pk)
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(self.counters(self.med), (1, 1))
+
+    def test_check_command_repairs_counters(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        Medication.objects.filter(pk=self.med.pk).update(taken_count=7, total_count=9)
+
+        out = StringIO()
+        call_command("check_dose_counters", stdout=out)
+        self.assertIn("found 1 mismatched", out.getvalue())
+        self.assertEqual(self.counters(self.med), (7, 9))
+
+        call_command("check_dose_counters", "--repair", stdout=StringIO())
+        self.assertEqual(self.counters(self.med), (1, 1))
+
+
+class DoseDailyRollupTests(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(
+            name="Metformin",
+            dosage_mg=500,
+            prescribed_per_day=2
+        )
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+
+    def rollup(self, day=None):
+        return DoseDailyRollup.objects.get(medication=self.med, date=day or self.today)
+
+    def test_create_increments_rollup(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=False)
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.taken, rollup.missed), (1, 1))
+
+    def test_flip_was_taken_moves_count(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        log.was_taken = False
+        log.save()
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.taken, rollup.missed), (0, 1))
+
+    def test_moving_taken_at_moves_count_between_days(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        log.taken_at = self.now - timedelta(days=3)
+        log.save()
+
+        self.assertEqual(self.rollup().taken, 0)
+        self.assertEqual(self.rollup(timezone.localdate(log.taken_at)).taken, 1)
+
+    def test_delete_decrements_rollup(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        log.delete()
+
+        self.assertEqual(self.rollup().taken, 0)
+
+    def test_adherence_over_period_reads_rollups(self):
+        for _ in range(3):
+            DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+
+        with self.assertNumQueries(1):
+            rate = self.med.adherence_rate_over_period(self.today, self.today)
+        self.assertEqual(rate, 150.0)
+
+    def test_rebuild_rollups_command(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=False)
+        DoseDailyRollup.objects.all().delete()
+
+        call_command("rebuild_rollups", "--chunk-size", "1", stdout=StringIO())
+
+        rollup = self.rollup()
+        self.assertEqual((rollup.taken, rollup.missed), (1, 1))
+
+
+class AdherenceSketchTests(TestCase):
+
+    def setUp(self):
+        self.now = timezone.now()
+
+    def make_medication(self, taken, missed):
+        med = Medication.objects.create(name="Med", dosage_mg=1, prescribed_per_day=1)
+        for was_taken in [True] * taken + [False] * missed:
+            DoseLog.objects.create(medication=med, taken_at=self.now, was_taken=was_taken)
+        return med
+
+    def buckets(self):
+        return dict(AdherenceSketchBucket.objects.filter(count__gt=0).values_list("bucket", "count"))
+
+    def test_sketch_tracks_medication_adherence(self):
+        self.make_medication(1, 1)
+        self.make_medication(2, 1)
+        self.make_medication(0, 0)
+
+        self.assertEqual(self.buckets(), {500: 1, 667: 1})
+
+    def test_sketch_moves_and_removes_medications(self):
+        med = self.make_medication(1, 0)
+        log = DoseLog.objects.filter(medication=med).get()
+        log.was_taken = False
+        log.save()
+        self.assertEqual(self.buckets(), {0: 1})
+
+        med.delete()
+        self.assertEqual(self.buckets(), {})
+
+    def test_summary_percentiles(self):
+        for taken in range(10):
+            self.make_medication(taken, 9 - taken)
+
+        summary = AdherenceSketchBucket.summary(bins=2)
+        self.assertEqual(summary["medications"], 10)
+        self.assertEqual(summary["percentiles"]["p50"], 44.4)
+        self.assertEqual(summary["percentiles"]["p90"], 88.9)
+        self.assertEqual(summary["percentiles"]["p99"], 100.0)
+        self.assertEqual([b["count"] for b in summary["histogram"]], [5, 5])
+
+    def test_rebuild_command_matches_incremental_state(self):
+        self.make_medication(1, 2)
+        self.make_medication(3, 0)
+        expected = self.buckets()
+        AdherenceSketchBucket.objects.all().delete()
+
+        call_command("rebuild_adherence_sketch", stdout=StringIO())
+        self.assertEqual(self.buckets(), expected)
@@ -0,0 +1,180 @@
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp import archive, compaction, ingest, partitions
+from medtrackerapp.models import AdherenceSketchBucket, Medication, DoseLog, Note
+from medtrackerapp.tests.helpers import DoseHistoryMixin, at
+
+
+class SyncEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("sync-list")
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.now = timezone.now()
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params["since"] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_initial_sync_returns_everything(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        Note.objects.create(medication=self.med, text="Fine")
+
+        data = self.sync()
+        self.assertEqual([m["id"] for m in data["medications"]], [self.med.id])
+        self.assertEqual([entry["id"] for entry in data["logs"]], [log.id])
+        self.assertEqual(len(data["notes"]), 1)
+        self.assertFalse(data["has_more"])
+
+    def test_incremental_sync_returns_only_changes(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        cursor = self.sync()["cursor"]
+        self.assertEqual(self.sync(cursor)["logs"], [])
+
+        other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        data = self.sync(cursor)
+        self.assertEqual([m["id"] for m in data["medications"]], [other.id])
+        self.assertEqual(data["logs"], [])
+
+    def test_log_writes_resync_medication_adherence(self):
+        cursor = self.sync()["cursor"]
+        ingest.ingest_dose_logs([{"medication_id": self.med.id, "taken_at": self.now, "was_taken": True}])
+
+        data = self.sync(cursor)
+        self.assertEqual(len(data["logs"]), 1)
+        self.assertEqual(data["medications"][0]["adherence"], 100.0)
+
+    def test_deletes_produce_tombstones(self):
+        log = DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        note = Note.objects.create(medication=self.med, text="Fine")
+        expected = {"medications": [], "logs": [log.id], "notes": [note.id], "logs_before": []}
+        cursor = self.sync()["cursor"]
+
+        log.delete()
+        note.delete()
+        self.assertEqual(self.sync(cursor)["deleted"], expected)
+
+    def test_deleting_medication_deletes_logs_in_bulk(self):
+        ingest.ingest_dose_logs([
+            {"medication_id": self.med.id, "taken_at": self.now - timedelta(hours=i), "was_taken": i % 2 == 0}
+            for i in range(300)
+        ])
+        cursor = self.sync()["cursor"]
+        medication_id = self.med.id
+
+        with CaptureQueriesContext(connection) as queries:
+            self.med.delete()
+        self.assertLess(len(queries), 30)
+        self.assertFalse(DoseLog.objects.filter(medication_id=medication_id).exists())
+        self.assertFalse(AdherenceSketchBucket.objects.exclude(count=0).exists())
+        self.assertEqual(self.sync(cursor)["deleted"], {"medications": [medication_id], "logs": [], "notes": [], "logs_before": []})
+
+    def test_queryset_delete_leaves_no_orphaned_logs(self):
+        other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        kept = Medication.objects.create(name="Paracetamol", dosage_mg=500, prescribed_per_day=1)
+        for med in (self.med, other, kept):
+            DoseLog.objects.create(medication=med, taken_at=self.now, was_taken=True)
+
+        Medication.objects.exclude(pk=kept.pk).delete()
+
+        self.assertEqual(list(DoseLog.objects.values_list("medication_id", flat=True)), [kept.id])
+        self.assertFalse(DoseLog.objects.exclude(medication_id__in=Medication.objects.values("pk")).exists())
+
+    def test_pages_follow_cursor(self):
+        for _ in range(5):
+            DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+
+        seen, cursor, has_more = [], None, True
+        while has_more:
+            data = self.sync(cursor, limit=2)
+            seen += [m["id"] for m in data["medications"]] + [entry["id"] for entry in data["logs"]]
+            cursor, has_more = data["cursor"], data["has_more"]
+        self.assertEqual(sorted(seen), sorted([self.med.id] + list(DoseLog.objects.values_list("id", flat=True))))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"since": "garbage!"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"limit": 0}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SyncStorageTierTests(DoseHistoryMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(DOSELOG_ARCHIVE_DIR=Path(tmp.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.url = reverse("sync-list")
+        self.logs = [
+            self.log_dose(at(2024, 1, 10), True),
+            self.log_dose(at(2024, 2, 3), False),
+            self.log_dose(at(2024, 6, 1), True),
+        ]
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params["since"] = cursor
+        return self.client.get(self.url, params).data
+
+    def synced_log_ids(self, cursor=None):
+        ids, has_more = [], True
+        while has_more:
+            data = self.sync(cursor, limit=1)
+            ids += [entry["id"] for entry in data["logs"]]
+            cursor, has_more = data["cursor"], data["has_more"]
+        return sorted(ids)
+
+    def test_initial_sync_reads_every_tier(self):
+        cursor = self.sync()["cursor"]
+        partitions.partition_month(date(2024, 1, 1))
+        partitions.set_attached(date(2024, 1, 1), False)
+        with self.captureOnCommitCallbacks(execute=True):
+            list(archive.archive_before(at(2024, 3, 1)))
+
+        self.assertEqual(self.synced_log_ids(), sorted(log.id for log in self.logs))
+        data = self.sync(cursor)
+        self.assertEqual((data["logs"], data["deleted"]["logs"]), ([], []))
+
+    def test_logs_moved_after_the_cursor_are_still_delivered(self):
+        cursor = self.sync()["cursor"]
+        january = self.log_dose(at(2024, 1, 20), False)
+        february = self.log_dose(at(2024, 2, 20), False)
+        partitions.partition_month(date(2024, 1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            list(archive.archive_before(at(2024, 3, 1)))
+
+        self.assertEqual(self.synced_log_ids(cursor), sorted([january.id, february.id]))
+
+    def test_dropping_a_partition_leaves_tombstones(self):
+        partitions.partition_month(date(2024, 1, 1))
+        cursor = self.sync()["cursor"]
+        partitions.drop_partition(date(2024, 1, 1))
+
+        self.assertEqual(self.sync(cursor)["deleted"]["logs"], [self.logs[0].id])
+
+    def test_compaction_leaves_one_cutoff_tombstone(self):
+        cursor = self.sync()["cursor"]
+        partitions.partition_month(date(2024, 1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            list(archive.archive_before(at(2024, 3, 1)))
+            list(compaction.compact_before(at(2024, 2, 1)))
+            list(compaction.compact_before(at(2024, 3, 1)))
+
+        data = self.sync(cursor)
+        self.assertEqual(data["deleted"]["logs_before"], [at(2024, 3, 1)])
+        self.assertEqual(data["deleted"]["logs"], [])
+        self.assertEqual(self.synced_log_ids(), [self.logs[2].id])
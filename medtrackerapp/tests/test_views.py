@@ -1,11 +1,15 @@
+import json
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from unittest.mock import patch
 from django.utils import timezone
 from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
 
 from medtrackerapp.models import Medication, DoseLog
+from medtrackerapp.serializers import DoseLogRowEncoder, DoseLogSerializer
 
 
 class MedicationViewSetTests(APITestCase):
@@ -27,6 +31,20 @@ class MedicationViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_list_adherence_query_count_is_constant(self):
+        for i in range(5):
+            med = Medication.objects.create(name=f"Med{i}", dosage_mg=10, prescribed_per_day=1)
+            DoseLog.objects.create(medication=med, taken_at=timezone.now(), was_taken=True)
+            DoseLog.objects.create(medication=med, taken_at=timezone.now(), was_taken=i % 2 == 0)
+
+        with self.assertNumQueries(3):  # ETag fingerprint + latest tombstone + one list query
+            response = self.client.get(self.list_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data:
+            med = Medication.objects.get(pk=item["id"])
+            self.assertEqual(item["adherence"], med.adherence_rate())
+
     def test_create_medication_valid(self):
         data = {
             "name": "Ibuprofen",
@@ -52,6 +70,7 @@ class MedicationViewSetTests(APITestCase):
         response = self.client.get(self.detail_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], "Aspirin")
+        self.assertEqual(response.data["adherence"], 0.0)
 
     def test_get_medication_detail_not_found(self):
         url = reverse("medication-detail", kwargs={"pk": 9999})
@@ -116,7 +135,7 @@ class DoseLogViewSetTests(APITestCase):
         DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
         response = self.client.get(self.list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertGreaterEqual(len(response.data), 1)
+        self.assertGreaterEqual(len(response.data["results"]), 1)
 
     def test_create_log_valid(self):
         data = {
@@ -199,6 +218,14 @@ class DoseLogViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertGreaterEqual(len(response.data), 1)
 
+    def test_filter_logs_open_ended_range(self):
+        DoseLog.objects.create(medication=self.med, taken_at=self.now, was_taken=True)
+        url = reverse("doselog-filter-by-date")
+        for params in ({"start": "2020-01-01", "end": "9999-12-31"}, {"start": "0001-01-01", "end": "9999-12-31"}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data), 1)
+
     def test_filter_logs_missing_params(self):
         url = reverse("doselog-filter-by-date")
         response = self.client.get(url)  # no params
@@ -207,4 +234,293 @@ class DoseLogViewSetTests(APITestCase):
     def test_filter_logs_invalid_date(self):
         url = reverse("doselog-filter-by-date") + "?start=AAAA&end=BBBB"
         response = self.client.get(url)
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class BulkAdherenceEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med1 = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.med2 = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        self.url = reverse("medication-bulk-adherence")
+        self.now = timezone.now()
+        self.today = timezone.localdate(self.now)
+        DoseLog.objects.create(medication=self.med1, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med2, taken_at=self.now, was_taken=True)
+        DoseLog.objects.create(medication=self.med2, taken_at=self.now, was_taken=False)
+
+    def post(self, medications):
+        return self.client.post(self.url, {
+            "medications": medications,
+            "start": str(self.today),
+            "end": str(self.today)
+        }, format="json")
+
+    def test_results_match_model_method(self):
+        response = self.post([self.med1.id, self.med2.id])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = {
+            med.id: med.adherence_rate_over_period(self.today, self.today)
+            for med in (self.med1, self.med2)
+        }
+        got = {r["medication_id"]: r["adherence"] for r in response.data["results"]}
+        self.assertEqual(got, expected)
+
+    def test_all_medications_uses_constant_queries(self):
+        for i in range(5):
+            Medication.objects.create(name=f"Med{i}", dosage_mg=10, prescribed_per_day=1)
+        with self.assertNumQueries(2):
+            response = self.post("all")
+        self.assertEqual(len(response.data["results"]), 7)
+
+    def test_invalid_schedule_reported_per_medication(self):
+        bad = Medication.objects.create(name="Bad", dosage_mg=10, prescribed_per_day=0)
+        response = self.post([bad.id])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("error", response.data["results"][0])
+
+    def test_start_after_end_returns_400(self):
+        response = self.client.post(self.url, {
+            "medications": "all",
+            "start": str(self.today),
+            "end": str(self.today - timedelta(days=1))
+        }, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_medications_returns_400(self):
+        response = self.post("some")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_medication_returns_404(self):
+        response = self.post([self.med1.id, 9999])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AdherenceSeriesEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.url = reverse("medication-adherence-series", kwargs={"pk": self.med.id})
+        self.today = timezone.localdate()
+        DoseLog.objects.create(medication=self.med, taken_at=timezone.now(), was_taken=True)
+
+    def test_series_single_query_for_range(self):
+        start = self.today - timedelta(days=89)
+        with self.assertNumQueries(2):  # medication lookup + rollups
+            response = self.client.get(f"{self.url}?window=7&start={start}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["series"]), 90)
+        self.assertEqual(response.data["series"][-1]["adherence"], round(1 / 7 * 100, 2))
+
+    def test_series_invalid_window(self):
+        response = self.client.get(f"{self.url}?window=abc&start={self.today}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_series_missing_dates(self):
+        response = self.client.get(f"{self.url}?window=7")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_series_window_too_large(self):
+        response = self.client.get(f"{self.url}?window=1000000000&start={self.today}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_series_range_too_long(self):
+        response = self.client.get(f"{self.url}?window=1&start=0100-01-01&end=9999-12-31")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_series_from_first_calendar_day(self):
+        response = self.client.get(f"{self.url}?start=0001-01-01&end=0001-01-31")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["series"]), 31)
+
+
+class PdcEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.url = reverse("medication-pdc", kwargs={"pk": self.med.id})
+        self.today = timezone.localdate()
+        DoseLog.objects.create(medication=self.med, taken_at=timezone.now(), was_taken=True)
+
+    def test_pdc_valid(self):
+        start = self.today - timedelta(days=3)
+        response = self.client.get(f"{self.url}?start={start}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["pdc"], 25.0)
+        self.assertEqual(response.data["max_gap_days"], 3)
+
+    def test_pdc_invalid_range(self):
+        start = self.today + timedelta(days=1)
+        response = self.client.get(f"{self.url}?start={start}&end={self.today}")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pdc_from_first_calendar_day(self):
+        response = self.client.get(f"{self.url}?start=0001-01-01&end=0001-12-31")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["max_gap_days"], 365)
+
+    def test_pdc_range_too_long(self):
+        response = self.client.get(f"{self.url}?start=0001-01-01&end=9999-12-31")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StreakEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        now = timezone.now()
+        for i, taken in enumerate([True, False, False]):
+            DoseLog.objects.create(medication=self.med, taken_at=now + timedelta(hours=i), was_taken=taken)
+        DoseLog.objects.create(medication=self.other, taken_at=now, was_taken=False)
+        DoseLog.objects.create(medication=self.other, taken_at=now + timedelta(hours=1), was_taken=True)
+
+    def test_detail_streaks(self):
+        url = reverse("medication-streaks", kwargs={"pk": self.med.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"medication_id": self.med.id, "current": 2, "longest": 2})
+
+    def test_fleet_streaks_filter(self):
+        url = reverse("medication-fleet-streaks")
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 2)
+
+        response = self.client.get(f"{url}?min_current=1")
+        self.assertEqual([row["medication_id"] for row in response.data], [self.med.id])
+
+    def test_fleet_streaks_invalid_filter(self):
+        response = self.client.get(reverse("medication-fleet-streaks") + "?min_current=x")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class HeatmapEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        self.other = Medication.objects.create(name="Ibuprofen", dosage_mg=200, prescribed_per_day=1)
+        # 2024-01-01 was a Monday.
+        monday_8am = timezone.make_aware(timezone.datetime(2024, 1, 1, 8, 15))
+        DoseLog.objects.create(medication=self.med, taken_at=monday_8am, was_taken=True)
+        DoseLog.objects.create(medication=self.med, taken_at=monday_8am + timedelta(days=6, hours=12), was_taken=False)
+        DoseLog.objects.create(medication=self.other, taken_at=monday_8am, was_taken=True)
+
+    def test_medication_heatmap(self):
+        url = reverse("medication-heatmap", kwargs={"pk": self.med.id})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["taken"]), 7)
+        self.assertEqual(len(response.data["taken"][0]), 24)
+        self.assertEqual(response.data["taken"][0][8], 1)
+        self.assertEqual(response.data["missed"][6][20], 1)
+        self.assertEqual(sum(map(sum, response.data["taken"])), 1)
+
+    def test_fleet_heatmap(self):
+        # archive segments, partition registry, one grouped query, compacted and dropped days
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse("medication-fleet-heatmap"))
+        self.assertEqual(response.data["taken"][0][8], 2)
+        self.assertEqual(response.data["untimed"], {"taken": 0, "missed": 0})
+
+
+class FleetStatsEndpointTests(APITestCase):
+
+    def test_stats_empty_fleet(self):
+        response = self.client.get(reverse("medication-fleet-stats"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["medications"], 0)
+        self.assertIsNone(response.data["percentiles"]["p50"])
+
+    def test_stats_with_logs(self):
+        med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        DoseLog.objects.create(medication=med, taken_at=timezone.now(), was_taken=True)
+        response = self.client.get(reverse("medication-fleet-stats") + "?bins=4")
+        self.assertEqual(response.data["percentiles"]["p99"], 100.0)
+        self.assertEqual(len(response.data["histogram"]), 4)
+
+    def test_stats_invalid_bins(self):
+        response = self.client.get(reverse("medication-fleet-stats") + "?bins=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DoseLogPaginationTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        now = timezone.now().replace(microsecond=123456)
+        # Pairs of logs share a timestamp so ties are broken by id.
+        for i in range(7):
+            DoseLog.objects.create(medication=self.med, taken_at=now - timedelta(hours=i // 2))
+        self.url = reverse("doselog-list")
+
+    def test_pages_walk_all_logs_in_key_order(self):
+        seen = []
+        url = f"{self.url}?page_size=3"
+        while url:
+            with self.assertNumQueries(2):  # page query (also the ETag fingerprint) + latest tombstone
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen += [log["id"] for log in response.data["results"]]
+            url = response.data["next"]
+
+        expected = list(DoseLog.objects.order_by("-taken_at", "-id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(self.url, {"cursor": "bogus"}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"page_size": 0}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+class FilterByDateStreamingTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        now = timezone.now()
+        for i in range(5):
+            DoseLog.objects.create(medication=self.med, taken_at=now - timedelta(days=i), was_taken=i % 2 == 0)
+        self.url = reverse("doselog-filter-by-date")
+        self.params = {"start": (now - timedelta(days=10)).date().isoformat(), "end": now.date().isoformat()}
+
+    def stream(self, extra_params=None, **kwargs):
+        response = self.client.get(self.url, dict(self.params, **(extra_params or {})), **kwargs)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_stream_matches_json_response(self):
+        expected = self.client.get(self.url, self.params).json()
+        self.assertEqual(len(expected), 5)
+        with patch("medtrackerapp.views.STREAM_CHUNK_SIZE", 2):
+            self.assertEqual(self.stream({"stream": "1"}), expected)
+        self.assertEqual(self.stream(HTTP_ACCEPT="application/x-ndjson"), expected)
+
+    def test_stream_invalid_range(self):
+        response = self.client.get(self.url, {"start": "bad", "end": "2024-01-01"},
+                                   HTTP_ACCEPT="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("error", json.loads(response.content))
+
+
+class DoseLogRowEncoderTests(APITestCase):
+
+    def setUp(self):
+        med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=1)
+        DoseLog.objects.create(medication=med, taken_at=timezone.now(), was_taken=False, client_event_id="evt-1")
+        DoseLog.objects.create(medication=med, taken_at=timezone.now().replace(microsecond=0))
+
+    def test_output_matches_serializer(self):
+        logs = DoseLog.objects.order_by("-taken_at", "-id")
+        expected = DoseLogSerializer(logs, many=True).data
+        encoder = DoseLogRowEncoder()
+        self.assertEqual(encoder.encode_rows(DoseLogRowEncoder.values(logs)), expected)
+        self.assertEqual(encoder.encode_logs(logs.select_related("medication")), expected)
+        with self.assertNumQueries(2):  # page query (also the ETag fingerprint) + latest tombstone
+            self.assertEqual(self.client.get(reverse("doselog-list")).data["results"], expected)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_doselog_encoding", "--rows", "2", "--repeat", "1", stdout=out)
+        self.assertIn("Outputs identical for 2 logs", out.getvalue())
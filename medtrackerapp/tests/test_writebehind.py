@@ -0,0 +1,179 @@
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from medtrackerapp.models import Medication, DoseLog
+from medtrackerapp import writebehind
+from medtrackerapp.writebehind import WriteBehindBuffer
+
+
+class WriteBehindBufferTests(TestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.now = timezone.now()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.journal = Path(tmp.name) / "doselogs.journal"
+
+    def row(self, **extra):
+        return dict({"medication_id": self.med.id, "taken_at": self.now, "was_taken": True}, **extra)
+
+    def test_flush_inserts_pending_rows(self):
+        buffer = WriteBehindBuffer(journal_path=self.journal)
+        for _ in range(3):
+            buffer.enqueue(self.row())
+        self.assertEqual(DoseLog.objects.count(), 0)
+
+        result = buffer.flush()
+        self.assertEqual(result["created"], 3)
+        self.assertEqual(len(buffer), 0)
+        self.med.refresh_from_db()
+        self.assertEqual(self.med.total_count, 3)
+        self.assertEqual(list(self.journal.parent.glob(f"{buffer.journal_path.name}.*")), [])
+
+    def test_replay_recovers_unflushed_journal(self):
+        crashed = WriteBehindBuffer(journal_path=self.journal)
+        crashed.enqueue(self.row(client_event_id="evt-1"))
+        crashed.enqueue(self.row(was_taken=False))
+
+        restarted = WriteBehindBuffer(journal_path=self.journal)
+        self.assertEqual(restarted.replay(), 2)
+        self.assertEqual(restarted.replay(), 0)
+        self.assertTrue(DoseLog.objects.filter(client_event_id="evt-1").exists())
+        self.med.refresh_from_db()
+        self.assertEqual((self.med.taken_count, self.med.total_count), (1, 2))
+
+    def test_replaying_committed_rows_is_idempotent(self):
+        buffer = WriteBehindBuffer(journal_path=self.journal)
+        buffer.enqueue(self.row())
+        journal = buffer.journal_path.read_text()
+        buffer.flush()
+
+        self.journal.with_name("doselogs.journal.4242.1").write_text(journal)
+        with mock.patch("medtrackerapp.writebehind._process_running", return_value=False):
+            WriteBehindBuffer(journal_path=self.journal).replay()
+        self.assertEqual(DoseLog.objects.count(), 1)
+
+    def test_each_process_journals_to_its_own_file(self):
+        buffer = WriteBehindBuffer(journal_path=self.journal)
+        buffer.enqueue(self.row())
+        self.assertEqual(buffer.journal_path.name, f"doselogs.journal.{buffer.pid}")
+        self.assertFalse(self.journal.exists())
+
+    def test_replay_skips_journals_of_running_processes(self):
+        live = self.journal.with_name("doselogs.journal.4242")
+        live.write_text(writebehind.encode_row(self.row(client_event_id="evt-live")))
+        with mock.patch("medtrackerapp.writebehind._process_running", return_value=True):
+            self.assertEqual(WriteBehindBuffer(journal_path=self.journal).replay(), 0)
+        self.assertTrue(live.exists())
+
+        with mock.patch("medtrackerapp.writebehind._process_running", return_value=False):
+            self.assertEqual(WriteBehindBuffer(journal_path=self.journal).replay(), 1)
+        self.assertFalse(live.exists())
+        self.assertTrue(DoseLog.objects.filter(client_event_id="evt-live").exists())
+
+    def test_failed_flush_keeps_rows(self):
+        buffer = WriteBehindBuffer()
+        buffer.enqueue(self.row())
+        with mock.patch("medtrackerapp.ingest.ingest_dose_logs", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(len(buffer), 1)
+        buffer.flush()
+        self.assertEqual(DoseLog.objects.count(), 1)
+
+    def test_failed_flush_does_not_leave_segments(self):
+        buffer = WriteBehindBuffer(journal_path=self.journal)
+        buffer.enqueue(self.row(client_event_id="evt-1"))
+        with mock.patch("medtrackerapp.ingest.ingest_dose_logs", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                buffer.flush()
+        self.assertEqual(list(self.journal.parent.glob(f"{buffer.journal_path.name}.*")), [])
+        self.assertIn('"evt-1"', buffer.journal_path.read_text())
+
+        buffer.flush()
+        DoseLog.objects.all().delete()
+        self.assertEqual(WriteBehindBuffer(journal_path=self.journal).replay(), 0)
+        self.assertEqual(DoseLog.objects.count(), 0)
+
+
+class WriteBehindBadRowTests(TransactionTestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.gone = Medication.objects.create(name="Discontinued", dosage_mg=5, prescribed_per_day=1)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.journal = Path(tmp.name) / "doselogs.journal"
+
+    def test_bad_row_is_isolated_and_dead_lettered(self):
+        buffer = WriteBehindBuffer(journal_path=self.journal, max_retries=2)
+        buffer.enqueue({"medication_id": self.gone.id, "taken_at": timezone.now(),
+                        "was_taken": True, "client_event_id": "bad"})
+        self.gone.delete()
+        for _ in range(3):
+            buffer.enqueue({"medication_id": self.med.id, "taken_at": timezone.now(), "was_taken": True})
+
+        result = buffer.flush()
+        self.assertEqual((result["created"], result["failed"], result["dead_lettered"]), (3, 1, 0))
+        self.assertEqual(DoseLog.objects.count(), 3)
+        self.assertEqual(len(buffer), 1)
+        self.assertIn('"bad"', buffer.journal_path.read_text())
+
+        with self.assertLogs("medtrackerapp.writebehind", "ERROR"):
+            result = buffer.flush()
+        self.assertEqual(result["dead_lettered"], 1)
+        self.assertEqual(len(buffer), 0)
+        dead = buffer.dead_letter_path.read_text()
+        self.assertIn('"client_event_id": "bad"', dead)
+        self.assertIn('"error"', dead)
+
+        buffer.stop()
+        self.assertEqual(WriteBehindBuffer(journal_path=self.journal).replay(), 0)
+
+
+class WriteBehindStartupTests(TestCase):
+
+    def test_start_if_enabled(self):
+        with mock.patch("medtrackerapp.writebehind.get_buffer") as get_buffer:
+            writebehind.start_if_enabled()
+            get_buffer.assert_not_called()
+            with override_settings(DOSELOG_WRITE_BEHIND=True):
+                writebehind.start_if_enabled()
+            get_buffer.assert_called_once_with()
+
+
+@override_settings(DOSELOG_WRITE_BEHIND=True)
+class WriteBehindEndpointTests(APITestCase):
+
+    def setUp(self):
+        self.med = Medication.objects.create(name="Aspirin", dosage_mg=100, prescribed_per_day=2)
+        self.buffer = WriteBehindBuffer()
+        patcher = mock.patch("medtrackerapp.writebehind.get_buffer", return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.url = reverse("doselog-list")
+
+    def test_create_is_accepted_and_buffered(self):
+        data = {"medication": self.med.id, "taken_at": timezone.now().isoformat(), "was_taken": True}
+        response = self.client.post(self.url, data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.data["client_event_id"])
+        self.assertEqual(DoseLog.objects.count(), 0)
+
+        self.buffer.flush()
+        log = DoseLog.objects.get()
+        self.assertEqual(log.client_event_id, response.data["client_event_id"])
+
+    def test_invalid_create_is_rejected(self):
+        response = self.client.post(self.url, {"medication": 9999}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self.buffer), 0)
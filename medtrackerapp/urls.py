@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MedicationViewSet, DoseLogViewSet, NoteViewSet
+from .views import MedicationViewSet, DoseLogViewSet, NoteViewSet, SyncViewSet
 
 router = DefaultRouter()
 router.register("medications", MedicationViewSet, basename="medication")
 router.register("logs", DoseLogViewSet, basename="doselog")
 router.register("notes", NoteViewSet, basename="note")  # Nowy endpoint
+router.register("sync", SyncViewSet, basename="sync")
 
 urlpatterns = [
     path("", include(router.urls)),
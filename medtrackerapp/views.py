@@ -1,16 +1,67 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import StreamingHttpResponse
 from datetime import date
-from .models import Medication, DoseLog, Note
-from .serializers import MedicationSerializer, DoseLogSerializer, NoteSerializer
+from itertools import islice
+from . import analytics, ingest, partitions, sync, writebehind
+from .aggregates import day_bounds
+from .conditional import ConditionalGetMixin, latest
+from .models import AdherenceSketchBucket, Medication, DoseLog, Note, Tombstone
+from .parsers import NDJSONParser
+from .pagination import DoseLogCursorPagination
+from .renderers import NDJSONRenderer, ndjson_line
+from .serializers import (
+    MedicationSerializer,
+    DoseLogSerializer,
+    DoseLogBulkSerializer,
+    DoseLogRowEncoder,
+    NoteSerializer,
+)
 
+#: Logs fetched and serialized per chunk by streaming responses.
+STREAM_CHUNK_SIZE = 2000
 
-class MedicationViewSet(viewsets.ModelViewSet):
+
+def parse_date_range(start_str, end_str):
+    """
+    Parse an inclusive ``start``/``end`` ISO date range.
+
+    Returns:
+        tuple[date, date]: The parsed start and end dates.
+
+    Raises:
+        ValueError: With a client-facing message if a bound is missing,
+                    malformed, or start is after end.
+    """
+    if not start_str or not end_str:
+        raise ValueError("Both 'start' and 'end' parameters are required")
+
+    try:
+        start_date = date.fromisoformat(start_str)
+        end_date = date.fromisoformat(end_str)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+
+    if start_date > end_date:
+        raise ValueError("start_date must be before or equal to end_date")
+    return start_date, end_date
+
+
+class MedicationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and managing medications.
+
+    List and detail responses carry ETag/Last-Modified validators and
+    unchanged resources are answered with 304 (see conditional.py).
     """
+    tombstone_kind = Tombstone.MEDICATION
     queryset = Medication.objects.all()
     serializer_class = MedicationSerializer
 
@@ -72,51 +123,464 @@ class MedicationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(detail=True, methods=["get"], url_path="adherence-series")
+    def adherence_series(self, request, pk=None):
+        """
+        Daily rolling adherence series for a medication.
+
+        GET /api/medications/<id>/adherence-series/?window=7&start=YYYY-MM-DD&end=YYYY-MM-DD
+        Returns: {medication_id, window, start, end, series: [{date, adherence}]}
 
-class DoseLogViewSet(viewsets.ModelViewSet):
+        Validates:
+        - 'window' is optional (default 7) and must be between 1 and 366
+        - 'start' and 'end' are required, start must not be after end and
+          the range must not exceed 3660 days
+        """
+        medication = self.get_object()
+
+        try:
+            window = int(request.query_params.get("window", 7))
+        except ValueError:
+            return Response(
+                {"error": "window must be a valid integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start_date, end_date = parse_date_range(
+                request.query_params.get("start"), request.query_params.get("end")
+            )
+            series = medication.adherence_series(start_date, end_date, window)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            "medication_id": medication.id,
+            "window": window,
+            "start": start_date,
+            "end": end_date,
+            "series": [{"date": day, "adherence": rate} for day, rate in series]
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="pdc")
+    def pdc(self, request, pk=None):
+        """
+        Proportion of days covered and longest gap for a medication.
+
+        GET /api/medications/<id>/pdc/?start=YYYY-MM-DD&end=YYYY-MM-DD
+        Returns: {medication_id, start, end, days, covered_days, pdc, max_gap_days}
+
+        The range must not exceed 3660 days.
+        """
+        medication = self.get_object()
+
+        try:
+            start_date, end_date = parse_date_range(
+                request.query_params.get("start"), request.query_params.get("end")
+            )
+            coverage = medication.coverage_over_period(start_date, end_date)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response({
+            "medication_id": medication.id,
+            "start": start_date,
+            "end": end_date,
+            **coverage
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="streaks")
+    def streaks(self, request, pk=None):
+        """
+        Current and longest missed-dose streaks for a medication.
+
+        GET /api/medications/<id>/streaks/
+        Returns: {medication_id, current, longest}
+        """
+        medication = self.get_object()
+        return Response({
+            "medication_id": medication.id,
+            **medication.missed_dose_streaks()
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="streaks")
+    def fleet_streaks(self, request):
+        """
+        Missed-dose streaks for all medications, computed in one pass.
+
+        GET /api/medications/streaks/?min_current=N
+        Returns: [{medication_id, current, longest}] for medications with
+        at least one missed dose, optionally only those whose current
+        streak is at least N.
+        """
+        try:
+            min_current = int(request.query_params.get("min_current", 0))
+        except ValueError:
+            return Response(
+                {"error": "min_current must be a valid integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        streaks = Medication.objects.all().missed_dose_streaks()
+        return Response([
+            {"medication_id": medication_id, **values}
+            for medication_id, values in sorted(streaks.items())
+            if values["current"] >= min_current
+        ], status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["get"], url_path="heatmap")
+    def heatmap(self, request, pk=None):
+        """
+        Weekday × hour heatmap of taken and missed doses for a medication.
+
+        GET /api/medications/<id>/heatmap/
+        Returns: {medication_id, taken: 7x24, missed: 7x24, untimed: {taken, missed}},
+                 rows Monday..Sunday; ``untimed`` counts compacted doses, which
+                 have no time of day
+        """
+        medication = self.get_object()
+        return Response({
+            "medication_id": medication.id,
+            **medication.dose_heatmap()
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="heatmap")
+    def fleet_heatmap(self, request):
+        """
+        Weekday × hour heatmap of taken and missed doses across all medications.
+
+        GET /api/medications/heatmap/
+        Returns: {taken: 7x24, missed: 7x24, untimed: {taken, missed}}, rows Monday..Sunday
+        """
+        return Response(Medication.objects.all().dose_heatmap(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="stats")
+    def fleet_stats(self, request):
+        """
+        Fleet-wide adherence percentiles and distribution.
+
+        GET /api/medications/stats/?bins=10
+        Returns: {medications, percentiles: {p50, p90, p99}, histogram: [{lower, upper, count}]}
+
+        Read from the persisted adherence sketch, so the cost does not
+        depend on the number of medications or logs. Values are accurate
+        to 0.1 percentage points.
+        """
+        try:
+            bins = int(request.query_params.get("bins", 10))
+            if not 1 <= bins <= 100:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "bins must be an integer between 1 and 100"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return Response(AdherenceSketchBucket.summary(bins=bins), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="adherence")
+    def bulk_adherence(self, request):
+        """
+        Calculate adherence over one period for many medications.
+
+        POST /api/medications/adherence/
+        Body: {"medications": [id, ...] | "all", "start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}
+        Returns: {start, end, results: [{medication_id, adherence} | {medication_id, error}]}
+
+        Validates:
+        - 'medications' must be a list of integer ids or "all"
+        - all listed medications must exist
+        - 'start' and 'end' follow the same rules as adherence_rate_over_period
+        """
+        medication_ids = request.data.get("medications")
+        if medication_ids == "all":
+            medications = Medication.objects.all()
+        elif (
+            isinstance(medication_ids, list)
+            and medication_ids
+            and all(isinstance(pk, int) and not isinstance(pk, bool) for pk in medication_ids)
+        ):
+            medications = Medication.objects.filter(pk__in=medication_ids)
+        else:
+            return Response(
+                {"error": "'medications' must be a non-empty list of ids or \"all\""},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            start_date, end_date = parse_date_range(
+                request.data.get("start"), request.data.get("end")
+            )
+            rates = medications.adherence_over_period(start_date, end_date)
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if medication_ids != "all":
+            missing = sorted(set(medication_ids) - set(rates))
+            if missing:
+                return Response(
+                    {"error": f"Unknown medication ids: {missing}"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        results = []
+        for medication_id, rate in rates.items():
+            if isinstance(rate, ValueError):
+                results.append({"medication_id": medication_id, "error": str(rate)})
+            else:
+                results.append({"medication_id": medication_id, "adherence": rate})
+
+        return Response({
+            "start": start_date,
+            "end": end_date,
+            "results": results
+        }, status=status.HTTP_200_OK)
+
+
+    @action(detail=False, methods=["get"], url_path="report")
+    def population_report(self, request):
+        """
+        Population-level adherence report over a period.
+
+        GET /api/medications/report/?start=YYYY-MM-DD&end=YYYY-MM-DD
+        Returns: {start, end, summary, results: [{medication_id, adherence, period_adherence}]}
+
+        Computed with the vectorized NumPy engine in analytics.py from
+        the doses of the period only.
+        """
+        try:
+            start_date, end_date = parse_date_range(
+                request.query_params.get("start"), request.query_params.get("end")
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            report = analytics.population_report(start_date, end_date)
+        except OverflowError:
+            return Response(
+                {"error": "Date range out of bounds"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(report)
+
+
+class DoseLogViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and managing dose logs.
+
+    The list is paginated newest first with keyset cursors
+    (see pagination.py): GET /api/logs/?cursor=<next>&page_size=100
     """
-    queryset = DoseLog.objects.all()
+    queryset = DoseLog.objects.select_related("medication")
     serializer_class = DoseLogSerializer
+    pagination_class = DoseLogCursorPagination
+    tombstone_kind = Tombstone.DOSELOG
+    etag_related_field = "medication"
 
-    @action(detail=False, methods=["get"], url_path="filter")
-    def filter_by_date(self, request):
-        """Filter dose logs by date range."""
-        start_date_str = request.query_params.get("start")
-        end_date_str = request.query_params.get("end")
+    def get_conflict_mode(self):
+        """Return the ``on_conflict`` query parameter, validated."""
+        mode = self.request.query_params.get("on_conflict", "ignore")
+        if mode not in ingest.CONFLICT_MODES:
+            raise ValidationError({"on_conflict": f"Must be one of {list(ingest.CONFLICT_MODES)}"})
+        return mode
+
+    def create(self, request, *args, **kwargs):
+        """
+        Create a dose log, idempotently when a client_event_id is given.
+
+        POST /api/logs/?on_conflict=ignore|update
+
+        If a log with the same client_event_id already exists, it is
+        returned unchanged with HTTP 200 (``ignore``, the default) or
+        overwritten with the submitted values (``update``), so client
+        retries never create duplicates.
+
+        With DOSELOG_WRITE_BEHIND enabled, new logs are validated and
+        buffered instead (see writebehind.py) and the response is HTTP
+        202 with the row's client_event_id but no id.
+        """
+        mode = self.get_conflict_mode()
+        client_event_id = request.data.get("client_event_id")
+        if client_event_id:
+            existing = DoseLog.objects.filter(client_event_id=client_event_id).first()
+            if existing is not None:
+                return self.resolve_conflict(existing, mode)
+
+        if writebehind.enabled():
+            return self.enqueue_create(request)
+
+        try:
+            return super().create(request, *args, **kwargs)
+        except IntegrityError:
+            # A concurrent retry inserted the same client_event_id first.
+            existing = DoseLog.objects.filter(client_event_id=client_event_id).first()
+            if not client_event_id or existing is None:
+                raise
+            return self.resolve_conflict(existing, mode)
+
+    def enqueue_create(self, request):
+        """Validate a new log and hand it to the write-behind buffer."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        row = writebehind.get_buffer().enqueue({
+            "medication_id": data["medication"].pk,
+            "taken_at": data["taken_at"],
+            "was_taken": data.get("was_taken", True),
+            "client_event_id": data.get("client_event_id"),
+        })
+        return Response(
+            dict(serializer.data, client_event_id=row["client_event_id"]),
+            status=status.HTTP_202_ACCEPTED
+        )
+
+    def resolve_conflict(self, existing, mode):
+        """Answer a create whose client_event_id is already stored."""
+        if mode == "update":
+            serializer = self.get_serializer(existing, data=self.request.data)
+            serializer.is_valid(raise_exception=True)
+            self.perform_update(serializer)
+        else:
+            serializer = self.get_serializer(existing)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        parser_classes=[JSONParser, NDJSONParser]
+    )
+    def bulk_create(self, request):
+        """
+        Create many dose logs in one request.
 
-        if not start_date_str or not end_date_str:
+        POST /api/logs/bulk/?batch_size=N&on_conflict=ignore|update
+        Body: JSON array or NDJSON stream (Content-Type: application/x-ndjson)
+              of {medication, taken_at, was_taken, client_event_id} objects.
+        Returns: {created, updated, ignored, batches}
+
+        All rows are validated up front (with one medication lookup for
+        the whole payload) and then inserted with bulk_create, one
+        transaction per batch. Rows whose client_event_id is already
+        stored are skipped or overwritten depending on on_conflict.
+        """
+        mode = self.get_conflict_mode()
+        try:
+            batch_size = int(request.query_params.get("batch_size", ingest.default_batch_size()))
+            if batch_size < 1:
+                raise ValueError
+        except ValueError:
             return Response(
-                {"error": "Both 'start' and 'end' parameters are required"},
+                {"error": "batch_size must be a positive integer"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        serializer = DoseLogBulkSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=getattr(settings, "DOSELOG_BULK_MAX_ROWS", 10000)
+        )
+        serializer.is_valid(raise_exception=True)
+
+        result = ingest.ingest_dose_logs(
+            serializer.validated_data, batch_size=batch_size, on_conflict=mode
+        )
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    def list(self, request, *args, **kwargs):
+        """
+        List dose logs, newest first, one keyset page at a time.
+
+        Rows are read with ``values()`` (medication name joined) and
+        encoded by :class:`DoseLogRowEncoder`, which returns the same
+        output as DoseLogSerializer without per-row field machinery.
+
+        The page's ETag fingerprints its own rows (id, ``updated_at``
+        and the medication's ``edited_at``) and whether a next page
+        follows, so unchanged pages are answered with 304 without
+        touching the rest of the table (see conditional.py).
+        """
+        rows = DoseLogRowEncoder.values(
+            self.filter_queryset(self.get_queryset()), "updated_at", "medication__edited_at"
+        )
+        page = self.paginate_queryset(rows)
+        keys = [(row["id"], row["updated_at"], row["medication__edited_at"]) for row in page]
+        return self.conditional_response(
+            [keys, self.paginator.has_next],
+            latest(*(timestamp for key in keys for timestamp in key[1:]), self.latest_deletion()),
+            lambda: self.get_paginated_response(DoseLogRowEncoder().encode_rows(page))
+        )
+
+    def stream_logs(self, logs):
+        """Encode logs chunk by chunk into NDJSON lines."""
+        encoder = DoseLogRowEncoder()
+        while chunk := list(islice(logs, STREAM_CHUNK_SIZE)):
+            yield b"".join(ndjson_line(row) for row in encoder.encode_logs(chunk))
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="filter",
+        renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer]
+    )
+    def filter_by_date(self, request):
+        """
+        Filter dose logs by date range.
+
+        GET /api/logs/filter/?start=YYYY-MM-DD&end=YYYY-MM-DD[&stream=1]
+
+        Reads the live table and only the DoseLog partitions whose
+        month overlaps the range.
+
+        With ``stream=1`` or ``Accept: application/x-ndjson`` the logs
+        are sent as NDJSON through a streaming response: rows are
+        fetched with server-side iterators and serialized in chunks of
+        ``STREAM_CHUNK_SIZE``, so memory stays constant however long
+        the range is.
+        """
         try:
-            start_date = date.fromisoformat(start_date_str)
-            end_date = date.fromisoformat(end_date_str)
-        except ValueError:
+            start_date, end_date = parse_date_range(
+                request.query_params.get("start"), request.query_params.get("end")
+            )
+        except ValueError as e:
             return Response(
-                {"error": "Invalid date format. Use YYYY-MM-DD"},
+                {"error": str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if start_date > end_date:
+        stream = request.query_params.get("stream") in ("1", "true") or request.accepted_renderer.format == "ndjson"
+        try:
+            start_at, end_before = day_bounds(start_date, end_date)
+            logs = partitions.logs_between(start_at, end_before, chunk_size=STREAM_CHUNK_SIZE)
+        except OverflowError:
+            # Dates at the edges of the calendar in a non-UTC time zone.
             return Response(
-                {"error": "start_date must be before or equal to end_date"},
+                {"error": "Date range out of bounds"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        logs = self.get_queryset().filter(
-            taken_at__date__gte=start_date,
-            taken_at__date__lte=end_date
-        ).order_by("taken_at")
-
-        serializer = self.get_serializer(logs, many=True)
-        return Response(serializer.data)
+        if stream:
+            response = StreamingHttpResponse(self.stream_logs(logs), content_type=NDJSONRenderer.media_type)
+            response["X-Accel-Buffering"] = "no"
+            return response
+        return Response(DoseLogRowEncoder().encode_logs(logs))
 
 
-class NoteViewSet(viewsets.ModelViewSet):
+class NoteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing doctor's notes.
 
@@ -130,9 +594,12 @@ class NoteViewSet(viewsets.ModelViewSet):
     - DELETE /api/notes/<id>/ - delete note
 
     Update operations (PUT, PATCH) are intentionally disabled.
+    List and detail GETs support conditional requests (ETag/Last-Modified).
     """
     queryset = Note.objects.all().select_related('medication')
     serializer_class = NoteSerializer
+    tombstone_kind = Tombstone.NOTE
+    etag_related_field = 'medication'
 
     # 🔹 Added SearchFilter for searching by medication name
     filter_backends = (SearchFilter,)
@@ -172,3 +639,51 @@ class NoteViewSet(viewsets.ModelViewSet):
             },
             status=status.HTTP_405_METHOD_NOT_ALLOWED
         )
+
+
+class SyncViewSet(viewsets.ViewSet):
+    """
+    Change feed for offline clients.
+
+    Clients store the returned cursor and pass it back as ``since`` to
+    fetch only what changed, instead of re-downloading every list.
+    """
+
+    def list(self, request):
+        """
+        Return the rows created, updated or deleted since a cursor.
+
+        GET /api/sync/?since=<cursor>&limit=500
+        Returns: {cursor, has_more, medications: [...], logs: [...], notes: [...],
+                  deleted: {medications: [ids], logs: [ids], notes: [ids], logs_before: [datetimes]}}
+
+        Omit ``since`` for a full initial sync. While ``has_more`` is
+        true, request again with the new cursor. Apply ``deleted``
+        before the changed rows; ``logs_before`` means every log taken
+        before that time was compacted away.
+        """
+        try:
+            since = sync.decode_cursor(request.query_params.get("since"))
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get("limit", sync.DEFAULT_LIMIT))
+            if not 1 <= limit <= sync.MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": f"limit must be an integer between 1 and {sync.MAX_LIMIT}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        changes = sync.changes_since(since, limit)
+        context = {"request": request}
+        return Response({
+            "cursor": sync.encode_cursor(changes["seq"]),
+            "has_more": changes["has_more"],
+            "medications": MedicationSerializer(changes["medications"], many=True, context=context).data,
+            "logs": DoseLogSerializer(changes["logs"], many=True, context=context).data,
+            "notes": NoteSerializer(changes["notes"], many=True, context=context).data,
+            "deleted": changes["deleted"],
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,386 @@
+"""
+Write-behind buffering of single DoseLog creates.
+
+When ``DOSELOG_WRITE_BEHIND`` is enabled, ``POST /api/logs/`` validates
+the row, appends it to an in-process buffer and answers ``202 Accepted``
+without touching the database. A background thread drains the buffer
+through :func:`ingest.ingest_dose_logs` every ``FLUSH_MS`` milliseconds
+or as soon as ``MAX_ROWS`` rows are waiting, so bursts at dose times
+become a few large transactions instead of one commit per request.
+
+Durability: if ``DOSELOG_WRITE_BEHIND_JOURNAL`` is set, every accepted
+row is first appended to a journal as one JSON line. Each process owns
+its own journal, ``<journal>.<pid>``, so workers never write to or
+rotate each other's files. A flush rotates the journal into a numbered
+segment, ``<journal>.<pid>.<n>``, inserts the rows and deletes the
+segment once every row is committed, dead-lettered or journaled again
+for a retry; a segment never outlives its flush, so a committed row
+cannot be replayed over a later delete. Journals and segments left
+behind by a crashed process (its pid no longer running, or the current
+process's own pid) are replayed when a buffer starts. Every buffered row
+carries a ``client_event_id`` and is inserted with
+``on_conflict="ignore"``, so replaying a segment that was already
+committed is harmless.
+
+Bad rows: when a batch fails with a data error (e.g. its medication was
+deleted meanwhile), the batch is bisected until the offending rows are
+isolated, so the rest still commits. Rows failing on their own are
+journaled again and retried on later flushes; after ``MAX_RETRIES``
+attempts they are moved to the dead-letter file
+(``DOSELOG_WRITE_BEHIND_DEAD_LETTER``, default ``<journal>-dead``) with
+their error. Other errors (e.g. the database being unavailable) keep
+the whole batch for the next flush.
+
+The buffer, and journal replay, start with the server process (see
+``medtracker/wsgi.py``) when ``DOSELOG_WRITE_BEHIND`` is on.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, connections
+from django.utils.dateparse import parse_datetime
+
+from . import ingest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_MS = 200
+DEFAULT_MAX_ROWS = 500
+DEFAULT_MAX_RETRIES = 3
+
+#: Errors caused by the rows themselves rather than by the database.
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+def encode_row(row) -> str:
+    """Serialize a buffered row as one journal line."""
+    return json.dumps({
+        "medication_id": row["medication_id"],
+        "taken_at": row["taken_at"].isoformat(),
+        "was_taken": row["was_taken"],
+        "client_event_id": row["client_event_id"],
+    }) + "\n"
+
+
+def decode_row(line: str) -> dict:
+    """Parse a journal line back into an ingestion row."""
+    row = json.loads(line)
+    row["taken_at"] = parse_datetime(row["taken_at"])
+    return row
+
+
+class WriteBehindBuffer:
+    """
+    Thread-safe buffer of DoseLog rows flushed in the background.
+
+    Args:
+        flush_ms (int): Maximum time a row waits before being flushed.
+        max_rows (int): Pending rows that trigger an immediate flush.
+        journal_path (str | Path | None): Base path of the append-only
+            journal, suffixed with the process id, or None to keep rows
+            in memory only.
+        fsync (bool): Whether to fsync the journal after every row.
+        max_retries (int): Flushes a failing row is attempted in before
+            it is dead-lettered.
+        dead_letter_path (str | Path | None): File receiving rows that
+            keep failing (default: ``<journal>-dead``, or logging only
+            without a journal).
+    """
+
+    def __init__(self, flush_ms=DEFAULT_FLUSH_MS, max_rows=DEFAULT_MAX_ROWS,
+                 journal_path=None, fsync=False, max_retries=DEFAULT_MAX_RETRIES,
+                 dead_letter_path=None):
+        self.flush_interval = flush_ms / 1000
+        self.max_rows = max_rows
+        self.pid = os.getpid()
+        self.journal_base = Path(journal_path) if journal_path else None
+        self.journal_path = None
+        if self.journal_base is not None:
+            self.journal_path = self.journal_base.with_name(f"{self.journal_base.name}.{self.pid}")
+        self.fsync = fsync
+        self.max_retries = max_retries
+        if dead_letter_path is None and self.journal_base is not None:
+            dead_letter_path = self.journal_base.with_name(f"{self.journal_base.name}-dead")
+        self.dead_letter_path = Path(dead_letter_path) if dead_letter_path else None
+        self._attempts = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._journal = None
+        self._segment = 0
+        if self.journal_path is not None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def enqueue(self, row) -> dict:
+        """
+        Buffer one validated row.
+
+        A ``client_event_id`` is generated when the row has none, making
+        journal replay idempotent.
+
+        Args:
+            row (dict): ``medication_id``, ``taken_at``, ``was_taken`` and
+                optionally ``client_event_id``.
+
+        Returns:
+            dict: The buffered row.
+        """
+        row = dict(row, client_event_id=row.get("client_event_id") or uuid.uuid4().hex)
+        with self._lock:
+            self._journal_rows([row])
+            self._pending.append(row)
+            full = len(self._pending) >= self.max_rows
+        if full:
+            self._wakeup.set()
+        return row
+
+    def _journal_rows(self, rows):
+        """Append rows to the live journal; call with ``_lock`` held."""
+        if self._journal is None:
+            return
+        self._journal.write("".join(encode_row(row) for row in rows))
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+    def _rotate(self):
+        """Take the pending rows and move the journal aside as a segment."""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            segment = None
+            if self._journal is not None and rows:
+                self._journal.close()
+                self._segment += 1
+                segment = self.journal_path.with_name(f"{self.journal_path.name}.{self._segment}")
+                os.replace(self.journal_path, segment)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+        return rows, segment
+
+    def _insert(self, rows):
+        """
+        Insert rows, bisecting around rows that raise a row error.
+
+        Returns:
+            tuple: The summed ingestion result and ``[(row, error)]`` of
+            the rows that failed on their own.
+        """
+        try:
+            return ingest.ingest_dose_logs(rows, on_conflict="ignore"), []
+        except ROW_ERRORS as exc:
+            if len(rows) == 1:
+                return {"created": 0, "updated": 0, "ignored": 0, "batches": 0}, [(rows[0], exc)]
+        middle = len(rows) // 2
+        result, failed = self._insert(rows[:middle])
+        other, other_failed = self._insert(rows[middle:])
+        return {key: result[key] + other[key] for key in result}, failed + other_failed
+
+    def _handle_failures(self, failed) -> int:
+        """
+        Requeue failed rows, or dead-letter those out of retries.
+
+        Returns:
+            int: Number of rows dead-lettered.
+        """
+        retry, dead = [], []
+        for row, exc in failed:
+            key = row["client_event_id"]
+            attempts = self._attempts.get(key, 0) + 1
+            if attempts >= self.max_retries:
+                self._attempts.pop(key, None)
+                dead.append((row, exc))
+            else:
+                self._attempts[key] = attempts
+                retry.append(row)
+
+        for row, exc in dead:
+            logger.error("Dead-lettering buffered dose log %s: %s", row["client_event_id"], exc)
+        if dead and self.dead_letter_path is not None:
+            # One write per batch: the dead-letter file is shared by every process.
+            lines = "".join(
+                json.dumps(dict(json.loads(encode_row(row)), error=str(exc))) + "\n" for row, exc in dead
+            )
+            with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letter:
+                dead_letter.write(lines)
+        if retry:
+            with self._lock:
+                self._journal_rows(retry)
+                self._pending[:0] = retry
+        return len(dead)
+
+    def flush(self) -> dict:
+        """
+        Insert every pending row now.
+
+        Rows failing on their own are retried on later flushes and
+        dead-lettered after ``max_retries`` attempts; the others commit.
+        On any other failure all rows are put back at the head of the
+        buffer and journaled again, so nothing is lost. Either way the
+        flushed segment is deleted.
+
+        Returns:
+            dict: The ingestion result (see ``ingest.ingest_dose_logs``)
+            plus the number of ``failed`` and ``dead_lettered`` rows.
+        """
+        with self._flush_lock:
+            rows, segment = self._rotate()
+            if not rows:
+                return {"created": 0, "updated": 0, "ignored": 0, "batches": 0, "failed": 0, "dead_lettered": 0}
+            try:
+                result, failed = self._insert(rows)
+            except Exception:
+                with self._lock:
+                    self._journal_rows(rows)
+                    self._pending[:0] = rows
+                if segment is not None:
+                    segment.unlink(missing_ok=True)
+                raise
+            failed_ids = {row["client_event_id"] for row, _exc in failed}
+            for row in rows:
+                if row["client_event_id"] not in failed_ids:
+                    self._attempts.pop(row["client_event_id"], None)
+            dead_lettered = self._handle_failures(failed)
+            if segment is not None:
+                segment.unlink(missing_ok=True)
+            return dict(result, failed=len(failed), dead_lettered=dead_lettered)
+
+    def _orphaned_journals(self):
+        """Return journal files whose owning process is no longer running."""
+        orphaned = []
+        for path in sorted(self.journal_base.parent.glob(f"{self.journal_base.name}.*")):
+            pid = path.name[len(self.journal_base.name) + 1:].split(".")[0]
+            if path == self.journal_path or not pid.isdigit():
+                continue
+            if int(pid) == self.pid or not _process_running(int(pid)):
+                orphaned.append(path)
+        return orphaned
+
+    def replay(self) -> int:
+        """
+        Insert rows left in journal files by crashed processes.
+
+        Files owned by another running process are left alone; rows
+        failing on their own are requeued like failed flushes.
+
+        Returns:
+            int: Number of rows read from the journals.
+        """
+        if self.journal_path is None:
+            return 0
+        paths = self._orphaned_journals()
+        with self._lock:
+            if self.journal_path.exists() and self.journal_path.stat().st_size:
+                self._journal.close()
+                leftover = self.journal_path.with_name(f"{self.journal_path.name}.replay")
+                os.replace(self.journal_path, leftover)
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+                paths.append(leftover)
+
+        replayed = 0
+        for path in paths:
+            with open(path, encoding="utf-8") as journal:
+                rows = [decode_row(line) for line in journal if line.strip()]
+            _result, failed = self._insert(rows)
+            self._handle_failures(failed)
+            path.unlink()
+            replayed += len(rows)
+        return replayed
+
+    def start(self):
+        """Replay leftover journals and start the background flusher."""
+        replayed = self.replay()
+        if replayed:
+            logger.info("Replayed %d buffered dose logs from %s", replayed, self.journal_path)
+        self._thread = threading.Thread(target=self._run, name="doselog-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher after a final flush."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed; rows kept for retry")
+            finally:
+                connections.close_all()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def _process_running(pid) -> bool:
+    """Return whether a process with this id exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def enabled() -> bool:
+    """Return whether single creates should be buffered."""
+    return getattr(settings, "DOSELOG_WRITE_BEHIND", False)
+
+
+def get_buffer() -> WriteBehindBuffer:
+    """
+    Return the process-wide buffer, starting it on first use.
+
+    A buffer inherited through ``fork`` (e.g. a preloading server) is
+    replaced, so every worker journals under its own pid.
+    """
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid():
+            _buffer = WriteBehindBuffer(
+                flush_ms=getattr(settings, "DOSELOG_WRITE_BEHIND_FLUSH_MS", DEFAULT_FLUSH_MS),
+                max_rows=getattr(settings, "DOSELOG_WRITE_BEHIND_MAX_ROWS", DEFAULT_MAX_ROWS),
+                journal_path=getattr(settings, "DOSELOG_WRITE_BEHIND_JOURNAL", None),
+                fsync=getattr(settings, "DOSELOG_WRITE_BEHIND_FSYNC", False),
+                max_retries=getattr(settings, "DOSELOG_WRITE_BEHIND_MAX_RETRIES", DEFAULT_MAX_RETRIES),
+                dead_letter_path=getattr(settings, "DOSELOG_WRITE_BEHIND_DEAD_LETTER", None),
+            )
+            _buffer.start()
+            atexit.register(_buffer.stop)
+        return _buffer
+
+
+def start_if_enabled():
+    """
+    Start the buffer at server startup when write-behind is enabled.
+
+    Called from the WSGI/ASGI entry points, after the apps are loaded,
+    so journals left by a crash are replayed before the first request
+    rather than on the first buffered POST.
+    """
+    if enabled():
+        get_buffer()